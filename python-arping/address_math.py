@@ -0,0 +1,230 @@
+import socket
+from bisect import bisect_left, bisect_right
+
+IPV4_BITS = 32
+IPV6_BITS = 128
+
+# 127.0.0.0/8
+IPV4_LOOPBACK = (0x7F000000, 0x7FFFFFFF)
+
+
+def address_to_int(ip_address):
+    """
+    Convert an IPv4 or IPv6 address to an integer.
+
+    Args:
+        ip_address (str): Address in dotted-decimal or colon-hexadecimal notation.
+
+    Returns:
+        tuple: (integer address, address width in bits).
+
+    Raises:
+        ValueError: If the address is neither IPv4 nor IPv6.
+    """
+    try:
+        if ':' in ip_address:
+            packed, width = socket.inet_pton(socket.AF_INET6, ip_address), IPV6_BITS
+        else:
+            packed, width = socket.inet_pton(socket.AF_INET, ip_address), IPV4_BITS
+    except OSError:
+        raise ValueError(f"Invalid IP address: {ip_address}") from None
+    return int.from_bytes(packed, 'big'), width
+
+
+def int_to_address(value, width=IPV4_BITS):
+    """
+    Convert an integer back to an address string.
+    """
+    if width == IPV6_BITS:
+        return socket.inet_ntop(socket.AF_INET6, value.to_bytes(16, 'big'))
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+
+def mask_length(mask, width=IPV4_BITS):
+    """
+    Number of leading one bits of an integer netmask.
+
+    Args:
+        mask (int): Netmask as an integer.
+        width (int): Address width in bits.
+
+    Returns:
+        int: Prefix length; for a non-contiguous mask, the length of its leading ones.
+    """
+    host_bits = ~mask & ((1 << width) - 1)
+    # Everything below the highest zero bit is host part, whatever its value
+    return width - host_bits.bit_length()
+
+
+def prefix_to_mask(prefix_length, width=IPV4_BITS):
+    """
+    Integer netmask of a prefix length.
+    """
+    full = (1 << width) - 1
+    return full ^ (full >> prefix_length)
+
+
+def subnet_mask_to_mask_length(subnet_mask):
+    """
+    Convert subnet mask to mask length (prefix length).
+
+    Args:
+        subnet_mask (str): Subnet mask in dotted-decimal notation for IPv4
+                           or hexadecimal notation for IPv6.
+
+    Returns:
+        int: Mask length (prefix length).
+
+    Raises:
+        ValueError: If the subnet mask is not a valid address.
+    """
+    if not subnet_mask or ('.' not in subnet_mask and ':' not in subnet_mask):
+        raise ValueError("Invalid subnet mask format.")
+    return mask_length(*address_to_int(subnet_mask))
+
+
+def network_bounds(ip_address, prefix_length, width=IPV4_BITS):
+    """
+    Network and broadcast addresses of the network an address belongs to.
+
+    Args:
+        ip_address (int): Address as an integer.
+        prefix_length (int): Prefix length of the network.
+        width (int): Address width in bits.
+
+    Returns:
+        tuple: (network address, broadcast address) as integers.
+    """
+    host_bits = (1 << (width - prefix_length)) - 1
+    network = ip_address & ~host_bits
+    return network, network | host_bits
+
+
+def interface_network(ip_address, netmask):
+    """
+    Bounds and prefix length of the network of an interface address.
+
+    Args:
+        ip_address (str): Address of the interface.
+        netmask (str): Netmask of the address, in the same notation.
+
+    Returns:
+        tuple: (network address, broadcast address, prefix length), addresses
+               as integers.
+    """
+    address, width = address_to_int(ip_address)
+    mask, _ = address_to_int(netmask)
+    prefix_length = mask_length(mask, width)
+    return (*network_bounds(address, prefix_length, width), prefix_length)
+
+
+def contains(outer, inner):
+    """
+    Whether the (first, last) range inner lies entirely inside outer.
+    """
+    return outer[0] <= inner[0] and inner[1] <= outer[1]
+
+
+def overlaps(first, second):
+    """
+    Whether two (first, last) ranges share at least one address.
+    """
+    return first[0] <= second[1] and second[0] <= first[1]
+
+
+def merge_ranges(ranges):
+    """
+    Merge (first, last) ranges into sorted disjoint ones; adjacent ranges are joined.
+
+    Args:
+        ranges (iterable): (first, last) integer pairs, in any order.
+
+    Returns:
+        list: Sorted, non-overlapping and non-adjacent (first, last) pairs.
+    """
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+class AddressRanges:
+    """
+    Set of address ranges kept merged and sorted, so that checking whether a
+    network is already covered is a binary search rather than a comparison
+    with every network seen so far.
+    """
+
+    def __init__(self, ranges=()):
+        merged = merge_ranges(ranges)
+        self._firsts = [first for first, _ in merged]
+        self._lasts = [last for _, last in merged]
+
+    def __len__(self):
+        return len(self._firsts)
+
+    def __iter__(self):
+        return iter(zip(self._firsts, self._lasts))
+
+    def covers(self, first, last):
+        """
+        Whether every address from first to last is in the set.
+        """
+        index = bisect_right(self._firsts, first) - 1
+        return index >= 0 and last <= self._lasts[index]
+
+    def overlaps(self, first, last):
+        """
+        Whether at least one address from first to last is in the set.
+        """
+        index = bisect_right(self._firsts, last) - 1
+        return index >= 0 and first <= self._lasts[index]
+
+    def add(self, first, last):
+        """
+        Add the addresses from first to last, merging with the overlapping or
+        adjacent ranges.
+        """
+        # Ranges starting before or right after the end of the new one
+        end = bisect_right(self._firsts, last + 1)
+        start = end
+        while start > 0 and self._lasts[start - 1] + 1 >= first:
+            start -= 1
+        if start < end:
+            first = min(first, self._firsts[start])
+            last = max(last, self._lasts[end - 1])
+        self._firsts[start:end] = [first]
+        self._lasts[start:end] = [last]
+
+
+class NetworkSet(AddressRanges):
+    """
+    Set of CIDR networks, telling whether a network lies inside one of them.
+
+    Two CIDR networks are either nested or disjoint, so only the outermost
+    ones are kept and the binary search of AddressRanges still applies.
+    Unlike AddressRanges, adjacent networks are not joined: the two /25
+    halves of a /24 do not cover that /24, which is then scanned as well.
+    """
+
+    def __init__(self, networks=()):
+        super().__init__()
+        for first, last in networks:
+            self.add(first, last)
+
+    def add(self, first, last):
+        """
+        Add the network from first to last, replacing the networks it contains.
+        """
+        # Stored networks overlapping the new one, which are nested in it
+        start = bisect_left(self._lasts, first)
+        end = bisect_right(self._firsts, last)
+        if start < end:
+            first = min(first, self._firsts[start])
+            last = max(last, self._lasts[end - 1])
+        self._firsts[start:end] = [first]
+        self._lasts[start:end] = [last]
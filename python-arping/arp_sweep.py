@@ -0,0 +1,423 @@
+import errno
+import fcntl
+import select
+import socket
+import struct
+import time
+
+from address_math import address_to_int, interface_network
+from metrics import get_metrics
+
+# Ethernet / ARP constants (see RFC 826)
+ETH_P_ARP = 0x0806
+ARP_REQUEST = 1
+ARP_REPLY = 2
+BROADCAST_MAC = b"\xff" * 6
+ZERO_MAC = b"\x00" * 6
+
+# ioctl requests used to read the interface addresses
+SIOCGIFADDR = 0x8915
+SIOCGIFHWADDR = 0x8927
+
+# Minimum Ethernet frame length without FCS
+MIN_FRAME_LENGTH = 60
+
+# AF_PACKET sockets only exist on Linux
+RAW_SOCKETS_SUPPORTED = hasattr(socket, 'AF_PACKET')
+
+
+def mac_to_str(raw_mac):
+    """
+    Convert a raw 6-byte MAC address to its "xx:xx:xx:xx:xx:xx" representation.
+
+    Args:
+        raw_mac (bytes): MAC address as 6 bytes.
+
+    Returns:
+        str: MAC address in colon separated hexadecimal notation.
+    """
+    return ':'.join(f"{byte:02x}" for byte in raw_mac)
+
+
+def get_interface_mac(interface):
+    """
+    Retrieve the hardware address of a network interface.
+
+    Args:
+        interface (str): Name of the network interface.
+
+    Returns:
+        bytes: MAC address of the interface as 6 bytes.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        info = fcntl.ioctl(sock.fileno(), SIOCGIFHWADDR,
+                           struct.pack('256s', interface.encode()[:15]))
+    return info[18:24]
+
+
+def get_interface_ip(interface):
+    """
+    Retrieve the IPv4 address assigned to a network interface.
+
+    Args:
+        interface (str): Name of the network interface.
+
+    Returns:
+        bytes: IPv4 address of the interface as 4 packed bytes.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        info = fcntl.ioctl(sock.fileno(), SIOCGIFADDR,
+                           struct.pack('256s', interface.encode()[:15]))
+    return info[20:24]
+
+
+def find_interface(ip_address):
+    """
+    Find the local interface whose IPv4 network contains a given address.
+
+    Args:
+        ip_address (str or int): IPv4 address to look for.
+
+    Returns:
+        str: Name of the interface, or None if no interface matches.
+    """
+    import psutil
+
+    if isinstance(ip_address, int):
+        address = ip_address
+    else:
+        address = address_to_int(str(ip_address))[0]
+    for interface, addrs in psutil.net_if_addrs().items():
+        for addr in addrs:
+            if addr.family != socket.AF_INET or not addr.netmask:
+                continue
+            first, last, _ = interface_network(addr.address, addr.netmask)
+            if first <= address <= last:
+                return interface
+    return None
+
+
+def host_range(network):
+    """
+    Lazily enumerate the usable host addresses of a network as integers.
+
+    Args:
+        network (IPv4Network): Network to enumerate.
+
+    Returns:
+        range: Integer addresses, excluding the network and broadcast
+               addresses unless the prefix is /31 or /32.
+    """
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    if network.prefixlen < 31:
+        first, last = first + 1, last - 1
+    return range(first, last + 1)
+
+
+def record_sweep(interface, sweep_stats):
+    """
+    Add the counters and reply latencies of one sweep to the metrics.
+
+    Args:
+        interface (str): Interface the sweep ran on.
+        sweep_stats (dict): ArpSweeper.last_sweep of the sweep.
+    """
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return
+    for name, key in (("arp_requests_sent", 'sent'),
+                      ("arp_retransmissions", 'retransmitted'),
+                      ("arp_replies", 'replies'),
+                      ("arp_requests_dropped", 'dropped')):
+        metrics.increment(name, sweep_stats[key], interface=interface)
+    metrics.observe_many("arp_reply_latency_seconds", sweep_stats['latencies'],
+                         interface=interface)
+
+
+def pack_ip(target):
+    """
+    Pack an IPv4 address given as an integer, a string or an IPv4Address.
+    """
+    if isinstance(target, int):
+        return struct.pack('!I', target)
+    return socket.inet_aton(str(target))
+
+
+def build_arp_request(src_mac, src_ip, target_ip):
+    """
+    Build a broadcast Ethernet frame carrying an ARP "who-has" request.
+
+    Args:
+        src_mac (bytes): Sender MAC address as 6 bytes.
+        src_ip (bytes): Sender IPv4 address as 4 packed bytes.
+        target_ip (bytes): Target IPv4 address as 4 packed bytes.
+
+    Returns:
+        bytes: Ethernet frame padded to the minimum frame length.
+    """
+    ethernet = BROADCAST_MAC + src_mac + struct.pack('!H', ETH_P_ARP)
+    arp = struct.pack('!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, ARP_REQUEST,
+                      src_mac, src_ip, ZERO_MAC, target_ip)
+    return (ethernet + arp).ljust(MIN_FRAME_LENGTH, b"\x00")
+
+
+def parse_arp(frame):
+    """
+    Parse an Ethernet frame carrying any ARP message.
+
+    Args:
+        frame (bytes): Raw Ethernet frame.
+
+    Returns:
+        tuple: (opcode, sender_ip, sender_mac, target_ip), addresses as packed
+               bytes, or None if the frame is not ARP.
+    """
+    if len(frame) < 42 or frame[12:14] != b"\x08\x06":
+        return None
+    opcode, sender_mac, sender_ip, _, target_ip = struct.unpack(
+        '!6xH6s4s6s4s', frame[14:42])
+    return opcode, sender_ip, sender_mac, target_ip
+
+
+def parse_arp_reply(frame):
+    """
+    Parse an Ethernet frame and extract the sender of an ARP reply.
+
+    Args:
+        frame (bytes): Raw Ethernet frame.
+
+    Returns:
+        tuple: (sender_ip, sender_mac, target_ip) as packed bytes,
+               or None if the frame is not an ARP reply.
+    """
+    parsed = parse_arp(frame)
+    if parsed is None or parsed[0] != ARP_REPLY:
+        return None
+    return parsed[1:]
+
+
+# Quiet window learned on each interface by the previous sweeps of the process
+_learned_timeouts = {}
+
+
+def get_learned_timeout(interface):
+    """
+    Return the reply timeout learned on an interface by the previous sweeps.
+
+    Args:
+        interface (str): Name of the network interface.
+
+    Returns:
+        float: Timeout in seconds, or None if nothing was learned yet.
+    """
+    return _learned_timeouts.get(interface)
+
+
+class ArpSweeper:
+    """
+    Send ARP requests for many targets from one AF_PACKET socket and collect
+    the replies on a receive loop interleaved with the (rate limited) sends.
+
+    Unless a fixed timeout is given, the time spent waiting for replies adapts
+    to the latencies observed during the sweep: listening stops once no reply
+    arrived for LATENCY_MARGIN times the 99th percentile latency, and only the
+    targets that did not answer are retransmitted.
+
+    Requires root or the CAP_NET_RAW capability.
+    """
+
+    # Quiet window as a multiple of the observed reply latency
+    LATENCY_MARGIN = 3.0
+
+    def __init__(self, interface, rate=1000, timeout=None, retries=1,
+                 min_timeout=0.3, max_timeout=2.0):
+        """
+        Args:
+            interface (str): Name of the interface to send the requests on.
+            rate (int): Maximum number of ARP requests sent per second.
+            timeout (float): Fixed number of seconds to keep listening after the
+                             last request, or None to adapt it to the replies.
+            retries (int): Number of retransmissions to the silent targets.
+            min_timeout (float): Lower bound of the adaptive timeout.
+            max_timeout (float): Upper bound of the adaptive timeout.
+        """
+        self.interface = interface
+        self.rate = rate
+        self.timeout = timeout
+        self.retries = retries
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.learned_timeout = get_learned_timeout(interface)
+        self.latencies = []
+        self.stats = {'sent': 0, 'replies': 0, 'retransmitted': 0, 'dropped': 0}
+        # Counter increments and latencies of the latest sweep
+        self.last_sweep = None
+        self.src_mac = get_interface_mac(interface)
+        self.src_ip = get_interface_ip(interface)
+        self.sock = socket.socket(
+            socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind((interface, ETH_P_ARP))
+        self.sock.setblocking(False)
+        self._window = None
+        self._next_send = 0.0
+        self._last_event = 0.0
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def quiet_window(self):
+        """
+        Seconds without any reply after which the sweep stops listening.
+        """
+        if self.timeout is not None:
+            return self.timeout
+        if self._window is None:
+            if self.latencies:
+                ordered = sorted(self.latencies)
+                tail = ordered[int(0.99 * (len(ordered) - 1))] * self.LATENCY_MARGIN
+            elif self.learned_timeout is not None:
+                tail = self.learned_timeout
+            else:
+                tail = self.max_timeout
+            self._window = min(self.max_timeout, max(self.min_timeout, tail))
+        return self._window
+
+    def _receive(self, replies, outstanding, on_reply):
+        """
+        Drain every frame currently queued on the socket.
+        """
+        while True:
+            try:
+                frame = self.sock.recv(65535)
+            except BlockingIOError:
+                return
+            parsed = parse_arp_reply(frame)
+            if not parsed:
+                continue
+            sender_ip, sender_mac, target_ip = parsed
+            # Only keep replies addressed to us, i.e. answers to our requests
+            if target_ip != self.src_ip:
+                continue
+            # Ignore the hosts we did not probe (or that already answered)
+            sent_at = outstanding.pop(sender_ip, None)
+            if sent_at is None:
+                continue
+            now = time.monotonic()
+            self.latencies.append(now - sent_at)
+            self._window = None
+            ip_address = socket.inet_ntoa(sender_ip)
+            self._last_event = now
+            self.stats['replies'] += 1
+            replies[ip_address] = mac_to_str(sender_mac)
+            if on_reply:
+                on_reply(ip_address, replies[ip_address])
+
+    def _send(self, target_ip, replies, outstanding, on_reply):
+        """
+        Send one request once the rate limit allows it, receiving meanwhile.
+        """
+        interval = 1.0 / self.rate if self.rate else 0.0
+        # Keep the receive queue drained while pacing the requests
+        while True:
+            wait = self._next_send - time.monotonic()
+            if wait <= 0:
+                break
+            readable, _, _ = select.select([self.sock], [], [], wait)
+            if readable:
+                self._receive(replies, outstanding, on_reply)
+
+        frame = build_arp_request(self.src_mac, self.src_ip, target_ip)
+        if not self._try_send(frame):
+            # Transmit queue is full, give it a moment and retry once
+            select.select([], [self.sock], [], self.max_timeout)
+            if self._try_send(frame):
+                self.stats['sent'] += 1
+            else:
+                # Still outstanding, so that the retransmissions cover it
+                self.stats['dropped'] += 1
+        else:
+            self.stats['sent'] += 1
+        now = time.monotonic()
+        outstanding[target_ip] = now
+        self._last_event = now
+        self._next_send = max(self._next_send + interval, now - interval)
+        self._receive(replies, outstanding, on_reply)
+
+    def _try_send(self, frame):
+        """
+        Send a frame, returning False instead of raising when the transmit queue is full.
+        """
+        try:
+            self.sock.send(frame)
+        except OSError as error:
+            if error.errno not in (errno.EAGAIN, errno.ENOBUFS):
+                raise
+            return False
+        return True
+
+    def _wait_for_tail(self, replies, outstanding, on_reply):
+        """
+        Listen until the replies stop coming for a quiet window, every target
+        answered, or max_timeout (the fixed timeout) elapsed since the last send.
+        """
+        hard_deadline = self._last_event + (
+            self.timeout if self.timeout is not None else self.max_timeout)
+        while outstanding:
+            deadline = min(hard_deadline, self._last_event + self.quiet_window())
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                break
+            readable, _, _ = select.select([self.sock], [], [], wait)
+            if readable:
+                self._receive(replies, outstanding, on_reply)
+
+    def sweep(self, targets, on_reply=None):
+        """
+        Send an ARP request to every target and wait for the replies, then
+        retransmit to the targets that stayed silent.
+
+        Args:
+            targets (iterable): IPv4 addresses (int, str or IPv4Address) to probe.
+            on_reply (callable): Optional callback invoked as
+                                 on_reply(ip, mac) as soon as a reply arrives.
+
+        Returns:
+            dict: Mapping of responding IP addresses to their MAC addresses.
+        """
+        replies = {}
+        # Packed target address -> time of its last request
+        outstanding = {}
+        stats_before = dict(self.stats)
+        # Until the first reply, wait for the window learned by previous sweeps
+        self.latencies = []
+        self._window = None
+        self._next_send = time.monotonic()
+
+        for target in targets:
+            self._send(pack_ip(target), replies, outstanding, on_reply)
+        self._wait_for_tail(replies, outstanding, on_reply)
+
+        for _ in range(self.retries):
+            if not outstanding:
+                break
+            for target_ip in list(outstanding):
+                self.stats['retransmitted'] += 1
+                self._send(target_ip, replies, outstanding, on_reply)
+            self._wait_for_tail(replies, outstanding, on_reply)
+
+        if self.latencies and self.timeout is None:
+            self.learned_timeout = self.quiet_window()
+            _learned_timeouts[self.interface] = self.learned_timeout
+        self.last_sweep = {key: self.stats[key] - stats_before[key]
+                           for key in self.stats}
+        self.last_sweep['latencies'] = self.latencies
+        record_sweep(self.interface, self.last_sweep)
+        return replies
@@ -1,48 +1,29 @@
+import argparse
 from enum import Enum
-from scapy.all import arping as scarping
-import psutil
-from socket import AF_INET, AF_INET6, gethostbyaddr, herror, inet_aton
-from tabulate import tabulate
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+from socket import AF_INET, AF_INET6, gethostbyaddr, herror
 from ipaddress import IPv4Network
-import json
-import os
-from zeroconf import ServiceBrowser, Zeroconf
-
-
-def load_mac_map():
-    script_directory = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(script_directory, 'mac_24bit.json')
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file, strict=False)
-    return data
-
-
-MAC_MAP = load_mac_map()
-
-
-def merge_lists_of_dicts(list1, list2, key):
-    """
-    Merge two lists of dictionaries avoiding duplicate entries based on a specified key.
-
-    Args:
-        list1 (list): First list of dictionaries.
-        list2 (list): Second list of dictionaries.
-        key (str): Key within the dictionaries to determine uniqueness.
-
-    Returns:
-        list: Merged list of dictionaries with no duplicate entries based on the specified key.
-    """
-    # Create a set to store unique keys encountered so far
-    unique_keys = set()
-
-    # Merge the lists while avoiding duplicates based on the specified key
-    merged_list = []
-    for item in list1 + list2:
-        if item[key] not in unique_keys:
-            unique_keys.add(item[key])
-            merged_list.append(item)
-
-    return merged_list
+from mdns import HostnameResolver
+from arp_sweep import (RAW_SOCKETS_SUPPORTED, ArpSweeper, find_interface,
+                       get_interface_ip, host_range)
+from oui_index import get_index, get_vendors_from_mac_list
+from resolver import add_dns_server_argument, configure_resolver, get_resolver
+from sharded_scan import estimate_scan_time, sharded_scan
+from inventory import DEFAULT_MAX_AGE, DEFAULT_RESOLVE_TTL, Inventory
+from registry import DeviceRegistry
+from output import (STREAMING_FORMATS, DeviceWriter, add_format_argument,
+                    messages_to_stderr)
+from passive import PassiveListener
+from address_math import (IPV4_LOOPBACK, NetworkSet, address_to_int, contains,
+                          interface_network, subnet_mask_to_mask_length)
+from ndp import NdpScanner, get_ipv6_interfaces, scoped_address
+from neighbours import read_neighbours
+from metrics import add_metrics_argument, get_metrics
+
+
+# Networks with a shorter prefix take too long for a single sweep
+LARGE_NETWORK_PREFIX = 20
 
 
 class isIPVersion(Enum):
@@ -68,38 +49,6 @@ class isIPVersion(Enum):
         return addr.family == AF_INET or addr.family == AF_INET6
 
 
-def subnet_mask_to_mask_length(subnet_mask):
-    """
-    Convert subnet mask to mask length (prefix length).
-
-    Args:
-        subnet_mask (str): Subnet mask in dotted-decimal notation for IPv4
-                           or hexadecimal notation for IPv6.
-
-    Returns:
-        int: Mask length (prefix length).
-    """
-    # Check if the subnet mask is IPv4 or IPv6
-    if '.' in subnet_mask:  # For IPv4
-        binary_mask = ''.join([bin(int(x))[2:].zfill(8)
-                              for x in subnet_mask.split('.')])
-    elif ':' in subnet_mask:  # For IPv6
-        binary_mask = ''.join([bin(int(x, 16))[2:].zfill(16)
-                              for x in subnet_mask.split(':')])
-    else:
-        raise ValueError("Invalid subnet mask format.")
-
-    # Count the number of consecutive '1' bits to determine the mask length
-    mask_length = 0
-    for bit in binary_mask:
-        if bit == '1':
-            mask_length += 1
-        else:
-            break
-
-    return mask_length
-
-
 def get_hostname_from_ip(ip_address):
     """
     Retrieve the hostname associated with a given IP address.
@@ -108,7 +57,8 @@ def get_hostname_from_ip(ip_address):
         ip_address (str): IP address of the device.
 
     Returns:
-        str: Hostname associated with the IP address, or "Hostname not found" if not found.
+        str: Hostname associated with the IP address, or "Hostname not found"
+             if not found.
     """
     try:
         # Perform reverse DNS lookup to retrieve hostname
@@ -121,21 +71,37 @@ def get_hostname_from_ip(ip_address):
         return f"Error occurred: {e}"
 
 
-def get_hostnames_from_ips(devices):
+def get_hostnames_from_ips(devices, mdns_resolver=None, mdns_timeout=2.0):
     """
     Retrieve hostnames for a list of devices based on their IP addresses.
 
     Args:
         devices (list): List of dictionaries containing the "ip" key.
+        mdns_resolver (HostnameResolver): Optional mDNS resolver used for the
+                                          devices without a reverse DNS name.
+        mdns_timeout (float): Seconds to wait for the mDNS announcements.
 
     Returns:
         list: List of dictionaries containing both "ip" and "hostname" keys.
     """
+    metrics = get_metrics()
+    # Resolve all the IP addresses concurrently through the cached resolver
+    with metrics.stage("reverse_dns"):
+        hostnames = get_resolver().resolve_many(
+            device["ip"] for device in devices if device.get("ip"))
+    if mdns_resolver:
+        # One shared browse answers every missing name at once
+        missing = [ip for ip, hostname in hostnames.items() if not hostname]
+        with metrics.stage("mdns"):
+            found = mdns_resolver.resolve_many(missing, mdns_timeout)
+        hostnames.update(found)
+        metrics.increment("mdns_lookups", len(found), result="found")
+        metrics.increment("mdns_lookups", len(missing) - len(found), result="missing")
+
     for device in devices:
         ip_address = device.get("ip")
         if ip_address:
-            # Retrieve hostname for each IP address using the get_hostname_from_ip function
-            device["hostname"] = get_hostname_from_ip(ip_address)
+            device["hostname"] = hostnames[ip_address]
         else:
             # Handle the case when the "ip" key is not present in the dictionary
             device["hostname"] = "IP not provided"
@@ -154,11 +120,8 @@ def get_vendor_from_mac(mac_address):
         str: Vendor name associated with the MAC address.
     """
 
-    # Extract the OUI from the MAC address (first three octets)
-    oui = mac_address.upper().replace(":", "")[:6]
-
-    # Lookup the vendor based on the OUI
-    return MAC_MAP.get(oui)
+    # Lookup the vendor in the memory-mapped OUI index (opened on first use)
+    return get_index().lookup(mac_address)
 
 
 def get_vendors_from_macs(devices):
@@ -171,11 +134,17 @@ def get_vendors_from_macs(devices):
     Returns:
         list: List of dictionaries containing both "mac" and "vendor" keys.
     """
-    for device in devices:
-        mac_address = device.get("mac")
-        if mac_address:
-            # Retrieve vendor for each MAC address using the get_vendor_from_mac function
-            device["vendor"] = get_vendor_from_mac(mac_address)
+    # Resolve all the MAC addresses in a single batch
+    metrics = get_metrics()
+    with metrics.stage("vendors"):
+        vendors = get_vendors_from_mac_list([device.get("mac") for device in devices])
+    found = sum(1 for vendor in vendors if vendor)
+    metrics.increment("vendor_lookups", found, result="found")
+    metrics.increment("vendor_lookups", len(vendors) - found, result="missing")
+
+    for device, vendor in zip(devices, vendors):
+        if device.get("mac"):
+            device["vendor"] = vendor
         else:
             # Handle the case when the "mac" key is not present in the dictionary
             device["vendor"] = "MAC not provided"
@@ -193,6 +162,8 @@ def get_all_ip_ranges(ipv: isIPVersion = isIPVersion.BOTH):
     Returns:
         list: List of IP addresses and their corresponding mask lengths.
     """
+    import psutil
+
     ip_ranges = []
 
     # Iterate over all network interfaces
@@ -208,17 +179,272 @@ def get_all_ip_ranges(ipv: isIPVersion = isIPVersion.BOTH):
     return ip_ranges
 
 
-def arping(ip_range):
+def get_interface_networks(min_prefix_length=LARGE_NETWORK_PREFIX):
+    """
+    Collect the IPv4 networks to scan, grouped by interface.
+
+    Networks are compared as integer address ranges rather than strings: a
+    network contained in one selected before it on the same interface is
+    dropped, since sweeping that one already covers it. The same
+    network on two interfaces is kept for both, as ARP only reaches the
+    segment of the interface it is sent from.
+
+    Args:
+        min_prefix_length (int): Networks with a shorter prefix are skipped.
+
+    Returns:
+        dict: Lists of IPv4Network keyed by interface name.
+    """
+    import psutil
+
+    candidates = []
+    for interface, addrs in psutil.net_if_addrs().items():
+        for addr in addrs:
+            if addr.family != AF_INET or not addr.netmask:
+                continue
+            first, last, prefix_length = interface_network(addr.address, addr.netmask)
+            if contains(IPV4_LOOPBACK, (first, last)):
+                print(f"Skipping IP {addr.address}/{prefix_length} "
+                      "since it's localhost.")
+                continue
+            if prefix_length < min_prefix_length:
+                print(f"Skipping IP {addr.address}/{prefix_length} "
+                      "since submask is small (taking too much time).")
+                continue
+            candidates.append((prefix_length, first, last, interface))
+
+    # Largest networks first, so that the networks they contain get dropped
+    candidates.sort()
+    interface_networks = {}
+    selected = {}
+    for prefix_length, first, last, interface in candidates:
+        network = IPv4Network((first, prefix_length))
+        ranges = selected.setdefault(interface, NetworkSet())
+        if ranges.covers(first, last):
+            print(f"Network {network} already scanned on {interface}. Skipping.")
+            continue
+        ranges.add(first, last)
+        interface_networks.setdefault(interface, []).append(network)
+
+    return interface_networks
+
+
+def _cached_sweeper(sweepers, interface, rate):
+    if interface not in sweepers:
+        sweepers[interface] = ArpSweeper(interface, rate=rate)
+    return sweepers[interface]
+
+
+def prune_sweepers(sweepers, interfaces):
+    """
+    Close the cached sweepers of the interfaces that are gone or whose address changed.
+
+    Args:
+        sweepers (dict): ArpSweeper objects keyed by interface, see scan_interface.
+        interfaces (iterable): Interfaces that are still to be swept.
+    """
+    interfaces = set(interfaces)
+    for interface, sweeper in list(sweepers.items()):
+        try:
+            current = (interface in interfaces
+                       and get_interface_ip(interface) == sweeper.src_ip)
+        except OSError:
+            # No such interface or no IPv4 address anymore
+            current = False
+        if not current:
+            del sweepers[interface]
+            sweeper.close()
+
+
+def scan_interface(interface, networks, rate=1000, skip=frozenset(), sweepers=None):
+    """
+    Sweep every network of an interface from a single raw socket.
+
+    Networks with a prefix shorter than LARGE_NETWORK_PREFIX are scanned
+    afterwards in sharded mode, at the same packet rate.
+
+    Args:
+        interface (str): Name of the interface.
+        networks (list): IPv4Network objects reachable on the interface.
+        rate (int): Maximum number of ARP requests sent per second.
+        skip (frozenset): Integer addresses not to probe, e.g. the ones seen recently.
+        sweepers (dict): ArpSweeper objects keyed by interface, kept open
+                         between calls; a temporary sweeper is used if None.
+
+    Returns:
+        list: List of dictionaries containing the IP and MAC addresses of
+              devices that respond.
+    """
+    if not RAW_SOCKETS_SUPPORTED:
+        devices = []
+        for network in networks:
+            devices += arping(str(network))
+        return devices
+
+    small = [network for network in networks
+             if network.prefixlen >= LARGE_NETWORK_PREFIX]
+    large = [network for network in networks
+             if network.prefixlen < LARGE_NETWORK_PREFIX]
+
+    def targets():
+        addresses = chain.from_iterable(host_range(network) for network in small)
+        if skip:
+            addresses = (ip for ip in addresses if ip not in skip)
+        return addresses
+
+    devices = []
+    if small:
+        if sweepers is None:
+            with ArpSweeper(interface, rate=rate) as sweeper:
+                replies = sweeper.sweep(targets())
+        else:
+            try:
+                replies = _cached_sweeper(sweepers, interface, rate).sweep(targets())
+            except OSError:
+                # The interface was recreated or renumbered since the socket was opened
+                stale = sweepers.pop(interface, None)
+                if stale:
+                    stale.close()
+                replies = _cached_sweeper(sweepers, interface, rate).sweep(targets())
+        devices += [{'ip': ip, 'mac': mac} for ip, mac in replies.items()]
+    for network in large:
+        print(f"Scanning {network} on {interface} in sharded mode, "
+              f"up to {estimate_scan_time(network, rate):.0f}s at {rate} packets/s.")
+        devices += sharded_scan(network, interface=interface, rate=rate, skip=skip)
+    return devices
+
+
+def scan_interfaces(interface_networks, rate=1000, skip=frozenset(), sweepers=None,
+                    on_result=None):
+    """
+    Sweep all the interfaces concurrently, one socket per interface, and merge
+    the results in a registry, so the total time approaches the one of the
+    slowest interface.
+
+    Args:
+        interface_networks (dict): Lists of IPv4Network keyed by interface name,
+                                   as returned by get_interface_networks.
+        rate (int): Maximum number of ARP requests sent per second per interface.
+        skip (frozenset): Integer addresses not to probe.
+        sweepers (dict): ArpSweeper objects to reuse, see scan_interface.
+        on_result (callable): Called as on_result(devices) with the devices of
+                              each interface as soon as its sweep is over, in
+                              the calling thread while the others go on.
+
+    Returns:
+        DeviceRegistry: The IP and MAC addresses of devices that respond.
+    """
+    registry = DeviceRegistry()
+    if not interface_networks:
+        return registry
+
+    with ThreadPoolExecutor(max_workers=len(interface_networks)) as executor:
+        futures = {executor.submit(scan_interface, interface, networks, rate, skip,
+                                   sweepers): interface
+                   for interface, networks in interface_networks.items()}
+        for future in as_completed(futures):
+            try:
+                devices = future.result()
+            except Exception as e:
+                print(e)
+                print(f"ARPING failed on interface {futures[future]}")
+                continue
+            registry.update(devices)
+            if on_result:
+                on_result(devices)
+
+    return registry
+
+
+def scan_ipv6_interfaces(interfaces=None, targets=()):
+    """
+    Discover the IPv6 neighbours of every interface concurrently with NDP.
+
+    Hosts answer the multicast echo request from one address per scope, so
+    their other addresses are only found when solicited explicitly; the
+    addresses in the kernel neighbour table are always solicited, on the
+    interface the kernel learned them on. The extra targets are solicited on
+    the interface of their "%interface" suffix, on every interface without.
+
+    Link-local addresses are only unique on their link, so they are returned
+    with the suffix of the interface they were found on, e.g. "fe80::1%eth0".
+
+    Args:
+        interfaces (list): Interfaces to scan, all the ones with IPv6 if None.
+        targets (iterable): Extra IPv6 addresses to solicit, e.g. known from
+                            the inventory.
+
+    Returns:
+        list: List of dictionaries containing the IPv6 and MAC addresses of
+              the hosts found.
+    """
+    if interfaces is None:
+        interfaces = get_ipv6_interfaces()
+    devices = []
+    if not interfaces:
+        return devices
+
+    # Neighbour table and scoped addresses, keyed by the interface to use
+    interface_targets = {}
+    for record in read_neighbours(AF_INET6):
+        if record['state'] not in ("FAILED", "NOARP"):
+            interface_targets.setdefault(record['interface'], set()).add(record['ip'])
+    unscoped = set()
+    for target in targets:
+        address, _, interface = target.partition('%')
+        if interface:
+            interface_targets.setdefault(interface, set()).add(address)
+        else:
+            unscoped.add(address)
+    targets = unscoped
+    for known in interface_targets.values():
+        targets -= known
+
+    def discover(interface):
+        with NdpScanner(interface) as scanner:
+            return scanner.discover(targets | interface_targets.get(interface, set()))
+
+    with ThreadPoolExecutor(max_workers=len(interfaces)) as executor:
+        futures = {executor.submit(discover, interface): interface
+                   for interface in interfaces}
+        for future in as_completed(futures):
+            interface = futures[future]
+            try:
+                devices += [{'ip': scoped_address(ip, interface), 'mac': mac}
+                            for ip, mac in future.result().items() if mac]
+            except Exception as e:
+                print(e)
+                print(f"NDP discovery failed on interface {interface}")
+
+    return devices
+
+
+def arping(ip_range, interface=None):
     """
     Send ARP request to a specified IP range and print devices that respond.
 
+    On Linux the range is swept from a raw socket that stops listening once
+    the replies dry up and retransmits only to the silent hosts; elsewhere
+    Scapy's arping is used with a fixed timeout.
+
     Args:
         ip_range (str): IP range to send ARP requests to.
+        interface (str): Interface to use, detected from the range if None.
 
     Returns:
-        list: List of dictionaries containing the IP and MAC addresses of devices that respond.
+        list: List of dictionaries containing the IP and MAC addresses of
+              devices that respond.
     """
+    if RAW_SOCKETS_SUPPORTED:
+        network = IPv4Network(ip_range, strict=False)
+        if interface is None:
+            interface = find_interface(str(network.network_address))
+        if interface is not None:
+            return scan_interface(interface, [network])
+
     # Send ARP request and receive responses using Scapy's arping function
+    from scapy.all import arping as scarping
+
     responses, _ = scarping(ip_range, timeout=10, verbose=0)
 
     # Parse the responses and store devices
@@ -230,47 +456,121 @@ def arping(ip_range):
 
 
 if __name__ == "__main__":
-    # Get all IP ranges
-    ips = get_all_ip_ranges()
-    devices = []
-    checked_networks = []
-
-    # Iterate over each IP range and perform ARPING
-    for ip in ips:
-        try:
-            # Skip localhost addresses
-            if ip[0] == "127.0.0.1" or ip[0] == "::1":
-                print(f"Skipping IP {ip[0]}/{ip[1]} since it's localhost.")
-                continue
-            # Skip IP ranges with a mask length less than 24
-            if ip[1] < 20:
-                print(
-                    f"Skipping IP {ip[0]}/{ip[1]} since submask is small (taking too much time).")
-                continue
-
-            network = str(IPv4Network(
-                f"{ip[0]}/{ip[1]}", strict=False)).replace(".0/", ".1/")
-            if network in checked_networks:
-                print(f"Network {network} already scanned. Skipping.")
-                continue
-            checked_networks.append(network)
-            print(f"Performing ARPING on IP {network}.")
-
-            devices = merge_lists_of_dicts(
-                devices, arping(network), "ip")
-        except Exception as e:
-            print(e)
-            print("Invalid network range for ARPING")
-
-    devices = sorted(devices, key=lambda x: inet_aton(x["ip"]))
-    devices = get_hostnames_from_ips(devices=devices)
-    devices = get_vendors_from_macs(devices=devices)
-
-    # Print the list of devices
-    table_data = []
-    # Start index from 1 instead of 0
-    for device in devices:
-        table_data.append([device['ip'], device['mac'],
-                          device['hostname'], device["vendor"]])
-    print(tabulate(table_data, headers=[
-          "IP Address", "MAC Address", "Hostname", "Vendor"], tablefmt="grid", showindex="always"))
+    parser = argparse.ArgumentParser(
+        description="Discover the devices of the local networks.")
+    parser.add_argument("--large", action="store_true",
+                        help=f"also scan networks larger than /{LARGE_NETWORK_PREFIX} "
+                             "in sharded mode")
+    parser.add_argument("--rate", type=int, default=1000,
+                        help="maximum ARP requests per second per interface "
+                             "(default: 1000)")
+    parser.add_argument("--inventory", metavar="PATH",
+                        help="SQLite inventory to update, enabling incremental rescans")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE,
+                        help="with --inventory, do not probe devices seen in the last "
+                             f"MAX_AGE seconds (default: {DEFAULT_MAX_AGE})")
+    parser.add_argument("--resolve-ttl", type=float, default=DEFAULT_RESOLVE_TTL,
+                        help="with --inventory, reuse hostnames and vendors resolved in "
+                             "the last RESOLVE_TTL seconds "
+                             f"(default: {DEFAULT_RESOLVE_TTL})")
+    parser.add_argument("--ipv6", action="store_true",
+                        help="also discover the IPv6 neighbours with NDP")
+    parser.add_argument("--passive", type=float, default=0, metavar="SECONDS",
+                        help="listen to the ARP and DHCP traffic for SECONDS first, "
+                             "then only probe the hosts that stayed silent")
+    add_dns_server_argument(parser)
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+    args = parser.parse_args()
+    configure_resolver(args.dns_server)
+
+    metrics = get_metrics()
+    metrics.enabled = args.metrics is not None
+    writer = DeviceWriter(args.format)
+    registry = DeviceRegistry()
+    written = set()
+
+    def publish(devices, seen=True):
+        """
+        Resolve and write the devices not written yet, as soon as they are found.
+        """
+        new = []
+        for device in devices:
+            # Merged even when written, so that a changed MAC shows as a conflict
+            device = registry.upsert(device)
+            if device["ip"] not in written:
+                written.add(device["ip"])
+                new.append(device)
+        if not new:
+            return
+        if inventory and seen:
+            # Only the devices answering now are stamped as seen
+            with metrics.stage("inventory"):
+                inventory.record(new)
+        # Resolve only the devices that are new, changed, or whose names expired
+        pending = inventory.fill_known(new, args.resolve_ttl) if inventory else new
+        get_hostnames_from_ips(devices=pending, mdns_resolver=mdns_resolver)
+        get_vendors_from_macs(devices=pending)
+        metrics.increment("devices_resolved", len(pending))
+        if inventory:
+            with metrics.stage("inventory"):
+                inventory.store_names(pending)
+        registry.update(new)
+        if args.format in STREAMING_FORMATS:
+            writer.write_many(new)
+
+    # Progress messages go to stderr with the machine-readable formats
+    with messages_to_stderr(args.format):
+        with metrics.stage("inventory"):
+            inventory = Inventory(args.inventory) if args.inventory else None
+            recent = inventory.recent(args.max_age) if inventory else []
+
+        # Start browsing mDNS announcements while the ARP scans run
+        mdns_resolver = HostnameResolver()
+
+        # Sweep every interface concurrently
+        with metrics.stage("interfaces"):
+            interface_networks = get_interface_networks(
+                min_prefix_length=0 if args.large else LARGE_NETWORK_PREFIX)
+        for interface, networks in interface_networks.items():
+            print(f"Performing ARPING on {interface}: {', '.join(map(str, networks))}.")
+        skip = frozenset(address_to_int(device["ip"])[0] for device in recent
+                         if ':' not in device["ip"])
+        if args.passive:
+            print(f"Listening to ARP and DHCP traffic for {args.passive:.0f}s.")
+            with PassiveListener(list(interface_networks)) as listener, \
+                    metrics.stage("passive"):
+                passive_devices = listener.listen(args.passive).devices()
+            print(f"Learned {len(passive_devices)} devices passively.")
+            skip |= frozenset(address_to_int(device["ip"])[0]
+                              for device in passive_devices)
+            publish(passive_devices)
+        # Each interface's devices are written while the others are still swept
+        with metrics.stage("arp_sweep"):
+            scan_interfaces(interface_networks, rate=args.rate, skip=skip,
+                            on_result=publish)
+        if args.ipv6:
+            print("Discovering the IPv6 neighbours.")
+            with metrics.stage("ndp"):
+                ipv6_devices = scan_ipv6_interfaces(
+                    targets=[device["ip"] for device in recent if ':' in device["ip"]])
+            publish(ipv6_devices)
+
+        if recent:
+            print(f"Skipped {len(recent)} devices seen in the last "
+                  f"{args.max_age:.0f}s.")
+            publish(recent, seen=False)
+        mdns_resolver.close()
+        if inventory:
+            inventory.close()
+        for conflict in registry.get_conflicts():
+            print(f"Warning: {conflict['ip']} answered from both {conflict['old_mac']} "
+                  f"and {conflict['new_mac']}.")
+        metrics.set("devices", len(registry))
+
+    with metrics.stage("output"):
+        if args.format not in STREAMING_FORMATS:
+            writer.write_many(registry.devices())
+        writer.close()
+    if args.metrics:
+        metrics.write_summary(args.metrics)
@@ -1,34 +1,14 @@
-import os
-import subprocess
-import re
-import json
+import argparse
+import queue
 from socket import gethostbyaddr, herror
-from tabulate import tabulate
-import psutil
-from scapy.all import arping as scarping
-
-# Function to load MAC map from a JSON file
-
-
-def load_mac_map():
-    script_directory = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(script_directory, 'mac_24bit.json')
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file, strict=False)
-    return data
-
-
-MAC_MAP = load_mac_map()
-
-
-def merge_lists_of_dicts(list1, list2, key):
-    unique_keys = set()
-    merged_list = []
-    for item in list1 + list2:
-        if item[key] not in unique_keys:
-            unique_keys.add(item[key])
-            merged_list.append(item)
-    return merged_list
+from oui_index import get_index
+from netlink import get_watcher
+from ndp import scoped_address
+from neighbours import read_neighbours
+from registry import DeviceRegistry
+from output import STREAMING_FORMATS, DeviceWriter, add_format_argument
+from parallel_enrich import add_vendors, parse_and_enrich, read_table_text
+from resolver import add_dns_server_argument, configure_resolver, get_resolver
 
 
 def get_hostname_from_ip(ip_address):
@@ -42,44 +22,138 @@ def get_hostname_from_ip(ip_address):
 
 
 def get_vendor_from_mac(mac_address):
-    oui = mac_address.upper().replace(":", "")[:6]
-    return MAC_MAP.get(oui)
-
+    return get_index().lookup(mac_address)
+
+
+def arping_live(workers=None):
+    """
+    List the devices of the kernel neighbour table with their hostname and vendor.
+
+    Args:
+        workers (int): If set, parse the table as text and look the vendors up
+                       in that many worker processes, for tables of tens of
+                       thousands of entries; otherwise read it over netlink.
+
+    Returns:
+        list: List of dictionaries containing the IP, MAC, hostname and vendor
+              of the neighbours.
+    """
+    if workers:
+        kind, text = read_table_text()
+        records = parse_and_enrich(text, kind, workers=workers)
+    else:
+        records = read_neighbours()
+        add_vendors(records, get_index())
+    # Multicast, broadcast and loopback entries are not devices
+    records = [record for record in records if record['state'] != "NOARP"]
+
+    # Resolve the hostnames arp did not report, concurrently
+    hostnames = get_resolver().resolve_many(
+        record['ip'] for record in records if not record.get('hostname'))
 
-def arping_live():
     devices = []
-    process = subprocess.Popen(
-        ["arp", "-a"], stdout=subprocess.PIPE, text=True, bufsize=1)
-    pattern = r'([\w\.-]+)? \((\d+\.\d+\.\d+\.\d+)\) at \(?([0-9a-fA-F:]+)?\)? on'
+    for record in records:
+        mac_address = record['mac'] or ""
+        hostname = record.get('hostname') or hostnames[record['ip']]
+        if hostname or mac_address:
+            devices.append({'ip': scoped_address(record['ip'], record.get('interface')),
+                            'mac': mac_address, 'hostname': hostname,
+                            'vendor': record['vendor']})
+    return devices
 
+
+def watched_devices(records):
+    """
+    Turn records of the netlink watcher into devices, looking their hostnames
+    and vendors up in one batch.
+
+    Args:
+        records (iterable): Records as kept by the NeighbourWatcher.
+
+    Returns:
+        list: List of dictionaries containing the IP, MAC, hostname and vendor
+              of the neighbours.
+    """
+    # Copies, the watcher keeps the records it hands out
+    records = [dict(record) for record in records if record['mac']
+               and record['state'] not in ("FAILED", "INCOMPLETE", "NOARP")]
+    add_vendors(records, get_index())
+    hostnames = get_resolver().resolve_many(record['ip'] for record in records)
+    return [{'ip': scoped_address(record['ip'], record['interface']),
+             'mac': record['mac'], 'hostname': hostnames[record['ip']],
+             'vendor': record['vendor']}
+            for record in records]
+
+
+def arping_watched():
+    """
+    Same output as arping_live, read from the in-memory neighbour table kept
+    up to date by the netlink watcher instead of running `arp -a`.
+
+    Returns:
+        list: List of dictionaries containing the IP, MAC, hostname and vendor
+              of the neighbours.
+    """
+    return watched_devices(get_watcher().devices())
+
+
+def watch_neighbours(writer):
+    """
+    Write the devices of the neighbour table, then every device appearing or
+    changing its MAC address, until interrupted.
+
+    With the table and json formats, the devices of each batch of changes
+    are printed as one table or array.
+
+    Args:
+        writer (DeviceWriter): Where the devices go.
+    """
+    watcher = get_watcher()
+    changes = queue.Queue()
+    # Registered before the snapshot, so that no change is missed in between
+    watcher.add_callback(
+        lambda event, record: changes.put(record) if event != "deleted" else None)
+    written = {}
+    records = watcher.devices()
     while True:
-        line = process.stdout.readline().strip().replace("incomplete", '')
-
-        if not line and process.poll() is not None:
-            break
-        match = re.search(pattern, line)
-        if match:
-            hostname = match.group(1)  # Capturing hostname if available
-            ip_address = match.group(2)
-            mac_address = match.group(3) if match.group(3) else ""
-
-            # If hostname is not provided in the ARP output, set it to None
-            if not hostname:
-                hostname = get_hostname_from_ip(ip_address=ip_address)
-            if hostname or mac_address:
-                vendor = get_vendor_from_mac(mac_address=mac_address)
-                devices.append({'ip': ip_address, 'mac': mac_address,
-                           'hostname': hostname, 'vendor': vendor})
-            # print(
-            #     f"IP Address: {ip_address}, MAC Address: {mac_address}, Hostname: {hostname}, Vendor: {vendor}")
-    return devices
+        changed = 0
+        for device in DeviceRegistry(watched_devices(records)).devices():
+            if written.get(device['ip']) != device['mac']:
+                written[device['ip']] = device['mac']
+                writer.write(device)
+                changed += 1
+        if changed and writer.format not in STREAMING_FORMATS:
+            writer.close()
+        # Wait for the next change, then take the ones that came with it
+        records = [changes.get()]
+        while not changes.empty():
+            records.append(changes.get_nowait())
 
 
 if __name__ == "__main__":
-    devices = merge_lists_of_dicts([], arping_live(), "ip")
-    table_data = []
-    for i, device in enumerate(devices, start=1):
-        table_data.append([i, device['ip'], device['mac'],
-                          device['hostname'], device["vendor"]])
-    print(tabulate(table_data, headers=[
-          "Index", "IP Address", "MAC Address", "Hostname", "Vendor"], tablefmt="grid"))
+    parser = argparse.ArgumentParser(
+        description="List the devices of the neighbour table.")
+    parser.add_argument("--workers", type=int,
+                        help="parse the table in WORKERS processes, "
+                             "for very large tables")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and write the devices appearing in the table "
+                             "or changing their MAC address, from netlink events "
+                             "(default format: ndjson)")
+    add_dns_server_argument(parser)
+    add_format_argument(parser)
+    # Known once --watch is parsed, the table would only print on exit
+    parser.set_defaults(format=None)
+    args = parser.parse_args()
+    configure_resolver(args.dns_server)
+    if args.format is None:
+        args.format = "ndjson" if args.watch else "table"
+
+    with DeviceWriter(args.format) as writer:
+        if args.watch:
+            try:
+                watch_neighbours(writer)
+            except KeyboardInterrupt:
+                pass
+        else:
+            writer.write_many(DeviceRegistry(arping_live(args.workers)).devices())
@@ -1,34 +1,16 @@
+import argparse
 from enum import Enum
-from ipaddress import IPv4Network
-from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv4Address, IPv4Network
+from itertools import chain, islice
 from socket import AF_INET, AF_INET6, gethostbyaddr, herror
-import subprocess
-import re
-import os
-import json
-import psutil
-from tabulate import tabulate
-
-# Regular expression pattern to extract information from the "arp" command output
-pattern = r'([\w\.-]+)? \((\d+\.\d+\.\d+\.\d+)\) at \(?([0-9a-fA-F:]+)?\)? on'
-
-
-def load_mac_map():
-    """
-    Load MAC address vendor information from a JSON file.
-
-    Returns:
-        dict: MAC address vendor information.
-    """
-    script_directory = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(script_directory, 'mac_24bit.json')
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file, strict=False)
-    return data
-
-
-# Load MAC address vendor information
-MAC_MAP = load_mac_map()
+from address_math import (NetworkSet, address_to_int, int_to_address, network_bounds,
+                          subnet_mask_to_mask_length)
+from arp_sweep import ArpSweeper, find_interface, host_range
+from metrics import add_metrics_argument, get_metrics
+from oui_index import get_index
+from resolver import get_resolver
+from sharded_scan import sharded_scan
+from output import DeviceWriter, add_format_argument, messages_to_stderr
 
 
 class isIPVersion(Enum):
@@ -75,38 +57,6 @@ class isIPVersion(Enum):
         return addr.family == AF_INET or addr.family == AF_INET6
 
 
-def subnet_mask_to_mask_length(subnet_mask):
-    """
-    Convert subnet mask to mask length (prefix length).
-
-    Args:
-        subnet_mask (str): Subnet mask in dotted-decimal notation for IPv4
-                           or hexadecimal notation for IPv6.
-
-    Returns:
-        int: Mask length (prefix length).
-    """
-    # Check if the subnet mask is IPv4 or IPv6
-    if '.' in subnet_mask:  # For IPv4
-        binary_mask = ''.join([bin(int(x))[2:].zfill(8)
-                              for x in subnet_mask.split('.')])
-    elif ':' in subnet_mask:  # For IPv6
-        binary_mask = ''.join([bin(int(x, 16))[2:].zfill(16)
-                              for x in subnet_mask.split(':')])
-    else:
-        raise ValueError("Invalid subnet mask format.")
-
-    # Count the number of consecutive '1' bits to determine the mask length
-    mask_length = 0
-    for bit in binary_mask:
-        if bit == '1':
-            mask_length += 1
-        else:
-            break
-
-    return mask_length
-
-
 def get_all_ip_ranges(ipv: isIPVersion = isIPVersion.IPv4):
     """
     Retrieve all IP ranges based on the specified IP version.
@@ -117,6 +67,8 @@ def get_all_ip_ranges(ipv: isIPVersion = isIPVersion.IPv4):
     Returns:
         list: List of IP addresses and their corresponding mask lengths.
     """
+    import psutil
+
     ip_ranges = []
 
     # Iterate over all network interfaces
@@ -142,142 +94,152 @@ def get_hostname_from_ip(ip_address):
         return f"Error occurred: {e}"
 
 
-def add_leading_zeroes(mac_address):
-    """
-    Add leading zeroes to each segment of a MAC address to make them two digits.
-
-    Args:
-        mac_address (str): MAC address in the format "XX:XX:XX:XX:XX:XX".
-
-    Returns:
-        str: MAC address with leading zeroes added to each segment.
-    """
-    segments = mac_address.split(':')
-    formatted_segments = [segment.zfill(2) for segment in segments]
-    return ':'.join(formatted_segments)
-
-
 def get_vendor_from_mac(mac_address):
-    mac_address = add_leading_zeroes(mac_address=mac_address)
-    oui = mac_address.upper().replace(":", "")[:6]
-    return MAC_MAP.get(oui)
+    return get_index().lookup(mac_address)
 
 
 def generate_ip_list(base_ip, subnet_mask):
     """
-    Generate a list of possible IPs within a given subnet.
+    Enumerate the possible IPs within a given subnet, lazily.
 
     Args:
         base_ip (str): Base IP address in dotted-decimal notation.
         subnet_mask (str): Subnet mask in dotted-decimal notation.
 
     Returns:
-        list: List of possible IPs within the subnet.
+        range: Possible IPs within the subnet as integers; nothing is
+               materialized whatever the subnet size.
     """
     print(f"Base IP: {base_ip}")
     print(f"Subnet: {subnet_mask}")
     base_network = IPv4Network(f"{base_ip}/{subnet_mask}", strict=False)
     print(f"Base network: {base_network}")
-    return [str(ip) for ip in base_network.hosts()]
+    return host_range(base_network)
 
 
-def chunk_ips(ip_list, chunk_size):
+def chunk_ips(ips, chunk_size):
     """
-    Chunk the list of IPs into subnets of a specified size.
+    Chunk an iterable of IPs into batches of a specified size.
+
+    Only one batch is held in memory at a time.
 
     Args:
-        ip_list (list): List of IPs.
-        chunk_size (int): Size of each subnet.
+        ips (iterable): IPs to chunk.
+        chunk_size (int): Size of each batch.
 
-    Returns:
-        list: List of lists, where each sublist represents a subnet of IPs.
+    Yields:
+        list: Batches of at most chunk_size IPs.
     """
-    return [ip_list[i:i + chunk_size] for i in range(0, len(ip_list), chunk_size)]
+    iterator = iter(ips)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
 
 
-def arp_scan(ips):
+def arp_scan(ips, interface=None, rate=1000, timeout=None, chunk_size=4096):
     """
-    Perform ARP scanning towards a specific IP using the "arp" command.
+    Perform ARP scanning towards a list of IPs with a single raw-socket sweep.
+
+    All the requests are sent from one AF_PACKET socket at the given rate and
+    the replies are collected on the same socket, instead of spawning one
+    "arp" process per IP. The targets are consumed chunk by chunk, so at most
+    chunk_size of them are in flight (awaiting a reply or a retransmission).
 
     Args:
-        ip (str): IP address to scan.
+        ips (iterable): IP addresses to scan, as integers or strings.
+        interface (str): Interface to scan on, detected from the first IP if None.
+        rate (int): Maximum number of ARP requests sent per second.
+        timeout (float): Seconds to wait for replies after the last request,
+                         None to adapt it to the observed reply latency.
+        chunk_size (int): Maximum number of targets in flight.
 
     Returns:
-        dict: Dictionary containing the IP and MAC addresses of devices that respond.
-    """
+        list: Dictionaries containing the IP, MAC, vendor and hostname of each
+              IP that responded.
+    """
+    chunks = chunk_ips(ips, chunk_size)
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        return []
+    if interface is None:
+        interface = find_interface(first_chunk[0])
+        if interface is None:
+            raise ValueError(
+                f"No local interface found for {IPv4Address(first_chunk[0])}")
+
     devices = []
-    for ip in ips:
-        try:
-            result = subprocess.Popen(
-                ["arp", ip], stdout=subprocess.PIPE, text=True, bufsize=1)
-            line, _ = result.communicate()
-            match = re.search(pattern, line.strip().replace("incomplete", ''))
-            if match:
-                hostname = match.group(1)  # Capturing hostname if available
-                ip_address = match.group(2)
-                mac_address = match.group(
-                    3) if match.group(3) else "incomplete"
-
-                if not hostname:
-                    hostname = get_hostname_from_ip(ip_address=ip_address)
-
-                devices.append({'ip': ip_address, 'mac': mac_address, 'vendor': get_vendor_from_mac(
-                    mac_address=mac_address), 'hostname': hostname})
-            else:
-                devices.append(
-                    {'ip': ip, 'mac': None, 'vendor': None, 'hostname': None})
-        except subprocess.CalledProcessError as e:
-            devices.append(
-                {'ip': ip, 'mac': None, 'vendor': None, 'hostname': None})
+    with ArpSweeper(interface, rate=rate, timeout=timeout) as sweeper:
+        for chunk in chain([first_chunk], chunks):
+            replies = sweeper.sweep(chunk)
+            hostnames = get_resolver().resolve_many(replies)
+            for ip, mac_address in replies.items():
+                devices.append({'ip': ip, 'mac': mac_address,
+                                'vendor': get_vendor_from_mac(mac_address=mac_address),
+                                'hostname': hostnames[ip]})
     return devices
 
 
 if __name__ == "__main__":
-    with ThreadPoolExecutor(max_workers=8) as executor:
+    parser = argparse.ArgumentParser(
+        description="Discover the devices of the local networks.")
+    parser.add_argument("--large", action="store_true",
+                        help="also scan networks larger than /20 in sharded mode")
+    parser.add_argument("--rate", type=int, default=1000,
+                        help="maximum ARP requests per second (default: 1000)")
+    add_format_argument(parser)
+    add_metrics_argument(parser)
+    args = parser.parse_args()
+
+    metrics = get_metrics()
+    metrics.enabled = args.metrics is not None
+    writer = DeviceWriter(args.format)
+    # Progress messages go to stderr with the machine-readable formats
+    with messages_to_stderr(args.format):
         # Get all IP ranges
         ips = get_all_ip_ranges()
-        devices = []
-        checked_networks = []
-        chunk_size = 1
-        subnet_chunks = []
-        possible_ips = []
-        table_data = []
-
-        futures = []
+        checked_networks = NetworkSet()
+
         for base_ip, subnet_mask in ips:
-            print(base_ip)
-            print(subnet_mask)
-            print(checked_networks)
             full_ip = f"{base_ip}/{subnet_mask}"
-            network = str(IPv4Network(full_ip, strict=False)).replace(".0/", ".1/")
-            if network in checked_networks:
-                print(
-                    f"Skipping network {network} since already processed.")
+            first, last = network_bounds(address_to_int(base_ip)[0], subnet_mask)
+            if checked_networks.covers(first, last):
+                print(f"Skipping network {int_to_address(first)}/{subnet_mask} "
+                      "since already processed.")
                 continue
             if base_ip == "127.0.0.1" or base_ip == "::1":
                 print(
                     f"Skipping IP {full_ip} since it's localhost.")
                 continue
-            if subnet_mask < 20:
-                print(
-                    f"Skipping IP {full_ip} since submask is small (taking too much time).")
+            if subnet_mask < 20 and not args.large:
+                print(f"Skipping IP {full_ip} since submask is small "
+                      "(taking too much time).")
                 continue
-
-            ips = generate_ip_list(base_ip, subnet_mask)
-            subnet_chunks += chunk_ips(ips, chunk_size)
-            checked_networks.append(network)
-
-            # Submit ARP scanning task for each subnet in parallel
-            futures = [executor.submit(arp_scan, chunk)
-                       for chunk in subnet_chunks]
-
-        for future in futures:
-            devices = future.result()
-            for device in devices:
-                if device['mac'] and not device['mac'] == "incomplete":
-                    table_data.append([device['ip'], device['mac'],
-                                       device['hostname'], device["vendor"]])
-
-    print("List of Devices:")
-    print(tabulate(table_data, headers=[
-          "IP Address", "MAC Address", "Hostname", "Vendor"], tablefmt="grid", showindex="always"))
+            checked_networks.add(first, last)
+
+            try:
+                with metrics.stage("scan", network=full_ip):
+                    if subnet_mask < 20:
+                        # Split the network into shards swept by worker processes
+                        devices = sharded_scan(full_ip, rate=args.rate)
+                        hostnames = get_resolver().resolve_many(
+                            device['ip'] for device in devices)
+                        for device in devices:
+                            device['vendor'] = get_vendor_from_mac(device['mac'])
+                            device['hostname'] = hostnames[device['ip']]
+                    else:
+                        # Sweep the whole subnet from a single raw socket
+                        devices = arp_scan(generate_ip_list(base_ip, subnet_mask),
+                                           rate=args.rate)
+            except PermissionError:
+                print("ARP sweep requires root privileges (CAP_NET_RAW).")
+                break
+            # Each network is output as soon as it is scanned
+            writer.write_many(device for device in devices if device['mac'])
+
+    if args.format == "table":
+        print("List of Devices:")
+    writer.close()
+    if args.metrics:
+        metrics.write_summary(args.metrics)
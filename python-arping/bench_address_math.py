@@ -0,0 +1,149 @@
+import argparse
+import random
+import time
+from ipaddress import IPv4Network
+
+from address_math import (NetworkSet, address_to_int, int_to_address, interface_network,
+                          network_bounds, prefix_to_mask, subnet_mask_to_mask_length)
+
+
+def binary_string_mask_length(subnet_mask):
+    """
+    The former subnet_mask_to_mask_length: one binary string per octet.
+    """
+    binary_mask = ''.join([bin(int(x))[2:].zfill(8) for x in subnet_mask.split('.')])
+    mask_length = 0
+    for bit in binary_mask:
+        if bit == '1':
+            mask_length += 1
+        else:
+            break
+    return mask_length
+
+
+def string_identity_dedup(addresses):
+    """
+    The former arping_parallel loop: networks compared as strings in a list.
+    """
+    checked_networks = []
+    for base_ip, prefix_length in addresses:
+        network = str(IPv4Network(f"{base_ip}/{prefix_length}", strict=False))
+        network = network.replace(".0/", ".1/")
+        if network in checked_networks:
+            continue
+        checked_networks.append(network)
+    return len(checked_networks)
+
+
+def subnet_of_dedup(addresses):
+    """
+    The former get_interface_networks: network objects checked against every
+    selected one.
+    """
+    candidates = sorted((IPv4Network(f"{address}/{netmask}", strict=False)
+                         for address, netmask in addresses),
+                        key=lambda network: network.prefixlen)
+    selected = []
+    for network in candidates:
+        if any(network.subnet_of(other) for other in selected):
+            continue
+        selected.append(network)
+    return len(selected)
+
+
+def ranges_dedup(addresses):
+    """
+    Networks as integer ranges in a NetworkSet, as get_interface_networks does now.
+    """
+    networks = (interface_network(address, netmask) for address, netmask in addresses)
+    candidates = sorted((prefix_length, first, last)
+                        for first, last, prefix_length in networks)
+    selected = NetworkSet()
+    count = 0
+    for prefix_length, first, last in candidates:
+        if selected.covers(first, last):
+            continue
+        selected.add(first, last)
+        count += 1
+    return count
+
+
+def container_host(count, seed=0):
+    """
+    Interface addresses of a container host: one /30 per veth, a /24 per
+    bridge shared by a few of them, and duplicates of the same networks.
+
+    Returns:
+        list: (address, netmask) pairs.
+    """
+    rng = random.Random(seed)
+    addresses = []
+    for index in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            prefix_length = 30
+            base = (10 << 24) | (index << 2)
+        elif kind < 0.9:
+            prefix_length = 24
+            base = (172 << 24) | (16 << 16) | (rng.randrange(256) << 8)
+        else:
+            prefix_length = 20
+            base = (192 << 24) | (168 << 16) | (rng.randrange(16) << 12)
+        addresses.append((int_to_address(base | 1),
+                          int_to_address(prefix_to_mask(prefix_length))))
+    return addresses
+
+
+def timed(function, *args, repeat=5):
+    """
+    Best time of several runs, to leave out the cold caches.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def report(name, count, elapsed, baseline):
+    print(f"{name:<40} {count:>7} {elapsed * 1000:>10.2f}ms {baseline / elapsed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the integer address math with the former string-based "
+                    "code.")
+    parser.add_argument("--interfaces", type=int, default=5000,
+                        help="Number of interface addresses on the simulated host")
+    args = parser.parse_args()
+
+    addresses = container_host(args.interfaces)
+    masks = [netmask for _, netmask in addresses]
+    prefixes = [(address, subnet_mask_to_mask_length(netmask))
+                for address, netmask in addresses]
+
+    print(f"{'operation':<40} {'result':>7} {'time':>12} {'speedup':>8}")
+    lengths, baseline = timed(
+        lambda: [binary_string_mask_length(mask) for mask in masks])
+    report("mask length, binary strings", sum(lengths), baseline, baseline)
+    lengths, elapsed = timed(
+        lambda: [subnet_mask_to_mask_length(mask) for mask in masks])
+    report("mask length, bit operations", sum(lengths), elapsed, baseline)
+
+    count, baseline = timed(
+        lambda: [IPv4Network(f"{address}/{prefix_length}", strict=False)
+                 for address, prefix_length in prefixes])
+    report("network bounds, IPv4Network", len(count), baseline, baseline)
+    count, elapsed = timed(
+        lambda: [network_bounds(address_to_int(address)[0], prefix_length)
+                 for address, prefix_length in prefixes])
+    report("network bounds, masks", len(count), elapsed, baseline)
+
+    count, baseline = timed(string_identity_dedup, prefixes, repeat=1)
+    report("dedup, string identity in a list", count, baseline, baseline)
+    count, elapsed = timed(subnet_of_dedup, addresses, repeat=1)
+    report("dedup, subnet_of against selected", count, elapsed, baseline)
+    count, elapsed = timed(ranges_dedup, addresses)
+    report("dedup, NetworkSet", count, elapsed, baseline)
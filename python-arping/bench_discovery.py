@@ -0,0 +1,372 @@
+import argparse
+import heapq
+import json
+import os
+import random
+import resource
+import select
+import socket
+import struct
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from ipaddress import IPv4Network
+
+from arp_sweep import (ARP_REQUEST, ARP_REPLY, ETH_P_ARP, MIN_FRAME_LENGTH, host_range,
+                       parse_arp)
+
+# Namespaces and links of the simulated segment:
+#   SCAN_NAMESPACE: SCAN_INTERFACE (first address of the network)
+#   LAN_NAMESPACE:  bridge BRIDGE with the peer of SCAN_INTERFACE and the
+#                   peer of RESPONDER_INTERFACE, on which every fake host answers
+SCAN_NAMESPACE = "arpbench-scan"
+LAN_NAMESPACE = "arpbench-lan"
+SCAN_INTERFACE = "scan0"
+BRIDGE = "br0"
+RESPONDER_INTERFACE = "hosts0"
+
+BENCH_NETWORK = "10.224.0.0"
+ENGINES = ("arping", "arp_scan", "sharded", "discover")
+SCRIPT = os.path.abspath(__file__)
+
+# Maximum throughput drop tolerated by --baseline before failing
+DEFAULT_TOLERANCE = 0.2
+
+
+def fake_hosts(network, count, seed=0):
+    """
+    Integer addresses of the fake hosts of a network, never its first host (the scanner).
+    """
+    addresses = host_range(network)
+    count = min(count, len(addresses) - 1)
+    return sorted(random.Random(f"{seed}-{network}").sample(addresses[1:], count))
+
+
+def fake_mac(ip_address):
+    """
+    Locally administered MAC address derived from an integer address.
+    """
+    return b"\x02\x00" + struct.pack('!I', ip_address)
+
+
+def build_arp_reply(src_mac, src_ip, dst_mac, dst_ip):
+    """
+    Build the Ethernet frame of an ARP "is-at" reply.
+    """
+    ethernet = dst_mac + src_mac + struct.pack('!H', ETH_P_ARP)
+    arp = struct.pack('!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, ARP_REPLY,
+                      src_mac, src_ip, dst_mac, dst_ip)
+    return (ethernet + arp).ljust(MIN_FRAME_LENGTH, b"\x00")
+
+
+def respond(interface, hosts, latency=0.0, jitter=0.0, loss=0.0, seed=0):
+    """
+    Answer the ARP requests for the fake hosts until killed.
+
+    Each reply is sent latency (plus up to jitter) seconds after its request,
+    and a request is ignored with probability loss, as a busy or lossy host would.
+    """
+    rng = random.Random(seed)
+    hosts = frozenset(hosts)
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    sock.bind((interface, ETH_P_ARP))
+    sock.setblocking(False)
+    # (send time, sequence, frame) of the replies waiting for their latency
+    scheduled = []
+    sequence = 0
+    print("ready", flush=True)
+    while True:
+        wait = max(0.0, scheduled[0][0] - time.monotonic()) if scheduled else None
+        readable, _, _ = select.select([sock], [], [], wait)
+        if readable:
+            while True:
+                try:
+                    frame = sock.recv(65535)
+                except BlockingIOError:
+                    break
+                parsed = parse_arp(frame)
+                if parsed is None or parsed[0] != ARP_REQUEST:
+                    continue
+                _, sender_ip, sender_mac, target_ip = parsed
+                target = struct.unpack('!I', target_ip)[0]
+                if target not in hosts or (loss and rng.random() < loss):
+                    continue
+                reply = build_arp_reply(
+                    fake_mac(target), target_ip, sender_mac, sender_ip)
+                delay = latency + (rng.random() * jitter if jitter else 0.0)
+                if delay <= 0:
+                    sock.send(reply)
+                    continue
+                sequence += 1
+                heapq.heappush(scheduled, (time.monotonic() + delay, sequence, reply))
+        now = time.monotonic()
+        while scheduled and scheduled[0][0] <= now:
+            sock.send(heapq.heappop(scheduled)[2])
+
+
+def run(command, check=True):
+    return subprocess.run(command, check=check, capture_output=True, text=True)
+
+
+def in_namespace(namespace, *command):
+    return ["ip", "netns", "exec", namespace, *command]
+
+
+def create_topology(network):
+    """
+    Create the two namespaces and the bridged segment; the scanner gets the
+    first host address of the network.
+    """
+    delete_topology()
+    run(["ip", "netns", "add", SCAN_NAMESPACE])
+    run(["ip", "netns", "add", LAN_NAMESPACE])
+
+    def lan(*command):
+        return run(in_namespace(LAN_NAMESPACE, "ip", *command))
+
+    def scan(*command):
+        return run(in_namespace(SCAN_NAMESPACE, "ip", *command))
+
+    lan("link", "add", BRIDGE, "type", "bridge")
+    for interface in (SCAN_INTERFACE, RESPONDER_INTERFACE):
+        lan("link", "add", interface, "type", "veth", "peer", "name", interface + "p")
+    lan("link", "set", SCAN_INTERFACE, "netns", SCAN_NAMESPACE)
+    for port in (SCAN_INTERFACE + "p", RESPONDER_INTERFACE + "p"):
+        lan("link", "set", port, "master", BRIDGE)
+        lan("link", "set", port, "up")
+    lan("link", "set", RESPONDER_INTERFACE, "up")
+    lan("link", "set", BRIDGE, "up")
+    scan("addr", "add", f"{network[1]}/{network.prefixlen}", "dev", SCAN_INTERFACE)
+    scan("link", "set", SCAN_INTERFACE, "up")
+    scan("link", "set", "lo", "up")
+
+
+def delete_topology():
+    for namespace in (SCAN_NAMESPACE, LAN_NAMESPACE):
+        run(["ip", "netns", "del", namespace], check=False)
+
+
+def start_responder(network, args):
+    """
+    Start the fake hosts of a network in the LAN namespace and wait until they listen.
+    """
+    command = in_namespace(LAN_NAMESPACE, sys.executable, SCRIPT,
+                           "--respond", str(network), "--hosts", str(args.hosts),
+                           "--latency", str(args.latency),
+                           "--jitter", str(args.jitter), "--loss", str(args.loss),
+                           "--seed", str(args.seed))
+    responder = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    if responder.stdout.readline().strip() != "ready":
+        raise RuntimeError("The responder failed to start")
+    return responder
+
+
+def scan(engine, network, rate):
+    """
+    Run one engine on the network from SCAN_INTERFACE.
+
+    Returns:
+        set: IP addresses (str) of the hosts found.
+    """
+    if engine == "arping":
+        from arping import scan_interface
+
+        devices = scan_interface(SCAN_INTERFACE, [network], rate=rate)
+    elif engine == "arp_scan":
+        from arping_parallel import arp_scan
+
+        devices = arp_scan(host_range(network), interface=SCAN_INTERFACE, rate=rate)
+    elif engine == "sharded":
+        from sharded_scan import sharded_scan
+
+        devices = sharded_scan(str(network), interface=SCAN_INTERFACE, rate=rate,
+                               progress=None)
+    elif engine == "discover":
+        import asyncio
+
+        from discovery import discover
+
+        async def collect():
+            return [device async for device in discover(
+                [str(network)], interface=SCAN_INTERFACE, rate=rate,
+                hostnames=False, vendors=False, mdns=False)]
+
+        devices = asyncio.run(collect())
+    else:
+        raise ValueError(f"Unknown engine {engine}")
+    return {device['ip'] for device in devices if device.get('mac')}
+
+
+def measure(engine, network, rate, hosts):
+    """
+    Time one engine inside the scan namespace; runs in its own process so that
+    its peak memory is its own.
+
+    Returns:
+        dict: Duration, throughput, recall and memory of the run.
+    """
+    expected = {socket.inet_ntoa(struct.pack('!I', ip)) for ip in hosts}
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    # Keep stdout for the result line
+    with redirect_stdout(sys.stderr):
+        found = scan(engine, network, rate)
+    elapsed = time.perf_counter() - start
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'engine': engine,
+        'network': str(network),
+        'addresses': len(host_range(network)) - 1,
+        'hosts': len(expected),
+        'found': len(found & expected),
+        'unexpected': len(found - expected),
+        'seconds': elapsed,
+        'probes_per_second': (len(host_range(network)) - 1) / elapsed,
+        'peak_rss_kb': rss_peak,
+        'rss_growth_kb': rss_peak - rss_before,
+    }
+
+
+def report(result, baseline=None):
+    recall = result['found'] / result['hosts'] if result['hosts'] else 1.0
+    line = (f"{result['engine']:<10} {result['network']:<16} "
+            f"{result['found']:>6}/{result['hosts']:<6} {recall:>6.1%} "
+            f"{result['seconds']:>9.2f}s {result['probes_per_second']:>10.0f}/s "
+            f"{result['peak_rss_kb'] / 1024:>8.1f}MB "
+            f"{result['rss_growth_kb'] / 1024:>+8.1f}MB")
+    if baseline:
+        line += f" {result['probes_per_second'] / baseline['probes_per_second']:>6.2f}x"
+    print(line, flush=True)
+
+
+def regressions(result, baseline, tolerance, min_recall):
+    """
+    Reasons why a result is worse than its baseline, or than the expected recall.
+    """
+    problems = []
+    if result['hosts'] and result['found'] / result['hosts'] < min_recall:
+        problems.append(f"found {result['found']} of {result['hosts']} hosts")
+    if baseline and (result['probes_per_second']
+                     < baseline['probes_per_second'] * (1 - tolerance)):
+        problems.append(f"throughput {result['probes_per_second']:.0f}/s, "
+                        f"baseline {baseline['probes_per_second']:.0f}/s")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the discovery engines against fake hosts on a simulated "
+                    "L2 segment (veth pairs and a bridge in network namespaces). "
+                    "Needs root.")
+    parser.add_argument("--engines", default=",".join(ENGINES),
+                        help="comma-separated engines to time "
+                             f"(default: {','.join(ENGINES)})")
+    parser.add_argument("--prefixes", default="24,22,20",
+                        help="comma-separated prefix lengths of the networks to scan, "
+                             "from 24 down to 16 (default: 24,22,20)")
+    parser.add_argument("--hosts", type=int, default=200,
+                        help="fake hosts answering in each network (default: 200)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds each host waits before replying (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="extra random delay of up to JITTER seconds (default: 0)")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="probability a request is ignored (default: 0)")
+    parser.add_argument("--rate", type=int, default=5000,
+                        help="ARP requests per second given to the engines "
+                             "(default: 5000)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the host placement and loss")
+    parser.add_argument("--save", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="results saved by --save to compare with; "
+                             "exits 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="throughput drop tolerated against the baseline "
+                             f"(default: {DEFAULT_TOLERANCE})")
+    parser.add_argument("--min-recall", type=float,
+                        help="fraction of the hosts that must be found "
+                             "(default: 1 without loss, 0 otherwise)")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the namespaces afterwards")
+    # Internal modes, run inside the namespaces
+    parser.add_argument("--respond", metavar="NETWORK", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", nargs=2, metavar=("ENGINE", "NETWORK"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.respond:
+        network = IPv4Network(args.respond)
+        respond(RESPONDER_INTERFACE, fake_hosts(network, args.hosts, args.seed),
+                args.latency, args.jitter, args.loss, args.seed)
+        sys.exit(0)
+    if args.measure:
+        engine, network = args.measure[0], IPv4Network(args.measure[1])
+        print(json.dumps(measure(engine, network, args.rate,
+                                 fake_hosts(network, args.hosts, args.seed))))
+        sys.exit(0)
+
+    if os.geteuid() != 0:
+        sys.exit("The benchmark creates network namespaces and needs root")
+    engines = args.engines.split(",")
+    prefixes = sorted({int(prefix) for prefix in args.prefixes.split(",")}, reverse=True)
+    if not all(16 <= prefix <= 24 for prefix in prefixes):
+        sys.exit("The prefix lengths must be between 16 and 24")
+    min_recall = args.min_recall
+    if min_recall is None:
+        min_recall = 0.0 if args.loss else 1.0
+    baselines = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baselines = {(result['engine'], result['network']): result
+                         for result in json.load(file)['results']}
+
+    # The scanner address is in the largest network, so it is local to all of them
+    largest = IPv4Network(f"{BENCH_NETWORK}/{prefixes[-1]}")
+    create_topology(largest)
+    results = []
+    failures = []
+    print(f"{'engine':<10} {'network':<16} {'found':>13} {'recall':>6} {'time':>10} "
+          f"{'throughput':>12} {'peak RSS':>10} {'growth':>9}"
+          + (" vs base" if baselines else ""))
+    try:
+        for prefix in prefixes:
+            network = IPv4Network(f"{BENCH_NETWORK}/{prefix}")
+            responder = start_responder(network, args)
+            try:
+                for engine in engines:
+                    output = run(in_namespace(
+                        SCAN_NAMESPACE, sys.executable, SCRIPT,
+                        "--measure", engine, str(network), "--hosts", str(args.hosts),
+                        "--rate", str(args.rate),
+                        "--seed", str(args.seed)), check=False)
+                    if output.returncode != 0:
+                        print(f"{engine:<10} {str(network):<16} "
+                              f"failed:\n{output.stderr}")
+                        failures.append(f"{engine} on {network} failed")
+                        continue
+                    result = json.loads(output.stdout.splitlines()[-1])
+                    baseline = baselines.get((engine, str(network)))
+                    report(result, baseline)
+                    results.append(result)
+                    problems = regressions(result, baseline, args.tolerance, min_recall)
+                    failures += [f"{engine} on {network}: {problem}"
+                                 for problem in problems]
+            finally:
+                responder.kill()
+                responder.wait()
+    finally:
+        if not args.keep:
+            delete_topology()
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({'parameters': {'hosts': args.hosts, 'latency': args.latency,
+                                      'jitter': args.jitter, 'loss': args.loss,
+                                      'rate': args.rate, 'seed': args.seed},
+                       'results': results}, file, indent=2)
+    for failure in failures:
+        print(f"Regression: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
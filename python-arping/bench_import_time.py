@@ -0,0 +1,68 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Entry points started by short-lived callers (libvirt hooks, cron, scripts)
+MODULES = ("arping", "arping2", "arping_parallel", "discovery", "daemon",
+           "mac_finder", "passive", "inventory", "oui_index")
+
+# Dependencies that must only be imported when their feature is used
+HEAVY_MODULES = ("scapy", "zeroconf", "psutil", "numpy", "tabulate")
+
+SCRIPT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        dict: Cumulative import time in microseconds keyed by module name.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SCRIPT_DIRECTORY, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def best_import_times(module, repeat):
+    """
+    Fastest of several runs, so the OS caches are warm for every module.
+    """
+    runs = [import_times(module) for _ in range(repeat)]
+    return min(runs, key=lambda times: times[module])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the import time of the scanner modules; fails if one of "
+                    "them loads a heavy dependency at import time.")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="modules to measure")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per module (default: 5)")
+    parser.add_argument("--top", type=int, default=0,
+                        help="also list the N slowest imports of each module")
+    parser.add_argument("--budget-ms", type=float,
+                        help="also fail if a module takes longer to import")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<18} {'import':>10}  heavy dependencies loaded")
+    for module in args.modules:
+        times = best_import_times(module, args.repeat)
+        heavy = sorted({name.split('.')[0] for name in times} & set(HEAVY_MODULES))
+        milliseconds = times[module] / 1000
+        print(f"{module:<18} {milliseconds:>8.1f}ms  {', '.join(heavy) or '-'}")
+        slowest = sorted(times.items(), key=lambda item: -item[1])[1:args.top + 1]
+        for name, cumulative in slowest:
+            print(f"    {name:<40} {cumulative / 1000:>8.1f}ms")
+        if heavy or (args.budget_ms and milliseconds > args.budget_ms):
+            failed = True
+    sys.exit(1 if failed else 0)
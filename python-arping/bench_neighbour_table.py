@@ -0,0 +1,141 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from neighbours import parse_arp_output, read_neighbours, read_proc_arp
+
+# The regex arping_live used on the output of `arp -a`
+PATTERN = r'([\w\.-]+)? \((\d+\.\d+\.\d+\.\d+)\) at \(?([0-9a-fA-F:]+)?\)? on'
+
+BENCH_INTERFACE = "nbench0"
+
+
+def fake_entries(count):
+    """
+    Generate (ip, mac) pairs for a table of count entries in 10.200.0.0/16.
+    """
+    return [(f"10.200.{(i + 2) >> 8}.{(i + 2) & 0xFF}",
+             f"02:00:00:00:{(i >> 8) & 0xFF:02x}:{i & 0xFF:02x}") for i in range(count)]
+
+
+def write_tables(directory, entries):
+    """
+    Write the entries as a BSD `arp -a` output and as a /proc/net/arp file.
+    """
+    arp_path = os.path.join(directory, "arp.txt")
+    proc_path = os.path.join(directory, "proc_net_arp")
+    with open(arp_path, "w") as file:
+        for ip_address, mac_address in entries:
+            file.write(f"? ({ip_address}) at {mac_address} on en0 ifscope [ethernet]\n")
+    with open(proc_path, "w") as file:
+        file.write("IP address       HW type     Flags       HW address            "
+                   "Mask     Device\n")
+        for ip_address, mac_address in entries:
+            file.write(f"{ip_address:<16} 0x1         0x2         {mac_address}     "
+                       f"*        en0\n")
+    return arp_path, proc_path
+
+
+def subprocess_regex(command):
+    """
+    The former arping_live loop: read a child process line by line and regex each line.
+    """
+    devices = []
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, bufsize=1)
+    while True:
+        line = process.stdout.readline().strip().replace("incomplete", '')
+        if not line and process.poll() is not None:
+            break
+        match = re.search(PATTERN, line)
+        if match:
+            devices.append({'ip': match.group(2), 'mac': match.group(3) or ""})
+    return devices
+
+
+def timed(function, *args, repeat=5):
+    """
+    Best time of several runs, to leave out the cold caches.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def report(name, count, elapsed, baseline):
+    print(f"{name:<40} {count:>7} {elapsed * 1000:>10.2f}ms {baseline / elapsed:>8.1f}x")
+
+
+def bench_files(count):
+    entries = fake_entries(count)
+    with tempfile.TemporaryDirectory() as directory:
+        arp_path, proc_path = write_tables(directory, entries)
+        # `cat` stands in for `arp -a` so that only the process and parsing
+        # costs are measured
+        devices, baseline = timed(subprocess_regex, ["cat", arp_path])
+        report("subprocess + regex (BSD arp -a format)", len(devices),
+               baseline, baseline)
+        records, elapsed = timed(lambda: parse_arp_output(open(arp_path).read()))
+        report("parse_arp_output", len(records), elapsed, baseline)
+        records, elapsed = timed(read_proc_arp, proc_path)
+        report("read_proc_arp", len(records), elapsed, baseline)
+        assert [record['mac'] for record in records] == [mac for _, mac in entries]
+    return baseline
+
+
+def bench_kernel(count):
+    """
+    Fill the neighbour table of a temporary veth pair and read it back. Needs root.
+    """
+    entries = fake_entries(count)
+    commands = [f"neigh replace {ip} lladdr {mac} dev {BENCH_INTERFACE} nud permanent"
+                for ip, mac in entries]
+    subprocess.run(["ip", "link", "add", BENCH_INTERFACE, "type", "veth",
+                    "peer", "name", BENCH_INTERFACE + "p"], check=True)
+    try:
+        subprocess.run(["ip", "link", "set", BENCH_INTERFACE, "up"], check=True)
+        subprocess.run(["ip", "addr", "add", "10.200.0.1/16", "dev", BENCH_INTERFACE],
+                       check=True)
+        subprocess.run(["ip", "-batch", "-"], input="\n".join(commands), text=True,
+                       check=True)
+
+        def ours(records):
+            return [record for record in records
+                    if record['interface'] == BENCH_INTERFACE]
+
+        # The regex does not match the Linux output of arp, so only the time
+        # is comparable
+        _, baseline = timed(subprocess_regex, ["arp", "-an"])
+        report("arp -an + regex (kernel)", len(ours(parse_arp_output(
+            subprocess.run(["arp", "-an"], capture_output=True, text=True).stdout))),
+            baseline, baseline)
+        records, elapsed = timed(read_proc_arp)
+        report("read_proc_arp (kernel)", len(ours(records)), elapsed, baseline)
+        records, elapsed = timed(read_neighbours)
+        report("read_neighbours, netlink (kernel)", len(ours(records)),
+               elapsed, baseline)
+    finally:
+        subprocess.run(["ip", "link", "del", BENCH_INTERFACE])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the neighbour table readers.")
+    parser.add_argument("--entries", type=int, default=10000, help="Size of the table")
+    parser.add_argument("--kernel", action="store_true",
+                        help="Also fill the real neighbour table of a temporary veth "
+                             "(root only)")
+    args = parser.parse_args()
+
+    print(f"{'reader':<40} {'entries':>7} {'time':>12} {'speedup':>8}")
+    bench_files(args.entries)
+    if args.kernel:
+        if os.geteuid() != 0:
+            sys.exit("--kernel needs root")
+        bench_kernel(args.entries)
@@ -0,0 +1,104 @@
+import argparse
+import os
+import random
+import re
+import time
+
+from neighbours import parse_arp_output, parse_proc_arp
+from oui_index import get_index
+from parallel_enrich import add_vendors, parse_and_enrich
+
+# The regex arping_live used on each line of `arp -a`
+PATTERN = r'([\w\.-]+)? \((\d+\.\d+\.\d+\.\d+)\) at \(?([0-9a-fA-F:]+)?\)? on'
+
+
+def fake_tables(count, seed=0):
+    """
+    Neighbour tables of count entries, in the /proc/net/arp and BSD `arp -a`
+    formats, with the MACs drawn from registered prefixes so vendor lookups hit.
+    """
+    rng = random.Random(seed)
+    prefixes = get_index().tables[-1].keys[:].tolist()
+    proc = ["IP address       HW type     Flags       HW address            "
+            "Mask     Device"]
+    arp = []
+    for number in range(count):
+        ip_address = f"10.{(number >> 16) & 0xFF}.{(number >> 8) & 0xFF}.{number & 0xFF}"
+        value = (rng.choice(prefixes) << 24) | rng.getrandbits(24)
+        mac_address = ":".join(f"{(value >> shift) & 0xFF:02x}"
+                               for shift in range(40, -8, -8))
+        proc.append(f"{ip_address:<16} 0x1         0x2         {mac_address}     "
+                    f"*        eth0")
+        arp.append(f"? ({ip_address}) at {mac_address} on en0 ifscope [ethernet]")
+    return "\n".join(proc) + "\n", "\n".join(arp) + "\n"
+
+
+def line_by_line(text):
+    """
+    The former arping_live loop: one regex and one vendor lookup per line.
+    """
+    index = get_index()
+    devices = []
+    for line in text.splitlines():
+        match = re.search(PATTERN, line)
+        if match:
+            devices.append({'ip': match.group(2), 'mac': match.group(3),
+                            'vendor': index.lookup(match.group(3))})
+    return devices
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    """
+    Best time of several runs, to leave out the cold caches.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def report(name, count, elapsed, baseline):
+    print(f"{name:<36} {count:>8} {elapsed * 1000:>10.1f}ms {count / elapsed:>12.0f}/s "
+          f"{baseline / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure how parsing and vendor enrichment of a large neighbour "
+                    "table scale with the number of worker processes.")
+    parser.add_argument("--entries", type=int, default=50000, help="size of the table")
+    parser.add_argument("--workers", default=None,
+                        help="comma-separated worker counts "
+                             "(default: 1, 2, 4... up to the CPUs)")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(count) for count in args.workers.split(",")]
+    else:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= max(cpus, 2):
+            worker_counts.append(worker_counts[-1] * 2)
+    proc_text, arp_text = fake_tables(args.entries)
+    print(f"{args.entries} entries, {cpus} CPUs")
+    print(f"{'pipeline':<36} {'entries':>8} {'time':>12} {'throughput':>14} "
+          f"{'speedup':>8}")
+
+    devices, baseline = timed(line_by_line, arp_text)
+    report("regex per line + lookup (arp -a)", len(devices), baseline, baseline)
+    records, elapsed = timed(
+        lambda: add_vendors(parse_arp_output(arp_text), get_index()))
+    report("parse_arp_output + lookup_many", len(records), elapsed, baseline)
+    records, elapsed = timed(lambda: add_vendors(parse_proc_arp(proc_text), get_index()))
+    report("parse_proc_arp + lookup_many", len(records), elapsed, baseline)
+    expected = [record['vendor'] for record in records]
+
+    for kind, text in (('arp', arp_text), ('proc', proc_text)):
+        for workers in worker_counts:
+            records, elapsed = timed(parse_and_enrich, text, kind, workers=workers)
+            assert [record['vendor'] for record in records] == expected
+            report(f"parse_and_enrich {kind}, {workers} workers", len(records),
+                   elapsed, baseline)
@@ -0,0 +1,92 @@
+import json
+import os
+import random
+import time
+
+from oui_index import get_index, get_vendors_from_mac_list
+
+
+def load_mac_map():
+    script_directory = os.path.dirname(os.path.abspath(__file__))
+    file_path = os.path.join(script_directory, 'mac_24bit.json')
+    with open(file_path, 'r') as json_file:
+        data = json.load(json_file, strict=False)
+    return data
+
+
+MAC_MAP = load_mac_map()
+
+# Runs of each lookup, the best one is reported. The index decodes each vendor
+# name on its first lookup, so the later runs show the steady state of a
+# scanner looking up the same vendors again.
+REPEAT = 3
+
+
+def add_leading_zeroes(mac_address):
+    segments = mac_address.split(':')
+    formatted_segments = [segment.zfill(2) for segment in segments]
+    return ':'.join(formatted_segments)
+
+
+def per_item_lookup(mac_addresses):
+    """
+    The former per-MAC path: normalize, slice the OUI and query the JSON dict.
+    """
+    vendors = []
+    for mac_address in mac_addresses:
+        mac_address = add_leading_zeroes(mac_address=mac_address)
+        oui = mac_address.upper().replace(":", "")[:6]
+        vendors.append(MAC_MAP.get(oui))
+    return vendors
+
+
+def random_macs(count, known_ratio=0.9):
+    """
+    Generate MAC addresses, most of them with a registered OUI.
+    """
+    ouis = list(MAC_MAP)
+    mac_addresses = []
+    for _ in range(count):
+        if random.random() < known_ratio:
+            oui = random.choice(ouis)
+        else:
+            oui = f"{random.getrandbits(24):06X}"
+        suffix = random.getrandbits(24)
+        mac_addresses.append(':'.join(
+            [oui[0:2], oui[2:4], oui[4:6]]
+            + [f"{(suffix >> shift) & 0xFF:02x}" for shift in (16, 8, 0)]))
+    return mac_addresses
+
+
+def timed(function, *args, repeat=REPEAT):
+    """
+    Run a function `repeat` times, return its result and the best duration.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+if __name__ == "__main__":
+    # Map the index and build the NumPy views before timing
+    get_vendors_from_mac_list(random_macs(10))
+    index = get_index()
+
+    print(f"{'MACs':>8} {'per-item dict':>14} {'index, 1st run':>15} "
+          f"{'per-item index':>15} {'batch':>10} {'speedup':>8}")
+    for count in (1000, 10000, 100000):
+        mac_addresses = random_macs(count)
+        expected, dict_time = timed(per_item_lookup, mac_addresses)
+        _, first_time = timed(lambda macs: [index.lookup(mac) for mac in macs],
+                              mac_addresses, repeat=1)
+        _, index_time = timed(lambda macs: [index.lookup(mac) for mac in macs],
+                              mac_addresses)
+        vendors, batch_time = timed(get_vendors_from_mac_list, mac_addresses)
+        assert vendors == expected
+        print(f"{count:>8} {dict_time * 1000:>12.2f}ms {first_time * 1000:>13.2f}ms "
+              f"{index_time * 1000:>13.2f}ms {batch_time * 1000:>8.2f}ms "
+              f"{dict_time / batch_time:>7.1f}x")
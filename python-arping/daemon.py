@@ -0,0 +1,291 @@
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from arping import (LARGE_NETWORK_PREFIX, get_hostnames_from_ips, get_interface_networks,
+                    get_vendors_from_macs, prune_sweepers, scan_interfaces)
+from inventory import DEFAULT_RESOLVE_TTL, Inventory
+from mdns import HostnameResolver
+from metrics import get_metrics
+from oui_index import get_index
+from registry import DeviceRegistry
+from resolver import add_dns_server_argument, configure_resolver, get_resolver
+
+DEFAULT_INTERVAL = 60
+# Sweeps in a row a device may miss before it is dropped from the registry
+DEFAULT_MAX_MISSED = 5
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class ScannerDaemon:
+    """
+    Long-running scanner: sweeps the local networks every `interval` seconds
+    and keeps the latest view of the devices in a registry.
+
+    The raw sockets, the OUI index, the DNS cache and the mDNS browser are
+    created once and stay warm between sweeps, and only the devices that are
+    new or changed since the previous sweep get their names resolved. A
+    device that did not answer the last max_missed sweeps is dropped.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, rate=1000, large=False, inventory=None,
+                 resolve_ttl=DEFAULT_RESOLVE_TTL, max_missed=DEFAULT_MAX_MISSED):
+        """
+        Args:
+            interval (float): Seconds between the start of two sweeps.
+            rate (int): Maximum ARP requests per second per interface.
+            large (bool): Also scan networks larger than /LARGE_NETWORK_PREFIX in
+                          sharded mode.
+            inventory (Inventory): Optional persistent inventory to update after
+                                   each sweep.
+            resolve_ttl (float): Seconds the names stored in the inventory are reused.
+            max_missed (int): Sweeps in a row a device may miss before it is
+                              removed from the registry.
+        """
+        self.interval = interval
+        self.rate = rate
+        self.large = large
+        self.inventory = inventory
+        self.resolve_ttl = resolve_ttl
+        self.registry = DeviceRegistry()
+        self.status = {'sweeps': 0, 'last_sweep': None, 'last_duration': None,
+                       'devices': 0, 'last_found': 0, 'last_resolved': 0,
+                       'last_pruned': 0}
+        # Start times of the last max_missed sweeps, the oldest one first
+        self._sweep_starts = deque(maxlen=max_missed)
+        self._status_lock = threading.Lock()
+        self._sweepers = {}
+        self._stopping = threading.Event()
+        self._thread = None
+
+        # Per-stage timings and counters, served at /metrics
+        self.metrics = get_metrics()
+        self.metrics.enabled = True
+
+        # Warm everything up front rather than on the first sweep
+        get_index()
+        get_resolver()
+        self.mdns_resolver = HostnameResolver()
+
+    def sweep(self):
+        """
+        Scan every interface once and merge the answers into the registry.
+
+        Returns:
+            int: Number of devices that answered.
+        """
+        with self.metrics.stage("sweep"):
+            return self._sweep()
+
+    def _sweep(self):
+        metrics = self.metrics
+        start = time.time()
+        with metrics.stage("interfaces"):
+            interface_networks = get_interface_networks(
+                min_prefix_length=0 if self.large else LARGE_NETWORK_PREFIX)
+        prune_sweepers(self._sweepers, interface_networks)
+        with metrics.stage("arp_sweep"):
+            found = scan_interfaces(interface_networks, rate=self.rate,
+                                    sweepers=self._sweepers)
+
+        devices = found.devices()
+        changed = []
+        for device in devices:
+            known = self.registry.get_by_ip(device['ip'])
+            if (known is None or known.get('mac') != device['mac']
+                    or 'hostname' not in known):
+                changed.append(device)
+            device['last_seen'] = start
+
+        pending = changed
+        if self.inventory:
+            pending = self.inventory.fill_known(changed, self.resolve_ttl)
+        get_hostnames_from_ips(devices=pending, mdns_resolver=self.mdns_resolver)
+        get_vendors_from_macs(devices=pending)
+        self.registry.update(devices)
+        if self.inventory:
+            with metrics.stage("inventory"):
+                self.inventory.record(devices, seen=start)
+                self.inventory.store_names(pending)
+
+        # Only once max_missed sweeps ran, so a device is not dropped too early
+        self._sweep_starts.append(start)
+        pruned = []
+        if len(self._sweep_starts) == self._sweep_starts.maxlen:
+            pruned = self.registry.prune(self._sweep_starts[0])
+
+        with self._status_lock:
+            self.status.update(sweeps=self.status['sweeps'] + 1, last_sweep=start,
+                               last_duration=time.time() - start,
+                               devices=len(self.registry), last_found=len(devices),
+                               last_resolved=len(pending), last_pruned=len(pruned))
+        metrics.increment("sweeps")
+        metrics.increment("devices_resolved", len(pending))
+        metrics.increment("devices_pruned", len(pruned))
+        metrics.set("devices", len(self.registry))
+        metrics.set("last_sweep_timestamp_seconds", start)
+        return len(devices)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Sweep failed: {e}")
+            self._stopping.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        """
+        Start sweeping in a background thread.
+        """
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="scanner-daemon", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+        for sweeper in self._sweepers.values():
+            sweeper.close()
+        self._sweepers.clear()
+        self.mdns_resolver.close()
+
+    def get_status(self):
+        """
+        A copy of the sweep counters, safe to use while a sweep runs.
+        """
+        with self._status_lock:
+            return dict(self.status)
+
+    def find_by_vendor(self, vendor):
+        """
+        Devices whose vendor contains a string, case-insensitively.
+        """
+        vendor = vendor.lower()
+        return [device for device in self.registry.devices()
+                if vendor in (device.get('vendor') or "").lower()]
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """
+    Read-only JSON API over the registry of a ScannerDaemon:
+
+        GET /devices                 all devices, sorted by IP
+        GET /devices?vendor=<name>   devices whose vendor contains <name>
+        GET /ip/<ip>                 device using an IP address
+        GET /mac/<mac>               devices using a MAC address
+        GET /conflicts               IP addresses seen with several MACs
+        GET /status                  sweep counters
+        GET /metrics                 stage timings and counters, Prometheus text format
+    """
+
+    def do_GET(self):
+        scanner = self.server.scanner
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+
+        if parts == ["devices"]:
+            vendor = parse_qs(url.query).get('vendor')
+            if vendor:
+                body = scanner.find_by_vendor(vendor[0])
+            else:
+                body = scanner.registry.devices()
+        elif len(parts) == 2 and parts[0] == "ip":
+            body = scanner.registry.get_by_ip(parts[1])
+        elif len(parts) == 2 and parts[0] == "mac":
+            body = scanner.registry.get_by_mac(parts[1]) or None
+        elif parts == ["conflicts"]:
+            body = scanner.registry.get_conflicts()
+        elif parts == ["status"]:
+            body = scanner.get_status()
+        elif parts == ["metrics"]:
+            return self._reply_text(200, scanner.metrics.prometheus(),
+                                    "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            return self._reply(404, {'error': "Unknown endpoint"})
+
+        if body is None:
+            return self._reply(404, {'error': "Not found"})
+        self._reply(200, body)
+
+    def _reply(self, code, body):
+        data = json.dumps(body, separators=(',', ':')).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reply_text(self, code, text, content_type):
+        data = text.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep the daemon output for the sweeps
+        pass
+
+
+def serve(scanner, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Create the HTTP server of a daemon; call serve_forever() on it to run it.
+    """
+    server = ThreadingHTTPServer((host, port), DaemonRequestHandler)
+    server.scanner = scanner
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sweep the local networks periodically and serve the devices "
+                    "over HTTP.")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help=f"seconds between two sweeps (default: {DEFAULT_INTERVAL})")
+    parser.add_argument("--rate", type=int, default=1000,
+                        help="maximum ARP requests per second per interface "
+                             "(default: 1000)")
+    parser.add_argument("--large", action="store_true",
+                        help=f"also scan networks larger than /{LARGE_NETWORK_PREFIX} "
+                             "in sharded mode")
+    parser.add_argument("--inventory", metavar="PATH",
+                        help="SQLite inventory to update after each sweep")
+    parser.add_argument("--max-missed", type=int, default=DEFAULT_MAX_MISSED,
+                        help="sweeps in a row a device may miss before it is removed "
+                             f"(default: {DEFAULT_MAX_MISSED})")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="address the HTTP API listens on "
+                             f"(default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"port of the HTTP API (default: {DEFAULT_PORT})")
+    add_dns_server_argument(parser)
+    args = parser.parse_args()
+    configure_resolver(args.dns_server)
+
+    inventory = Inventory(args.inventory) if args.inventory else None
+    scanner = ScannerDaemon(interval=args.interval, rate=args.rate, large=args.large,
+                            inventory=inventory, max_missed=args.max_missed)
+    server = serve(scanner, args.host, args.port)
+    print(f"Serving the devices on http://{args.host}:{args.port}/devices, "
+          f"sweeping every {args.interval:.0f}s.")
+    scanner.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scanner.stop()
+        if inventory:
+            inventory.close()
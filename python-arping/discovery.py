@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+from ipaddress import IPv4Network
+
+from address_math import NetworkSet, address_to_int, int_to_address, network_bounds
+from arp_sweep import ArpSweeper, find_interface, host_range
+from arping_parallel import get_all_ip_ranges, get_vendor_from_mac
+from mdns import HostnameResolver
+from resolver import get_resolver
+from output import DeviceWriter, add_format_argument, messages_to_stderr
+
+
+def _sweep(network, interface, rate, timeout, on_reply):
+    """
+    Blocking ARP sweep of a whole network, run in a worker thread.
+    """
+    network = IPv4Network(network, strict=False)
+    if interface is None:
+        interface = find_interface(str(network.network_address))
+        if interface is None:
+            raise ValueError(f"No local interface found for {network}")
+    with ArpSweeper(interface, rate=rate, timeout=timeout) as sweeper:
+        sweeper.sweep(host_range(network), on_reply=on_reply)
+
+
+async def resolve_hostname(ip_address, timeout=0.5):
+    """
+    Reverse DNS lookup through the shared cached resolver, giving up after a
+    timeout instead of blocking. The query runs in the resolver's own bounded
+    pool, so a slow one never holds a thread of the event loop's executor.
+
+    Args:
+        ip_address (str): IP address of the device.
+        timeout (float): Seconds to wait for the resolver.
+
+    Returns:
+        str: Hostname, or "" if not found in time.
+    """
+    query = asyncio.wrap_future(get_resolver().submit(ip_address))
+    try:
+        # Shielded, the shared query keeps running and caches its answer
+        return await asyncio.wait_for(asyncio.shield(query), timeout)
+    except asyncio.TimeoutError:
+        return ""
+
+
+async def enrich(device, hostnames=True, vendors=True, timeout=0.5,
+                 mdns_resolver=None):
+    """
+    Add the "hostname" and "vendor" keys to a device.
+
+    Args:
+        device (dict): Dictionary containing the "ip" and "mac" keys.
+        hostnames (bool): Resolve the hostname with reverse DNS.
+        vendors (bool): Resolve the vendor from the MAC address.
+        timeout (float): Seconds allowed to the reverse DNS and mDNS lookups.
+        mdns_resolver (HostnameResolver): Resolver queried over mDNS at the same
+                                          time, used when reverse DNS finds nothing.
+
+    Returns:
+        dict: The enriched device.
+    """
+    device['vendor'] = get_vendor_from_mac(device['mac']) if vendors else None
+    device['hostname'] = ""
+    mdns_lookup = None
+    if mdns_resolver:
+        mdns_lookup = asyncio.ensure_future(
+            mdns_resolver.lookup(device['ip'], timeout))
+    try:
+        if hostnames:
+            device['hostname'] = await resolve_hostname(device['ip'], timeout)
+        if mdns_lookup and not device['hostname']:
+            device['hostname'] = await mdns_lookup or ""
+    finally:
+        if mdns_lookup:
+            mdns_lookup.cancel()
+    return device
+
+
+async def discover(networks, interface=None, rate=1000, timeout=None,
+                   hostnames=True, vendors=True, mdns=True, lookup_timeout=0.5):
+    """
+    Discover the devices of one or more networks, yielding each device as soon
+    as its ARP reply has arrived and been enriched.
+
+    Each device is also looked up over mDNS, against one resolver browsing
+    the link while the sweep runs, and takes that name when reverse DNS has
+    none; so no device waits more than lookup_timeout for its hostname.
+
+        async for device in discover(["192.168.1.0/24"]):
+            print(device)
+
+    Args:
+        networks (list): Networks to sweep, e.g. ["192.168.1.0/24"].
+        interface (str): Interface to sweep on, detected per network if None.
+        rate (int): Maximum number of ARP requests sent per second per network.
+        timeout (float): Seconds to wait for replies after the last request,
+                         None to adapt it to the observed reply latency.
+        hostnames (bool): Resolve hostnames with reverse DNS.
+        vendors (bool): Resolve vendors from the MAC addresses.
+        mdns (bool): Resolve hostnames over mDNS when reverse DNS fails.
+        lookup_timeout (float): Seconds allowed to the hostname lookups of
+                                each device.
+
+    Yields:
+        dict: Dictionaries with the "ip", "mac", "vendor" and "hostname" keys.
+    """
+    loop = asyncio.get_running_loop()
+    replies = asyncio.Queue()
+    seen = set()
+
+    def on_reply(ip_address, mac_address):
+        # Called from the sweep threads
+        loop.call_soon_threadsafe(
+            replies.put_nowait, {'ip': ip_address, 'mac': mac_address})
+
+    async def sweep_all():
+        try:
+            await asyncio.gather(*(
+                asyncio.to_thread(_sweep, network, interface, rate, timeout, on_reply)
+                for network in networks))
+        finally:
+            # Queued after every reply since the callbacks run in order
+            loop.call_soon_threadsafe(replies.put_nowait, None)
+
+    sweeping = asyncio.create_task(sweep_all())
+    mdns_resolver = None
+    swept = False
+    next_reply = None
+    enriching = set()
+    try:
+        if mdns:
+            # Created in a thread while the sweep starts, so that zeroconf
+            # runs its own event loop
+            mdns_resolver = await asyncio.to_thread(HostnameResolver)
+        while not swept or enriching:
+            if not swept and next_reply is None:
+                next_reply = asyncio.create_task(replies.get())
+            waiting = enriching | {next_reply} if next_reply else enriching
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is next_reply:
+                    next_reply = None
+                    device = task.result()
+                    if device is None:
+                        swept = True
+                    elif device['ip'] not in seen:
+                        seen.add(device['ip'])
+                        enriching.add(asyncio.create_task(enrich(
+                            device, hostnames, vendors, lookup_timeout, mdns_resolver)))
+                else:
+                    enriching.discard(task)
+                    yield task.result()
+        # Surface sweep errors (e.g. missing privileges)
+        await sweeping
+    finally:
+        for task in enriching:
+            task.cancel()
+        if next_reply:
+            next_reply.cancel()
+        sweeping.cancel()
+        if mdns_resolver:
+            await asyncio.to_thread(mdns_resolver.close)
+
+
+async def _main(writer):
+    networks = []
+    covered = NetworkSet()
+    for base_ip, subnet_mask in sorted(get_all_ip_ranges(),
+                                       key=lambda ip_range: ip_range[1]):
+        if base_ip == "127.0.0.1" or subnet_mask < 20:
+            continue
+        first, last = network_bounds(address_to_int(base_ip)[0], subnet_mask)
+        if not covered.covers(first, last):
+            covered.add(first, last)
+            networks.append(f"{int_to_address(first)}/{subnet_mask}")
+
+    async for device in discover(networks):
+        writer.write(device)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Stream the devices of the local networks.")
+    add_format_argument(parser, default="text")
+    args = parser.parse_args()
+
+    with DeviceWriter(args.format) as writer, messages_to_stderr(args.format):
+        asyncio.run(_main(writer))
@@ -0,0 +1,129 @@
+import random
+import socket
+import struct
+import time
+from ipaddress import ip_address as parse_ip
+
+# DNS constants (see RFC 1035)
+TYPE_PTR = 12
+CLASS_IN = 1
+FLAG_RECURSION_DESIRED = 0x0100
+
+
+def build_ptr_query(ip_address, query_id=0):
+    """
+    Build a recursive DNS query asking for the PTR record of an IP address.
+
+    Args:
+        ip_address (str): IPv4 or IPv6 address to reverse.
+        query_id (int): 16-bit identifier echoed by the server.
+
+    Returns:
+        bytes: Wire-format DNS query.
+    """
+    header = struct.pack('!HHHHHH', query_id, FLAG_RECURSION_DESIRED, 1, 0, 0, 0)
+    qname = b"".join(
+        bytes([len(label)]) + label.encode()
+        for label in parse_ip(ip_address).reverse_pointer.split('.')) + b"\x00"
+    return header + qname + struct.pack('!HH', TYPE_PTR, CLASS_IN)
+
+
+def _read_name(data, offset):
+    """
+    Decode a (possibly compressed) domain name starting at offset.
+
+    Returns:
+        tuple: (name, offset right after the name in the message).
+    """
+    labels = []
+    end = None
+    hops = 0
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            hops += 1
+            if hops > 64:
+                raise ValueError("DNS name compression loop")
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('utf-8', 'replace'))
+        offset += length
+    return '.'.join(labels), offset if end is None else end
+
+
+def parse_ptr_response(data, query_id=None):
+    """
+    Extract the first PTR answer of a DNS response.
+
+    Args:
+        data (bytes): Wire-format DNS response.
+        query_id (int): Expected identifier, or None to accept any response.
+
+    Returns:
+        tuple: (hostname, ttl, rcode). hostname is None when the response
+               carries no PTR record. Returns None for malformed packets or
+               responses that do not match query_id.
+    """
+    try:
+        response_id, flags, qdcount, ancount, _, _ = struct.unpack(
+            '!HHHHHH', data[:12])
+        if query_id is not None and response_id != query_id:
+            return None
+        if not flags & 0x8000:
+            # Not a response
+            return None
+        offset = 12
+        for _ in range(qdcount):
+            _, offset = _read_name(data, offset)
+            offset += 4
+        for _ in range(ancount):
+            _, offset = _read_name(data, offset)
+            rtype, _, ttl, rdlength = struct.unpack(
+                '!HHIH', data[offset:offset + 10])
+            offset += 10
+            if rtype == TYPE_PTR:
+                hostname, _ = _read_name(data, offset)
+                return hostname, ttl, flags & 0x000F
+            offset += rdlength
+    except (IndexError, ValueError, struct.error):
+        return None
+    return None, 0, flags & 0x000F
+
+
+def lookup_ptr(ip_address, server, port=53, timeout=1.0):
+    """
+    Blocking PTR query against a unicast DNS server.
+
+    Args:
+        ip_address (str): IP address to reverse.
+        server (str): Address of the DNS server.
+        port (int): UDP port of the server.
+        timeout (float): Seconds to wait for an answer.
+
+    Returns:
+        tuple: (hostname, ttl, rcode) as returned by parse_ptr_response,
+               or None if the server did not answer in time.
+    """
+    family = socket.AF_INET6 if ':' in server else socket.AF_INET
+    query_id = random.getrandbits(16)
+    deadline = time.monotonic() + timeout
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.connect((server, port))
+            sock.send(build_ptr_query(ip_address, query_id))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                sock.settimeout(remaining)
+                result = parse_ptr_response(sock.recv(4096), query_id)
+                if result is not None:
+                    return result
+        except OSError:
+            # Includes socket.timeout and ICMP port unreachable
+            return None
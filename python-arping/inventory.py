@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+import time
+
+DEFAULT_INVENTORY_PATH = "inventory.db"
+
+# Devices seen more recently than this are not probed again by a rescan
+DEFAULT_MAX_AGE = 900
+
+# Hostnames and vendors are looked up again after this many seconds
+DEFAULT_RESOLVE_TTL = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    mac TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    vendor TEXT,
+    hostname TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    resolved_at REAL,
+    PRIMARY KEY (mac, ip)
+);
+CREATE INDEX IF NOT EXISTS devices_ip ON devices (ip);
+CREATE INDEX IF NOT EXISTS devices_last_seen ON devices (last_seen);
+"""
+
+UPSERT = """
+INSERT INTO devices (mac, ip, first_seen, last_seen) VALUES (?, ?, ?, ?)
+ON CONFLICT (mac, ip) DO UPDATE SET last_seen = MAX(last_seen, excluded.last_seen)
+"""
+
+UPDATE_NAMES = """
+UPDATE devices SET vendor = ?, hostname = ?, resolved_at = ? WHERE mac = ? AND ip = ?
+"""
+
+
+class Inventory:
+    """
+    Persistent record of every (MAC, IP) pair ever seen, with the first and
+    last time it answered and its resolved vendor and hostname.
+
+    Rescans use it to skip the addresses seen recently and to reuse the
+    names of the devices that did not change, so only the stale or unknown
+    part of a fleet is probed and resolved again.
+    """
+
+    def __init__(self, path=DEFAULT_INVENTORY_PATH):
+        """
+        Args:
+            path (str): SQLite database file, created if missing.
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, devices, seen=None):
+        """
+        Store devices that answered, in a single transaction.
+
+        Args:
+            devices (list): Dictionaries with the "ip" and "mac" keys.
+            seen (float): Time the devices answered, defaults to now.
+        """
+        seen = time.time() if seen is None else seen
+        rows = [(device['mac'].lower(), device['ip'], seen, seen) for device in devices]
+        with self._lock, self._connection:
+            self._connection.executemany(UPSERT, rows)
+
+    def store_names(self, devices, resolved_at=None):
+        """
+        Store the vendor and hostname resolved for devices already recorded.
+
+        Args:
+            devices (list): Dictionaries with the "ip", "mac", "vendor" and
+                            "hostname" keys.
+            resolved_at (float): Time of the resolution, defaults to now.
+        """
+        resolved_at = time.time() if resolved_at is None else resolved_at
+        rows = [(device.get('vendor'), device.get('hostname'), resolved_at,
+                 device['mac'].lower(), device['ip']) for device in devices]
+        with self._lock, self._connection:
+            self._connection.executemany(UPDATE_NAMES, rows)
+
+    def recent(self, max_age=DEFAULT_MAX_AGE):
+        """
+        Devices seen during the last max_age seconds, the latest pair per IP.
+
+        Returns:
+            list: Dictionaries with the "ip", "mac", "vendor", "hostname",
+                  "first_seen" and "last_seen" keys.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM devices WHERE last_seen >= ? ORDER BY last_seen",
+                (time.time() - max_age,)).fetchall()
+        # Later rows override earlier ones when an IP moved to another MAC
+        return list({row['ip']: self._to_device(row) for row in rows}.values())
+
+    def fill_known(self, devices, resolve_ttl=DEFAULT_RESOLVE_TTL):
+        """
+        Copy the stored vendor and hostname into the devices whose MAC and IP
+        did not change and were resolved less than resolve_ttl seconds ago.
+
+        Args:
+            devices (list): Dictionaries with the "ip" and "mac" keys, updated in place.
+            resolve_ttl (float): Maximum age of a reusable resolution.
+
+        Returns:
+            list: The devices that still need to be resolved.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM devices WHERE resolved_at >= ?",
+                (time.time() - resolve_ttl,)).fetchall()
+        known = {(row['mac'], row['ip']): row for row in rows}
+
+        pending = []
+        for device in devices:
+            row = known.get((device['mac'].lower(), device['ip']))
+            if row is None:
+                pending.append(device)
+                continue
+            device['vendor'] = row['vendor']
+            device['hostname'] = row['hostname']
+        return pending
+
+    def history(self, ip_address=None, mac_address=None):
+        """
+        Every pair stored for an IP or MAC address, most recent first.
+        """
+        if ip_address is not None:
+            query, value = "SELECT * FROM devices WHERE ip = ?", ip_address
+        else:
+            query, value = "SELECT * FROM devices WHERE mac = ?", mac_address.lower()
+        with self._lock:
+            rows = self._connection.execute(
+                query + " ORDER BY last_seen DESC", (value,)).fetchall()
+        return [self._to_device(row) for row in rows]
+
+    @staticmethod
+    def _to_device(row):
+        return {'ip': row['ip'], 'mac': row['mac'], 'vendor': row['vendor'],
+                'hostname': row['hostname'], 'first_seen': row['first_seen'],
+                'last_seen': row['last_seen']}
@@ -0,0 +1,210 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from itertools import chain, takewhile
+
+from arp_sweep import ArpSweeper, host_range
+from arping import get_interface_networks
+from neighbours import normalize_mac, read_neighbours
+from output import messages_to_stderr
+from passive import PassiveListener
+
+# Seconds between two active sweeps while some MAC addresses are still missing
+DEFAULT_RESWEEP_INTERVAL = 15.0
+
+
+class MacFinder:
+    """
+    Find the IP addresses of a set of MAC addresses at once.
+
+    The kernel neighbour table is read first. The remaining MACs are found
+    with a single ARP sweep of every local network, repeated every
+    resweep_interval seconds, while the ARP and DHCP traffic is sniffed
+    passively, so a booting host announcing itself or getting its lease is
+    caught without waiting for a sweep.
+    Each MAC is reported as soon as it is seen.
+    """
+
+    def __init__(self, mac_addresses, on_found=None, rate=1000,
+                 resweep_interval=DEFAULT_RESWEEP_INTERVAL):
+        """
+        Args:
+            mac_addresses (iterable): MAC addresses to look for, in any case.
+            on_found (callable): Called as on_found(mac, ip) once per MAC found.
+            rate (int): Maximum ARP requests per second per interface.
+            resweep_interval (float): Seconds between two active sweeps, None for a
+                                    single one.
+        """
+        self.wanted = {normalize_mac(mac) for mac in mac_addresses}
+        self.on_found = on_found
+        self.rate = rate
+        self.resweep_interval = resweep_interval
+        self.found = {}
+        self._error = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if not self.wanted:
+            self._done.set()
+
+    def _seen(self, mac_address, ip_address):
+        """
+        Record an IP address seen for a MAC address, if it is one we look for.
+        """
+        if mac_address not in self.wanted or ip_address == "0.0.0.0":
+            return
+        with self._lock:
+            if mac_address in self.found:
+                return
+            self.found[mac_address] = ip_address
+            if len(self.found) == len(self.wanted):
+                self._done.set()
+        if self.on_found:
+            self.on_found(mac_address, ip_address)
+
+    def _fail(self, error):
+        """
+        Keep the first error of the sweeps for run() and stop the search.
+        """
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._done.set()
+
+    def _sweep_interface(self, sweeper, networks):
+        targets = chain.from_iterable(host_range(network) for network in networks)
+        try:
+            # Stop probing as soon as the search is over
+            sweeper.sweep(takewhile(lambda _: not self._done.is_set(), targets),
+                          lambda ip, mac: self._seen(mac, ip))
+        except Exception as error:
+            self._fail(error)
+
+    def _sweep(self, deadline):
+        """
+        Sweep every local network, again every resweep_interval seconds.
+        """
+        sweepers = {}
+        try:
+            interface_networks = get_interface_networks()
+            for interface in interface_networks:
+                sweepers[interface] = ArpSweeper(interface, rate=self.rate)
+            while not self._done.is_set():
+                threads = [threading.Thread(
+                    target=self._sweep_interface, args=(sweepers[interface], networks),
+                    daemon=True) for interface, networks in interface_networks.items()]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                if self.resweep_interval is None:
+                    return
+                wait = min(self.resweep_interval, deadline - time.monotonic())
+                if wait <= 0 or self._done.wait(wait):
+                    return
+        except Exception as error:
+            self._fail(error)
+        finally:
+            for sweeper in sweepers.values():
+                sweeper.close()
+
+    def run(self, timeout=60.0):
+        """
+        Look for the MAC addresses until all are found or the timeout expires.
+
+        Args:
+            timeout (float): Maximum number of seconds to search.
+
+        Returns:
+            dict: IP addresses keyed by (normalized) MAC address, for the MACs found.
+
+        Raises:
+            OSError: If the ARP sweep could not run, e.g. without CAP_NET_RAW.
+        """
+        deadline = time.monotonic() + timeout
+        for record in read_neighbours():
+            if record['mac'] and record['state'] not in ("FAILED", "INCOMPLETE"):
+                self._seen(record['mac'], record['ip'])
+        if self._done.is_set():
+            return dict(self.found)
+
+        # Listens on every interface, to ARP and DHCP only
+        listener = PassiveListener(
+            on_device=lambda device: self._seen(device['mac'], device['ip']))
+        with listener:
+            listener.start()
+            sweeper = threading.Thread(target=self._sweep, args=(deadline,), daemon=True)
+            sweeper.start()
+            try:
+                self._done.wait(max(0, deadline - time.monotonic()))
+            finally:
+                # The sweeps stop sending and end with their last replies
+                self._done.set()
+                sweeper.join()
+        if self._error is not None:
+            raise self._error
+        with self._lock:
+            return dict(self.found)
+
+
+def find_ips(mac_addresses, timeout=60.0, on_found=None, rate=1000,
+             resweep_interval=DEFAULT_RESWEEP_INTERVAL):
+    """
+    Find the IP addresses of many MAC addresses from shared sweeps and sniffing.
+
+    Args:
+        mac_addresses (iterable): MAC addresses to look for.
+        timeout (float): Maximum number of seconds to search.
+        on_found (callable): Called as on_found(mac, ip) as soon as each MAC is seen.
+        rate (int): Maximum ARP requests per second per interface.
+        resweep_interval (float): Seconds between two active sweeps, None for a
+                                  single one.
+
+    Returns:
+        dict: IP addresses keyed by normalized MAC address, for the MACs found.
+    """
+    finder = MacFinder(mac_addresses, on_found=on_found, rate=rate,
+                       resweep_interval=resweep_interval)
+    return finder.run(timeout)
+
+
+def find_ip(mac_address, timeout=60.0):
+    """
+    Find the IP address of a single MAC address, or return None.
+    """
+    return find_ips([mac_address], timeout).get(normalize_mac(mac_address))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find the IP addresses of MAC addresses.")
+    parser.add_argument("macs", nargs="+", metavar="MAC",
+                        help="MAC addresses to look for")
+    parser.add_argument("-j", "--json", action="store_true",
+                        help="print one JSON object per MAC found")
+    parser.add_argument("-t", "--timeout", type=float, default=60.0,
+                        help="seconds to search before giving up (default: 60)")
+    parser.add_argument("--rate", type=int, default=1000,
+                        help="maximum ARP requests per second per interface "
+                             "(default: 1000)")
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+
+    def report(mac_address, ip_address):
+        if args.json:
+            print(json.dumps({'mac_address': mac_address, 'ip_address': ip_address}),
+                  file=stdout, flush=True)
+        else:
+            print(f"Found IP address for {mac_address}: {ip_address}",
+                  file=stdout, flush=True)
+
+    # The sweep progress messages would break the JSON lines
+    with messages_to_stderr("ndjson" if args.json else "text"):
+        found = find_ips(args.macs, timeout=args.timeout, on_found=report,
+                         rate=args.rate)
+    missing = {normalize_mac(mac) for mac in args.macs} - set(found)
+    for mac_address in sorted(missing):
+        print(f"No IP address found for {mac_address}", file=sys.stderr)
+    sys.exit(1 if missing else 0)
@@ -1,36 +1,164 @@
-from zeroconf import Zeroconf, ServiceBrowser
+import threading
+import time
+
+# Meta-query enumerating every service type announced on the link (RFC 6763)
+SERVICE_TYPES = "_services._dns-sd._udp.local."
+
 
 class HostnameResolver:
-    def __init__(self, ip_address):
-        self.ip_address = ip_address
-        self.hostname = None
-        self.zeroconf = Zeroconf()
-        self.browser = ServiceBrowser(self.zeroconf, "_services._dns-sd._udp.local.", self)
+    """
+    Shared mDNS resolver: browses the link once, follows every announced
+    service type and builds an IP -> hostname map from the service records,
+    so any number of IPs can be resolved against it.
+
+    Lookups block on a condition variable until the address shows up or the
+    deadline expires, instead of spinning. Coroutines await lookup() instead,
+    which is woken up from the zeroconf threads without holding a thread.
+    """
+
+    def __init__(self, zeroconf=None, info_timeout=3000):
+        """
+        Args:
+            zeroconf (Zeroconf): Instance to share, a new one is created if None.
+            info_timeout (int): Milliseconds allowed to fetch each service info.
+        """
+        # zeroconf takes a while to import, only pay for it when mDNS is used
+        from zeroconf import ServiceBrowser, Zeroconf
+
+        self._service_browser = ServiceBrowser
+        self.zeroconf = zeroconf or Zeroconf()
+        self._owns_zeroconf = zeroconf is None
+        self.info_timeout = info_timeout
+        self.hostnames = {}
+        self._browsers = {}
+        self._changed = threading.Condition()
+        # (loop, future) pairs of the pending lookup() calls, keyed by address
+        self._waiters = {}
+        self._type_browser = self._service_browser(self.zeroconf, SERVICE_TYPES, self)
+
+    def close(self):
+        for browser in [self._type_browser, *self._browsers.values()]:
+            if browser:
+                browser.cancel()
+        if self._owns_zeroconf:
+            self.zeroconf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def remove_service(self, zeroconf, type, name):
         pass
 
     def add_service(self, zeroconf, type, name):
-        info = zeroconf.get_service_info(type, name)
-        if info and info.addresses:
-            for address in info.addresses:
-                if address == self.ip_address:
-                    self.hostname = info.name
-                    break
-
-    def resolve(self):
+        if type == SERVICE_TYPES:
+            # "name" is a service type: browse its instances as well
+            with self._changed:
+                if name in self._browsers:
+                    return
+                self._browsers[name] = None
+            self._browsers[name] = self._service_browser(zeroconf, name, self)
+            return
+
+        info = zeroconf.get_service_info(type, name, timeout=self.info_timeout)
+        if not info:
+            return
+        hostname = (info.server or info.name).rstrip('.')
+        with self._changed:
+            waiters = []
+            for address in info.parsed_addresses():
+                self.hostnames[address] = hostname
+                waiters += self._waiters.pop(address, ())
+            self._changed.notify_all()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_set_result, future, hostname)
+
+    def update_service(self, zeroconf, type, name):
+        self.add_service(zeroconf, type, name)
+
+    def resolve_many(self, ip_addresses, timeout=5.0):
+        """
+        Retrieve the mDNS hostnames of several IP addresses.
+
+        Args:
+            ip_addresses (iterable): IP addresses to resolve.
+            timeout (float): Seconds to wait for the missing addresses.
+
+        Returns:
+            dict: Hostnames keyed by IP address, only for the addresses found.
+        """
+        ip_addresses = set(ip_addresses)
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                found = {ip: self.hostnames[ip] for ip in ip_addresses
+                         if ip in self.hostnames}
+                remaining = deadline - time.monotonic()
+                if len(found) == len(ip_addresses) or remaining <= 0:
+                    return found
+                self._changed.wait(remaining)
+
+    def resolve(self, ip_address, timeout=5.0):
+        """
+        Retrieve the mDNS hostname of an IP address.
+
+        Args:
+            ip_address (str): IP address to resolve.
+            timeout (float): Seconds to wait for the address to be announced.
+
+        Returns:
+            str: Hostname, or None if not found before the deadline.
+        """
+        return self.resolve_many([ip_address], timeout).get(ip_address)
+
+    async def lookup(self, ip_address, timeout=5.0):
+        """
+        Wait for the mDNS hostname of an IP address from a coroutine.
+
+        Args:
+            ip_address (str): IP address to resolve.
+            timeout (float): Seconds to wait for the address to be announced.
+
+        Returns:
+            str: Hostname, or None if not found before the deadline.
+        """
+        # Already imported by the caller's event loop
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._changed:
+            if ip_address in self.hostnames:
+                return self.hostnames[ip_address]
+            self._waiters.setdefault(ip_address, []).append(waiter)
         try:
-            while not self.hostname:
-                pass  # Wait until we find the hostname or timeout
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
         finally:
-            self.zeroconf.close()
-            return self.hostname
+            with self._changed:
+                waiters = self._waiters.get(ip_address, [])
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiters[ip_address]
+
+
+def _set_result(future, result):
+    # The lookup may have timed out in the meantime
+    if not future.done():
+        future.set_result(result)
+
 
 if __name__ == "__main__":
-    ip_address_to_resolve = "172.16.24.91"  # Replace with the IP address you want to resolve
-    resolver = HostnameResolver(ip_address_to_resolve)
-    hostname = resolver.resolve()
-    
+    # Replace with the IP address you want to resolve
+    ip_address_to_resolve = "172.16.24.91"
+    with HostnameResolver() as resolver:
+        hostname = resolver.resolve(ip_address_to_resolve)
+
     if hostname:
         print(f"The hostname for IP address {ip_address_to_resolve} is: {hostname}")
     else:
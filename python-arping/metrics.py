@@ -0,0 +1,294 @@
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond ARP replies to minute-long sweeps
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+NAMESPACE = "arping"
+
+# "# HELP" lines of the Prometheus output
+DESCRIPTIONS = {
+    'stage_seconds': "Duration of each stage of the discovery pipeline",
+    'arp_requests_sent': "ARP requests sent, retransmissions included",
+    'arp_retransmissions': "ARP requests sent again to silent hosts",
+    'arp_replies': "ARP replies received from probed hosts",
+    'arp_requests_dropped': "ARP requests the transmit queue had no room for",
+    'arp_reply_latency_seconds': "Time between an ARP request and its reply",
+    'ndp_solicitations_sent': "Neighbor Solicitations sent",
+    'ndp_hosts_found': "IPv6 hosts whose MAC address was learned",
+    'dns_cache_hits': "Reverse DNS lookups answered from the cache",
+    'dns_cache_misses': "Reverse DNS lookups not in the cache",
+    'dns_queries': "Reverse DNS queries sent, by outcome",
+    'dns_query_seconds': "Duration of the reverse DNS queries",
+    'mdns_lookups': "mDNS hostname lookups, by outcome",
+    'vendor_lookups': "OUI vendor lookups, by outcome",
+    'passive_frames': "Frames received by the passive listener, by protocol",
+    'devices_output': "Devices written by the output writer",
+    'devices_resolved': "Devices whose hostname and vendor were looked up",
+    'devices_pruned': "Devices removed after missing too many sweeps",
+    'devices': "Devices currently known",
+    'sweeps': "Sweeps completed",
+    'last_sweep_timestamp_seconds': "Unix time of the last sweep",
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets, Prometheus style.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        # First bucket whose upper bound is at least the value
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+
+    def cumulative(self):
+        """
+        (upper bound, observations at or below it) pairs, ending with +Inf.
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            pairs.append((bound, total))
+        pairs.append((float('inf'), self.count))
+        return pairs
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+                'mean': self.sum / self.count if self.count else None,
+                'buckets': {_format_value(bound): count
+                            for bound, count in self.cumulative()}}
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms of the discovery pipeline.
+
+    Disabled by default: every call returns immediately until `enabled` is
+    set, so the instrumented code costs nothing when nobody reads the numbers.
+    Metrics are identified by a name and optional labels, e.g.
+    increment("dns_queries", result="found").
+    """
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.started = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def increment(self, name, amount=1, **labels):
+        """
+        Add to a counter.
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """
+        Set a gauge to its current value.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Record one value in a histogram.
+        """
+        if not self.enabled:
+            return
+        self.observe_many(name, (value,), **labels)
+
+    def observe_many(self, name, values, **labels):
+        """
+        Record many values in a histogram under a single lock acquisition.
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            for value in values:
+                histogram.observe(value)
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """
+        Time a block of code as one stage of the pipeline:
+
+            with get_metrics().stage("hostnames"):
+                ...
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start,
+                         stage=name, **labels)
+
+    def summary(self):
+        """
+        JSON-serializable snapshot: per-stage durations, counters, gauges and histograms.
+        """
+        def flat(name, key):
+            return name + _format_labels(key)
+
+        with self._lock:
+            stages = {}
+            histograms = {}
+            # Stages in the order they first ran, without their buckets
+            for (name, key), histogram in self._histograms.items():
+                if name == "stage_seconds":
+                    stage = flat(dict(key).get('stage', ""),
+                                 tuple(pair for pair in key if pair[0] != 'stage'))
+                    stages[stage] = {'count': histogram.count, 'seconds': histogram.sum,
+                                     'max': histogram.max}
+                else:
+                    histograms[flat(name, key)] = histogram.to_dict()
+            return {
+                'started': self.started,
+                'elapsed': time.time() - self.started,
+                'stages': stages,
+                'counters': {flat(name, key): value
+                             for (name, key), value in sorted(self._counters.items())},
+                'gauges': {flat(name, key): value
+                           for (name, key), value in sorted(self._gauges.items())},
+                'histograms': histograms,
+            }
+
+    def prometheus(self, namespace=NAMESPACE):
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def header(name, kind):
+            description = DESCRIPTIONS.get(name)
+            if description:
+                lines.append(f"# HELP {namespace}_{name} {description}")
+            lines.append(f"# TYPE {namespace}_{name} {kind}")
+
+        def grouped(metrics):
+            groups = {}
+            for (name, key), value in sorted(metrics.items()):
+                groups.setdefault(name, []).append((key, value))
+            return groups.items()
+
+        with self._lock:
+            for name, series in grouped(self._counters):
+                header(name, "counter")
+                for key, value in series:
+                    lines.append(f"{namespace}_{name}_total{_format_labels(key)} "
+                                 f"{_format_value(value)}")
+            for name, series in grouped(self._gauges):
+                header(name, "gauge")
+                for key, value in series:
+                    lines.append(f"{namespace}_{name}{_format_labels(key)} "
+                                 f"{_format_value(value)}")
+            for name, series in grouped(self._histograms):
+                header(name, "histogram")
+                for key, histogram in series:
+                    labels = _format_labels(key)
+                    for bound, count in histogram.cumulative():
+                        le = _format_value(float(bound))
+                        lines.append(f"{namespace}_{name}_bucket"
+                                     f"{_format_labels(key, [('le', le)])} {count}")
+                    lines.append(f"{namespace}_{name}_sum{labels} "
+                                 f"{_format_value(histogram.sum)}")
+                    lines.append(f"{namespace}_{name}_count{labels} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self, path="-"):
+        """
+        Write the JSON summary to a file, or to stderr for "-".
+        """
+        data = json.dumps(self.summary(), indent=2)
+        if path == "-":
+            print(data, file=sys.stderr)
+        else:
+            with open(path, "w") as file:
+                file.write(data + "\n")
+
+
+_metrics = None
+
+
+def get_metrics():
+    """
+    Get the metrics shared by the whole process, disabled until enabled.
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def add_metrics_argument(parser):
+    """
+    Add the --metrics [PATH] option, enabling the metrics and naming where the
+    summary goes.
+    """
+    parser.add_argument("--metrics", nargs="?", const="-", metavar="PATH",
+                        help="record per-stage timings and counters and write a JSON "
+                             "summary to PATH at the end (default: stderr)")
@@ -0,0 +1,262 @@
+import select
+import socket
+import struct
+import time
+from ipaddress import IPv6Address
+
+from arp_sweep import get_interface_mac, mac_to_str
+from metrics import get_metrics
+
+# ICMPv6 / NDP constants (see RFC 4443 and RFC 4861)
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+ND_NEIGHBOR_SOLICIT = 135
+ND_NEIGHBOR_ADVERT = 136
+ND_OPT_SOURCE_LINKADDR = 1
+ND_OPT_TARGET_LINKADDR = 2
+ALL_NODES = "ff02::1"
+
+# NDP messages must be sent with, and are only accepted with, a hop limit of 255
+ND_HOP_LIMIT = 255
+
+
+def strip_scope(ip_address):
+    """
+    Remove the "%interface" zone suffix of a link-local address.
+    """
+    return ip_address.split('%', 1)[0]
+
+
+def scoped_address(ip_address, interface):
+    """
+    Add the "%interface" zone suffix to a link-local IPv6 address, the same
+    one being used on several links; other addresses are returned unchanged.
+    """
+    if interface and ':' in ip_address:
+        address = strip_scope(ip_address)
+        if IPv6Address(address).is_link_local:
+            return f"{address}%{interface}"
+    return ip_address
+
+
+def solicited_node_address(ip_address):
+    """
+    Multicast group a host joins for an address, ff02::1:ffXX:XXXX.
+    """
+    packed = IPv6Address(ip_address).packed
+    return str(IPv6Address(bytes.fromhex("ff0200000000000000000001ff") + packed[13:]))
+
+
+def get_interface_ipv6_addresses(interface):
+    """
+    Return the IPv6 addresses of an interface, link-local ones first.
+    """
+    import psutil
+
+    addresses = [strip_scope(addr.address)
+                 for addr in psutil.net_if_addrs().get(interface, ())
+                 if addr.family == socket.AF_INET6]
+    return sorted(addresses, key=lambda address: not IPv6Address(address).is_link_local)
+
+
+def get_ipv6_interfaces():
+    """
+    Names of the interfaces with at least one non-loopback IPv6 address.
+    """
+    import psutil
+
+    return [interface for interface, addrs in psutil.net_if_addrs().items()
+            if any(addr.family == socket.AF_INET6
+                   and not IPv6Address(strip_scope(addr.address)).is_loopback
+                   for addr in addrs)]
+
+
+def build_echo_request(identifier, sequence):
+    """
+    Build an ICMPv6 echo request; the kernel fills in the checksum.
+    """
+    return struct.pack('!BBHHH', ICMPV6_ECHO_REQUEST, 0, 0, identifier, sequence)
+
+
+def build_neighbor_solicitation(target, src_mac):
+    """
+    Build a Neighbor Solicitation for a target, carrying our link-layer address.
+
+    Args:
+        target (str): IPv6 address whose link-layer address is requested.
+        src_mac (bytes): MAC address of the sending interface.
+
+    Returns:
+        bytes: ICMPv6 message, checksum left to the kernel.
+    """
+    return (struct.pack('!BBHI', ND_NEIGHBOR_SOLICIT, 0, 0, 0)
+            + IPv6Address(target).packed
+            + struct.pack('!BB', ND_OPT_SOURCE_LINKADDR, 1) + src_mac)
+
+
+def _link_layer_option(options, option_type):
+    """
+    Return the MAC address carried by an NDP option of a given type, or None.
+    """
+    offset = 0
+    while offset + 2 <= len(options):
+        kind, length = options[offset], options[offset + 1] * 8
+        if length == 0:
+            break
+        if kind == option_type and length >= 8:
+            return mac_to_str(options[offset + 2:offset + 8])
+        offset += length
+    return None
+
+
+def parse_ndp(data, source):
+    """
+    Extract the address and MAC a host revealed in an ICMPv6 message.
+
+    Echo replies only reveal an address; advertisements reveal the MAC of
+    their target and solicitations the MAC of their sender.
+
+    Args:
+        data (bytes): ICMPv6 message, as received on a raw socket.
+        source (str): Source address of the message.
+
+    Returns:
+        tuple: (ip_address, mac_address or None), or None for other messages.
+    """
+    if len(data) < 8:
+        return None
+    kind = data[0]
+    if kind == ICMPV6_ECHO_REPLY:
+        return source, None
+    if kind == ND_NEIGHBOR_ADVERT and len(data) >= 24:
+        target = socket.inet_ntop(socket.AF_INET6, data[8:24])
+        return target, _link_layer_option(data[24:], ND_OPT_TARGET_LINKADDR)
+    if kind == ND_NEIGHBOR_SOLICIT and len(data) >= 24 and source != "::":
+        return source, _link_layer_option(data[24:], ND_OPT_SOURCE_LINKADDR)
+    return None
+
+
+class NdpScanner:
+    """
+    Discover the IPv6 hosts of a link without sweeping the address space.
+
+    An echo request to the all-nodes group from each of our addresses makes
+    every host answer from its matching (link-local or global) address; a
+    Neighbor Solicitation to each responder, and to any explicit target,
+    then returns its MAC address in the advertisement.
+
+    Requires root or the CAP_NET_RAW capability.
+    """
+
+    def __init__(self, interface, timeout=1.0, rate=1000):
+        """
+        Args:
+            interface (str): Interface to scan.
+            timeout (float): Seconds to wait for the answers of each phase.
+            rate (int): Maximum number of solicitations sent per second.
+        """
+        self.interface = interface
+        self.timeout = timeout
+        self.rate = rate
+        self.index = socket.if_nametoindex(interface)
+        self.src_mac = get_interface_mac(interface)
+        self.sock = socket.socket(
+            socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_ICMPV6)
+        self.sock.setsockopt(
+            socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, self.index)
+        self.sock.setsockopt(
+            socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ND_HOP_LIMIT)
+        self.sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, ND_HOP_LIMIT)
+        self.sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_LOOP, 0)
+        self.sock.setblocking(False)
+        self._own = set(get_interface_ipv6_addresses(interface))
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _send(self, message, destination, source=None):
+        ancillary = []
+        if source:
+            # struct in6_pktinfo { struct in6_addr addr; int ifindex; }
+            pktinfo = IPv6Address(source).packed + struct.pack('@i', self.index)
+            ancillary.append((socket.IPPROTO_IPV6, socket.IPV6_PKTINFO, pktinfo))
+        self.sock.sendmsg([message], ancillary, 0, (destination, 0, 0, self.index))
+
+    def _receive(self, hosts, on_device):
+        """
+        Drain the socket, recording the addresses and MACs revealed.
+        """
+        while True:
+            try:
+                data, address = self.sock.recvfrom(65535)
+            except BlockingIOError:
+                return
+            parsed = parse_ndp(data, strip_scope(address[0]))
+            if not parsed:
+                continue
+            ip_address, mac_address = parsed
+            if ip_address in self._own or IPv6Address(ip_address).is_multicast:
+                continue
+            known = hosts.get(ip_address)
+            if known is None or (mac_address and known != mac_address):
+                hosts[ip_address] = mac_address
+                if mac_address and on_device:
+                    on_device(ip_address, mac_address)
+
+    def _listen(self, hosts, on_device, duration):
+        deadline = time.monotonic() + duration
+        while True:
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                return
+            readable, _, _ = select.select([self.sock], [], [], wait)
+            if readable:
+                self._receive(hosts, on_device)
+
+    def discover(self, targets=(), retries=1, on_device=None):
+        """
+        Find the IPv6 hosts of the link and their MAC addresses.
+
+        Args:
+            targets (iterable): Extra IPv6 addresses to solicit, e.g. known hosts
+                                that may not answer multicast echo requests.
+            retries (int): Number of extra solicitations to the hosts still without MAC.
+            on_device (callable): Called as on_device(ip, mac) as soon as a MAC is known.
+
+        Returns:
+            dict: Mapping of IPv6 addresses to MAC addresses (None if never learned).
+        """
+        hosts = {strip_scope(target): None for target in targets}
+        for identifier, source in enumerate(sorted(self._own), start=1):
+            try:
+                self._send(build_echo_request(identifier, 1), ALL_NODES, source)
+            except OSError:
+                # Tentative or deprecated address
+                continue
+        self._listen(hosts, on_device, self.timeout)
+
+        interval = 1.0 / self.rate if self.rate else 0.0
+        metrics = get_metrics()
+        for _ in range(1 + retries):
+            missing = [ip for ip, mac in hosts.items() if mac is None]
+            if not missing:
+                break
+            for target in missing:
+                self._send(build_neighbor_solicitation(target, self.src_mac),
+                           solicited_node_address(target))
+                self._receive(hosts, on_device)
+                time.sleep(interval)
+            metrics.increment("ndp_solicitations_sent", len(missing),
+                              interface=self.interface)
+            self._listen(hosts, on_device, self.timeout)
+        metrics.increment("ndp_hosts_found", sum(1 for mac in hosts.values() if mac),
+                          interface=self.interface)
+        return hosts
@@ -0,0 +1,130 @@
+import re
+import socket
+import subprocess
+
+from netlink import dump_neighbours, open_socket
+
+PROC_NET_ARP = "/proc/net/arp"
+
+# ARP flags of /proc/net/arp (see linux/if_arp.h)
+ATF_COM = 0x02
+ATF_PERM = 0x04
+
+# Output of the BSD / macOS `arp -a`, e.g.
+# "? (172.16.24.1) at fc:ec:da:7b:3b:57 on en0 ifscope [ethernet]"
+ARP_OUTPUT_PATTERN = re.compile(
+    r'^(\S+) \((\d+\.\d+\.\d+\.\d+)\) at \(?([0-9a-fA-F:]+|incomplete)?\)? '
+    r'on (\w+)([^\n]*)', re.MULTILINE)
+
+
+def normalize_mac(mac_address):
+    """
+    Zero-pad the octets of a MAC address, e.g. "4:92:26:b7:b2:77" -> "04:92:26:b7:b2:77".
+
+    Dash-separated addresses ("04-92-26-B7-B2-77") get colons.
+    """
+    octets = mac_address.lower().replace('-', ':').split(':')
+    return ':'.join(octet.zfill(2) for octet in octets)
+
+
+def parse_proc_arp(text):
+    """
+    Parse the content of /proc/net/arp.
+
+    /proc only tells complete, incomplete and permanent entries apart, so
+    complete entries are reported as "REACHABLE" whatever their NUD state.
+
+    Args:
+        text (str): Content of the file, header line included.
+
+    Returns:
+        list: Records with the "ip", "mac", "interface", "state" and "family" keys.
+    """
+    records = []
+    for line in text.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 6:
+            continue
+        flags = int(fields[2], 16)
+        if flags & ATF_PERM:
+            state = "PERMANENT"
+        elif flags & ATF_COM:
+            state = "REACHABLE"
+        else:
+            state = "INCOMPLETE"
+        records.append({'ip': fields[0],
+                        'mac': fields[3] if flags & ATF_COM else None,
+                        'interface': fields[5], 'state': state,
+                        'family': socket.AF_INET})
+    return records
+
+
+def read_proc_arp(path=PROC_NET_ARP):
+    """
+    Read the IPv4 neighbour table from /proc in a single read.
+    """
+    with open(path) as file:
+        return parse_proc_arp(file.read())
+
+
+def parse_arp_output(text):
+    """
+    Parse the output of the BSD / macOS `arp -a` command.
+
+    Returns:
+        list: Records in the same format as parse_proc_arp, plus the
+              "hostname" reported by arp ("" when unknown).
+    """
+    records = []
+    # Anchored at the line starts, and findall builds the group tuples in C
+    for hostname, ip_address, mac_address, interface, flags in \
+            ARP_OUTPUT_PATTERN.findall(text):
+        if not mac_address or mac_address == "incomplete":
+            mac_address, state = None, "INCOMPLETE"
+        else:
+            # Only the addresses with unpadded octets need normalize_mac
+            mac_address = (mac_address.lower() if len(mac_address) == 17
+                           else normalize_mac(mac_address))
+            state = "PERMANENT" if " permanent" in flags else "REACHABLE"
+        records.append({'ip': ip_address, 'mac': mac_address, 'interface': interface,
+                        'state': state, 'family': socket.AF_INET,
+                        'hostname': "" if hostname == "?" else hostname})
+    return records
+
+
+def read_arp_command():
+    """
+    Read the neighbour table by running `arp -a`, for systems without /proc or netlink.
+    """
+    output = subprocess.run(["arp", "-an"], capture_output=True, text=True).stdout
+    return parse_arp_output(output)
+
+
+def read_neighbours(family=socket.AF_INET):
+    """
+    Read the kernel neighbour table in one go.
+
+    Uses an rtnetlink dump on Linux, which also reports the exact NUD state
+    and the IPv6 neighbours, then /proc/net/arp, and only runs `arp -a` on
+    systems providing neither.
+
+    Args:
+        family (int): AF_INET, AF_INET6 or AF_UNSPEC for both.
+
+    Returns:
+        list: Records with the "ip", "mac", "interface", "state" and "family" keys.
+    """
+    if hasattr(socket, 'AF_NETLINK'):
+        try:
+            with open_socket() as sock:
+                return [record for record in dump_neighbours(sock, family)
+                        if not record.pop('deleted')]
+        except OSError:
+            pass
+    try:
+        records = read_proc_arp()
+    except OSError:
+        records = read_arp_command()
+    if family == socket.AF_INET6:
+        return []
+    return records
@@ -0,0 +1,370 @@
+import errno
+import os
+import socket
+import struct
+import threading
+
+# rtnetlink constants (see linux/netlink.h, linux/rtnetlink.h, linux/neighbour.h)
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+RTMGRP_LINK = 0x01
+RTMGRP_NEIGH = 0x04
+NDA_DST = 1
+NDA_LLADDR = 2
+
+NLMSG_HEADER = struct.Struct('=IHHII')
+NDMSG = struct.Struct('=BxxxiHBB')
+RTATTR = struct.Struct('=HH')
+
+# Neighbour Unreachability Detection states
+NUD_STATES = {
+    0x01: "INCOMPLETE",
+    0x02: "REACHABLE",
+    0x04: "STALE",
+    0x08: "DELAY",
+    0x10: "PROBE",
+    0x20: "FAILED",
+    0x40: "NOARP",
+    0x80: "PERMANENT",
+}
+
+_watcher = None
+
+# Interface names keyed by index, forgotten when a link is removed or changed
+_interface_names = {}
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def state_name(state):
+    """
+    Convert a NUD state bit to its name, e.g. 0x02 -> "REACHABLE".
+    """
+    return NUD_STATES.get(state, "NONE" if state == 0 else hex(state))
+
+
+def interface_name(index):
+    """
+    Return the name of an interface index, caching the answers.
+    """
+    if index not in _interface_names:
+        try:
+            _interface_names[index] = socket.if_indextoname(index)
+        except OSError:
+            return str(index)
+    return _interface_names[index]
+
+
+def forget_interface_names():
+    """
+    Empty the interface name cache, after a link was renamed or removed.
+    """
+    _interface_names.clear()
+
+
+def parse_neighbour(message_type, payload):
+    """
+    Parse the payload of an RTM_NEWNEIGH / RTM_DELNEIGH message.
+
+    Args:
+        message_type (int): Netlink message type.
+        payload (bytes): Message payload, after the netlink header.
+
+    Returns:
+        dict: Record with the "ip", "mac", "interface", "ifindex", "state" and
+              "family" keys, or None if the message carries no destination address.
+    """
+    family, ifindex, state, _, _ = NDMSG.unpack_from(payload, 0)
+    ip_address = mac_address = None
+    offset = NDMSG.size
+    while offset + RTATTR.size <= len(payload):
+        length, attribute = RTATTR.unpack_from(payload, offset)
+        if length < RTATTR.size:
+            break
+        value = payload[offset + RTATTR.size:offset + length]
+        if attribute == NDA_DST:
+            ip_address = socket.inet_ntop(family, value)
+        elif attribute == NDA_LLADDR and len(value) == 6:
+            mac_address = value.hex(':')
+        offset += _align(length)
+
+    if ip_address is None:
+        return None
+    return {'ip': ip_address, 'mac': mac_address, 'interface': interface_name(ifindex),
+            'ifindex': ifindex, 'state': state_name(state), 'family': family,
+            'deleted': message_type == RTM_DELNEIGH}
+
+
+def parse_messages(data):
+    """
+    Split a netlink datagram into its neighbour records.
+
+    Args:
+        data (bytes): Datagram received on a NETLINK_ROUTE socket.
+
+    Returns:
+        tuple: (records, done) where done is True once the end of a dump is reached.
+    """
+    records = []
+    offset = 0
+    while offset + NLMSG_HEADER.size <= len(data):
+        length, message_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+        if length < NLMSG_HEADER.size:
+            break
+        if message_type == NLMSG_DONE:
+            return records, True
+        if message_type == NLMSG_ERROR:
+            error = struct.unpack_from('=i', data, offset + NLMSG_HEADER.size)[0]
+            if error:
+                raise OSError(-error, os.strerror(-error))
+        elif message_type in (RTM_NEWLINK, RTM_DELLINK):
+            # An index may now name another interface, or none
+            forget_interface_names()
+        elif message_type in (RTM_NEWNEIGH, RTM_DELNEIGH):
+            record = parse_neighbour(
+                message_type, data[offset + NLMSG_HEADER.size:offset + length])
+            if record:
+                records.append(record)
+        offset += _align(length)
+    return records, False
+
+
+def open_socket(groups=0):
+    """
+    Open a NETLINK_ROUTE socket, subscribed to the given multicast groups.
+    """
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind((0, groups))
+    return sock
+
+
+def dump_neighbours(sock, family=socket.AF_UNSPEC, sequence=1):
+    """
+    Request the whole neighbour table on a netlink socket and read it back.
+
+    Args:
+        sock (socket): NETLINK_ROUTE socket.
+        family (int): AF_INET, AF_INET6 or AF_UNSPEC for both.
+        sequence (int): Sequence number of the request.
+
+    Returns:
+        list: Neighbour records as returned by parse_neighbour.
+    """
+    request = NDMSG.pack(family, 0, 0, 0, 0)
+    header = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(request), RTM_GETNEIGH,
+                               NLM_F_REQUEST | NLM_F_DUMP, sequence, 0)
+    sock.send(header + request)
+
+    records = []
+    while True:
+        batch, done = parse_messages(sock.recv(65536))
+        records += batch
+        if done:
+            return records
+
+
+class NeighbourWatcher:
+    """
+    In-memory copy of the kernel neighbour (ARP / NDP) table, kept up to date
+    from the RTM_NEWNEIGH / RTM_DELNEIGH events of rtnetlink.
+
+    The table is seeded with a dump, then a background thread applies every
+    change incrementally and calls the registered callbacks. Lookups by IP or
+    MAC are dictionary accesses.
+
+    Entries are keyed by interface index and IP address, as the kernel does,
+    so that a link-local IPv6 address used on two links gives two entries.
+    """
+
+    # Seconds between two checks of the stop flag by the background thread
+    POLL_INTERVAL = 0.5
+
+    # Longest wait before retrying after a netlink error other than ENOBUFS
+    MAX_RETRY_INTERVAL = 30.0
+
+    def __init__(self, family=socket.AF_UNSPEC):
+        """
+        Args:
+            family (int): AF_INET, AF_INET6 or AF_UNSPEC to watch both.
+        """
+        self.family = family
+        self._records = {}
+        self._by_ip = {}
+        self._by_mac = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._sock = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def add_callback(self, callback):
+        """
+        Register callback(event, record), event being "new", "changed" or "deleted".
+        """
+        self._callbacks.append(callback)
+
+    def start(self):
+        """
+        Subscribe to the neighbour events, load the current table and start
+        the background thread applying the changes.
+        """
+        # Link events only keep the interface names current
+        self._sock = open_socket(RTMGRP_NEIGH | RTMGRP_LINK)
+        # Netlink sockets cannot be shut down, so the thread polls for stop()
+        self._sock.settimeout(self.POLL_INTERVAL)
+        # Events received during the dump are queued and applied afterwards
+        with open_socket() as dump_socket:
+            for record in dump_neighbours(dump_socket, self.family):
+                self._apply(record)
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="neighbour-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        delay = 0
+        while not self._stopping.wait(delay):
+            try:
+                data = self._sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError as error:
+                if error.errno == errno.ENOBUFS:
+                    # Events were dropped, the dump below catches up at once
+                    delay = 0
+                else:
+                    # Would fail again right away, retry less and less often
+                    delay = min(2 * delay or self.POLL_INTERVAL, self.MAX_RETRY_INTERVAL)
+                    print(f"Neighbour watcher: {error}, retrying in {delay:.1f}s")
+                try:
+                    with open_socket() as dump_socket:
+                        self._resync(dump_neighbours(dump_socket, self.family))
+                except OSError:
+                    delay = max(delay, self.POLL_INTERVAL)
+                continue
+            delay = 0
+            if not data:
+                return
+            for record in parse_messages(data)[0]:
+                self._apply(record)
+
+    def _resync(self, records):
+        forget_interface_names()
+        current = {(record['ifindex'], record['ip']) for record in records}
+        for key in [key for key in self._records if key not in current]:
+            self._apply(dict(self._records[key], deleted=True))
+        for record in records:
+            self._apply(record)
+
+    @staticmethod
+    def _unindex(index, value, key):
+        keys = index.get(value)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    def _apply(self, record):
+        """
+        Update the tables with one record and notify the callbacks.
+        """
+        if self.family != socket.AF_UNSPEC and record['family'] != self.family:
+            return
+        deleted = record.pop('deleted', False)
+        key = (record['ifindex'], record['ip'])
+        with self._lock:
+            previous = self._records.get(key)
+            if previous and previous['mac']:
+                self._unindex(self._by_mac, previous['mac'], key)
+            if deleted:
+                if previous is None:
+                    return
+                del self._records[key]
+                self._unindex(self._by_ip, record['ip'], key)
+                event = "deleted"
+            else:
+                # Keep the last known MAC while the entry is being re-resolved
+                if record['mac'] is None and previous:
+                    record['mac'] = previous['mac']
+                self._records[key] = record
+                self._by_ip.setdefault(record['ip'], set()).add(key)
+                if record['mac']:
+                    self._by_mac.setdefault(record['mac'], set()).add(key)
+                if previous == record:
+                    return
+                event = "changed" if previous else "new"
+
+        for callback in self._callbacks:
+            callback(event, previous if deleted else record)
+
+    def get_by_ip(self, ip_address):
+        """
+        Return the records of an IP address, one per interface it is known on.
+        """
+        with self._lock:
+            return [self._records[key] for key in self._by_ip.get(ip_address, ())]
+
+    def get_by_mac(self, mac_address):
+        """
+        Return the records of the IP addresses currently using a MAC address.
+        """
+        with self._lock:
+            return [self._records[key]
+                    for key in self._by_mac.get(mac_address.lower(), ())]
+
+    def devices(self):
+        """
+        Snapshot of the table, as a list of records.
+        """
+        with self._lock:
+            return list(self._records.values())
+
+
+def get_watcher():
+    """
+    Start the shared neighbour watcher on first use and return it.
+    """
+    global _watcher
+    if _watcher is None:
+        _watcher = NeighbourWatcher().start()
+    return _watcher
+
+
+if __name__ == "__main__":
+    def print_change(event, record):
+        print(f"{event:<8} {record['ip']:<40} {record['mac'] or '':<18} "
+              f"{record['interface']:<12} {record['state']}", flush=True)
+
+    with NeighbourWatcher() as watcher:
+        for record in watcher.devices():
+            print_change("present", record)
+        watcher.add_callback(print_change)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,372 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+# Binary OUI index layout (all integers little-endian):
+#   header:  magic (4s) | version (H) | table count (H)
+#   tables:  table count x (prefix width in bits (B) | padding (3x) | count (I)),
+#            sorted by decreasing prefix width
+#   then for every table, in the same order:
+#     keys:    count x uint64, sorted prefixes (MA-S 36, MA-M 28, MA-L 24 bits)
+#     offsets: count x uint32, offset of the vendor name in the string blob
+#   blob:    vendor names, each one stored once as uint16 length + UTF-8 bytes
+INDEX_MAGIC = b"OUIX"
+INDEX_VERSION = 2
+HEADER = struct.Struct('<4sHH')
+TABLE = struct.Struct('<B3xI')
+
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'mac_24bit.idx')
+
+_index = None
+
+
+def mac_to_int(mac_address):
+    """
+    Convert a MAC address to a 48-bit integer.
+
+    Accepts colon or dash separated addresses with or without leading
+    zeroes (e.g. "4:92:26:b7:b2:77" as printed by BSD arp) and plain
+    hexadecimal strings.
+
+    Args:
+        mac_address (str): MAC address to convert.
+
+    Returns:
+        int: MAC address as an integer, or None if it cannot be parsed.
+    """
+    try:
+        if len(mac_address) == 17:
+            # Fast path for the canonical "xx:xx:xx:xx:xx:xx" form
+            digits = mac_address.replace(':', '').replace('-', '')
+            if len(digits) == 12 and digits.isalnum():
+                return int(digits, 16)
+        segments = mac_address.replace('-', ':').split(':')
+        if len(segments) == 6:
+            value = 0
+            for segment in segments:
+                byte = int(segment, 16)
+                if not 0 <= byte <= 0xFF:
+                    return None
+                value = (value << 8) | byte
+            return value
+        if len(segments) == 1 and len(mac_address) == 12:
+            return int(mac_address, 16)
+    except ValueError:
+        pass
+    return None
+
+
+# ASCII code -> hexadecimal digit value, 0xFF for anything else
+_HEX_DIGITS = bytes(
+    int(chr(code), 16) if chr(code) in '0123456789abcdefABCDEF' else 0xFF
+    for code in range(256))
+
+
+def macs_to_array(mac_addresses, numpy):
+    """
+    Pack MAC addresses into an array of 48-bit integers.
+
+    Canonical "xx:xx:xx:xx:xx:xx" strings are converted in bulk; any other
+    spelling goes through mac_to_int, so that the result is always the one
+    of a lookup() of the same address.
+
+    Args:
+        mac_addresses (list): MAC addresses as strings (None is allowed).
+        numpy (module): The NumPy module.
+
+    Returns:
+        tuple: (values, valid) arrays, values as uint64 and valid as bool.
+    """
+    count = len(mac_addresses)
+    # Only 17 ASCII characters fit the fixed-width array unchanged: a longer
+    # string would be truncated into a valid address and a non-ASCII one
+    # could not be encoded, so both are left to mac_to_int
+    raw = numpy.array([mac_address if mac_address and len(mac_address) == 17
+                       and mac_address.isascii() else ''
+                       for mac_address in mac_addresses], dtype='S17')
+    chars = raw.view(numpy.uint8).reshape(count, 17)
+    digits = numpy.frombuffer(_HEX_DIGITS, dtype=numpy.uint8)[
+        chars[:, [0, 1, 3, 4, 6, 7, 9, 10, 12, 13, 15, 16]]]
+
+    separators = chars[:, [2, 5, 8, 11, 14]]
+    canonical = ((digits != 0xFF).all(axis=1)
+                 & ((separators == ord(':')) | (separators == ord('-'))).all(axis=1))
+
+    values = numpy.zeros(count, dtype=numpy.uint64)
+    for column in range(12):
+        values = (values << numpy.uint64(4)) | digits[:, column].astype(numpy.uint64)
+    valid = canonical.copy()
+
+    for position in numpy.flatnonzero(~canonical).tolist():
+        value = mac_to_int(mac_addresses[position]) if mac_addresses[position] else None
+        if value is not None:
+            values[position] = value
+            valid[position] = True
+    return values, valid
+
+
+def build_index(mapping, path=DEFAULT_INDEX_PATH):
+    """
+    Write a binary OUI index from a mapping of assignment prefixes to vendor names.
+
+    Args:
+        mapping (dict): Vendor names keyed by hexadecimal prefix: 6 digits for
+                        MA-L (e.g. "286FB9"), 7 for MA-M and 9 for MA-S.
+        path (str): Destination of the index file.
+    """
+    tables = {}
+    for prefix, vendor in mapping.items():
+        tables.setdefault(4 * len(prefix), []).append((int(prefix, 16), vendor))
+    widths = sorted(tables, reverse=True)
+
+    blob = bytearray()
+    name_offsets = {}
+    with open(path, 'wb') as index_file:
+        index_file.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(widths)))
+        for width in widths:
+            tables[width].sort()
+            index_file.write(TABLE.pack(width, len(tables[width])))
+
+        for width in widths:
+            entries = tables[width]
+            offsets = []
+            for _, vendor in entries:
+                if vendor not in name_offsets:
+                    encoded = vendor.encode('utf-8')[:0xFFFF]
+                    name_offsets[vendor] = len(blob)
+                    blob += struct.pack('<H', len(encoded)) + encoded
+                offsets.append(name_offsets[vendor])
+            index_file.write(
+                struct.pack(f'<{len(entries)}Q', *(key for key, _ in entries)))
+            index_file.write(struct.pack(f'<{len(entries)}I', *offsets))
+
+        index_file.write(blob)
+
+
+class _PrefixTable:
+    """
+    Sorted prefixes of one width, viewed in place inside the mapped index.
+    """
+
+    def __init__(self, mm, width, count, position):
+        self.width = width
+        self.shift = 48 - width
+        self.count = count
+        self.offsets = position + 8 * count
+        # NumPy views of the table, created by the first bulk lookup
+        self.arrays = None
+        end = self.offsets + 4 * count
+        if sys.byteorder == 'little':
+            # Zero-copy views of the sorted keys and of the name offsets
+            self.keys = memoryview(mm)[position:self.offsets].cast('Q')
+            self.name_offsets = memoryview(mm)[self.offsets:end].cast('I')
+        else:
+            self.keys = array('Q', mm[position:self.offsets])
+            self.keys.byteswap()
+            self.name_offsets = array('I', mm[self.offsets:end])
+            self.name_offsets.byteswap()
+
+    def as_arrays(self, mm, numpy):
+        """
+        Return NumPy views of the keys and of the name offsets.
+        """
+        if self.arrays is None:
+            self.arrays = (
+                numpy.frombuffer(mm, dtype='<u8', count=self.count,
+                                 offset=self.offsets - 8 * self.count),
+                numpy.frombuffer(mm, dtype='<u4', count=self.count, offset=self.offsets))
+        return self.arrays
+
+    def find(self, value):
+        """
+        Return the position of the prefix of a 48-bit MAC value, or -1.
+        """
+        prefix = value >> self.shift
+        position = bisect_left(self.keys, prefix)
+        if position < self.count and self.keys[position] == prefix:
+            return position
+        return -1
+
+    def release(self):
+        if isinstance(self.keys, memoryview):
+            self.keys.release()
+            self.name_offsets.release()
+        self.arrays = None
+
+
+class OuiIndex:
+    """
+    Read-only vendor database backed by a memory-mapped binary OUI index.
+
+    Holds one sorted table per assignment size (MA-S, MA-M, MA-L) and returns
+    the vendor of the longest registered prefix. Only the pages touched by the
+    binary searches are loaded, and the mapping is shared between every
+    process opening the same file. The vendor of each OUI found is kept, so
+    repeated lookups of a vendor skip the binary search.
+
+    The shipped mac_24bit.idx is built from mac_24bit.csv, the MA-L registry
+    only. Until the MA-M and MA-S exports are added as mac_28bit.csv and
+    mac_36bit.csv and parse_mac_info.py is run again, addresses of those
+    blocks resolve to the owner of the parent OUI, "IEEE Registration
+    Authority".
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        with open(path, 'rb') as index_file:
+            self._mm = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, table_count = HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a supported OUI index file")
+
+        self.tables = []
+        position = HEADER.size + TABLE.size * table_count
+        for number in range(table_count):
+            width, count = TABLE.unpack_from(self._mm, HEADER.size + TABLE.size * number)
+            self.tables.append(_PrefixTable(self._mm, width, count, position))
+            position += 12 * count
+        self._blob = position
+        # Decoded vendor names keyed by their offset in the blob
+        self._names = {}
+        # Vendors keyed by 24-bit OUI, for the OUIs found by earlier lookups
+        # whose blocks are not split into MA-M / MA-S assignments
+        self._oui_vendors = {}
+        self._split_ouis = {key >> (table.width - 24)
+                            for table in self.tables if table.width > 24
+                            for key in table.keys}
+
+    def __len__(self):
+        return sum(table.count for table in self.tables)
+
+    def close(self):
+        for table in self.tables:
+            table.release()
+        self._mm.close()
+
+    def _read_name(self, name_offset):
+        name = self._names.get(name_offset)
+        if name is None:
+            offset = self._blob + name_offset
+            length = struct.unpack_from('<H', self._mm, offset)[0]
+            name = self._mm[offset + 2:offset + 2 + length].decode('utf-8')
+            self._names[name_offset] = name
+        return name
+
+    def lookup_int(self, value):
+        """
+        Find the vendor of the longest registered prefix of a MAC address.
+
+        Args:
+            value (int): MAC address as a 48-bit integer.
+
+        Returns:
+            str: Vendor name, or None if no prefix is registered.
+        """
+        oui = value >> 24
+        vendor = self._oui_vendors.get(oui)
+        if vendor is not None:
+            return vendor
+        # Tables are stored longest prefix first
+        for table in self.tables:
+            position = table.find(value)
+            if position >= 0:
+                vendor = self._read_name(table.name_offsets[position])
+                if table.width <= 24 and oui not in self._split_ouis:
+                    self._oui_vendors[oui] = vendor
+                return vendor
+        return None
+
+    def lookup(self, mac_address):
+        """
+        Retrieve the vendor associated with a MAC address.
+
+        Args:
+            mac_address (str): MAC address in the format "XX:XX:XX:XX:XX:XX".
+
+        Returns:
+            str: Vendor name, or None if unknown.
+        """
+        value = mac_to_int(mac_address) if mac_address else None
+        if value is None:
+            return None
+        return self.lookup_int(value)
+
+    def lookup_many(self, mac_addresses):
+        """
+        Retrieve the vendors of many MAC addresses at once.
+
+        The addresses are packed into 48-bit integers and resolved against
+        every prefix table with NumPy's searchsorted. Falls back to one lookup
+        per address when NumPy is not installed.
+
+        Args:
+            mac_addresses (list): MAC addresses in the format "XX:XX:XX:XX:XX:XX".
+
+        Returns:
+            list: Vendor names (or None) in the same order as the input.
+        """
+        try:
+            import numpy
+        except ImportError:
+            return [self.lookup(mac_address) for mac_address in mac_addresses]
+
+        values, valid = macs_to_array(mac_addresses, numpy)
+        name_offsets = numpy.full(len(values), -1, dtype=numpy.int64)
+        unresolved = valid.copy()
+
+        # Tables are stored longest prefix first
+        for table in self.tables:
+            if not table.count or not unresolved.any():
+                continue
+            keys, offsets = table.as_arrays(self._mm, numpy)
+            prefixes = values >> numpy.uint64(table.shift)
+            found = numpy.minimum(numpy.searchsorted(keys, prefixes), table.count - 1)
+            matched = unresolved & (keys[found] == prefixes)
+            name_offsets[matched] = offsets[found[matched]]
+            unresolved &= ~matched
+
+        # Decode every distinct vendor name once
+        unique_offsets, inverse = numpy.unique(name_offsets, return_inverse=True)
+        names = [self._read_name(offset) if offset >= 0 else None
+                 for offset in unique_offsets.tolist()]
+        return [names[number] for number in inverse.ravel().tolist()]
+
+
+def get_index():
+    """
+    Open the default OUI index on first use and return the shared instance.
+    """
+    global _index
+    if _index is None:
+        _index = OuiIndex()
+    return _index
+
+
+def get_vendor_from_mac(mac_address):
+    """
+    Retrieve the vendor associated with a given MAC address based on the OUI database.
+
+    Args:
+        mac_address (str): MAC address in the format "XX:XX:XX:XX:XX:XX".
+
+    Returns:
+        str: Vendor name associated with the MAC address, or None if unknown.
+    """
+    return get_index().lookup(mac_address)
+
+
+def get_vendors_from_mac_list(mac_addresses):
+    """
+    Retrieve the vendors of a list of MAC addresses in a single batch.
+
+    Args:
+        mac_addresses (list): MAC addresses in the format "XX:XX:XX:XX:XX:XX".
+
+    Returns:
+        list: Vendor names (or None) in the same order as the input.
+    """
+    return get_index().lookup_many(mac_addresses)
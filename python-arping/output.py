@@ -0,0 +1,108 @@
+import csv
+import json
+import sys
+from contextlib import nullcontext, redirect_stdout
+
+from metrics import get_metrics
+
+# "text" and "ndjson" print each device as soon as it is written, "csv"
+# streams its rows after the header, "table" and "json" print at the end
+FORMATS = ("table", "text", "ndjson", "csv", "json")
+STREAMING_FORMATS = ("text", "ndjson", "csv")
+
+DEFAULT_FIELDS = ("ip", "mac", "hostname", "vendor")
+HEADERS = {"ip": "IP Address", "mac": "MAC Address", "hostname": "Hostname",
+           "vendor": "Vendor"}
+
+# Column widths of the "text" format, the last column is not padded
+TEXT_WIDTHS = {"ip": 16, "mac": 18, "hostname": 32}
+
+
+def add_format_argument(parser, default="table"):
+    """
+    Add the --format option to a scanner's argument parser.
+    """
+    parser.add_argument("--format", choices=FORMATS, default=default,
+                        help=f"output format (default: {default}); ndjson, text and csv "
+                             "stream the devices as they are found")
+
+
+def messages_to_stderr(output_format):
+    """
+    Context manager sending the progress messages printed by the scanners to
+    stderr, so they do not mix with machine-readable output on stdout.
+    """
+    if output_format in ("table", "text"):
+        return nullcontext()
+    return redirect_stdout(sys.stderr)
+
+
+class DeviceWriter:
+    """
+    Write devices to a stream in one of the FORMATS, one device at a time.
+    """
+
+    def __init__(self, output_format="table", stream=None, fields=DEFAULT_FIELDS):
+        """
+        Args:
+            output_format (str): One of FORMATS.
+            stream (file): Stream to write to, sys.stdout when created if None.
+            fields (tuple): Device keys to output, in order.
+        """
+        if output_format not in FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.format = output_format
+        self.stream = stream or sys.stdout
+        self.fields = fields
+        self._rows = []
+        self._csv = None
+        if output_format == "csv":
+            self._csv = csv.DictWriter(
+                self.stream, fieldnames=fields, extrasaction='ignore')
+            self._csv.writeheader()
+
+    def write(self, device):
+        """
+        Output one device, or keep it for close() for the table and json formats.
+        """
+        row = {field: device.get(field) for field in self.fields}
+        get_metrics().increment("devices_output", format=self.format)
+        if self.format == "ndjson":
+            self.stream.write(json.dumps(row, separators=(',', ':')) + "\n")
+        elif self.format == "csv":
+            self._csv.writerow(row)
+        elif self.format == "text":
+            self.stream.write(" ".join(f"{row[field] or '':<{TEXT_WIDTHS.get(field, 0)}}"
+                                       for field in self.fields).rstrip() + "\n")
+        else:
+            self._rows.append(row)
+            return
+        self.stream.flush()
+
+    def write_many(self, devices):
+        for device in devices:
+            self.write(device)
+
+    def close(self):
+        """
+        Output the devices kept for the end, if any.
+        """
+        with get_metrics().stage("render", format=self.format):
+            if self.format == "json":
+                json.dump(self._rows, self.stream, separators=(',', ':'))
+                self.stream.write("\n")
+            elif self.format == "table":
+                from tabulate import tabulate
+
+                self.stream.write(tabulate(
+                    [[row[field] for field in self.fields] for row in self._rows],
+                    headers=[HEADERS.get(field, field) for field in self.fields],
+                    tablefmt="grid", showindex="always") + "\n")
+        self._rows = []
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
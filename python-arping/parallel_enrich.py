@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from neighbours import PROC_NET_ARP, parse_arp_output, parse_proc_arp
+from oui_index import DEFAULT_INDEX_PATH, OuiIndex, get_index
+
+# Lines handed to a worker at once; large enough for the pickling of a
+# chunk and of its records to stay small next to their parsing
+DEFAULT_CHUNK_LINES = 8192
+
+# Below this many lines the pool costs more than it saves
+MIN_PARALLEL_LINES = 2 * DEFAULT_CHUNK_LINES
+
+PARSERS = {
+    # /proc/net/arp, whose first line is a header
+    'proc': parse_proc_arp,
+    # BSD / macOS `arp -a`
+    'arp': parse_arp_output,
+}
+
+# OUI index opened once by each worker process
+_worker_index = None
+
+# Workers are started from a fresh server process rather than forked from a
+# caller that may run resolver or HTTP threads holding locks
+POOL_CONTEXT = "forkserver"
+
+
+def read_table_text():
+    """
+    Read the neighbour table as text, from /proc or from `arp -an`.
+
+    Returns:
+        tuple: (kind, text) where kind is a key of PARSERS.
+    """
+    try:
+        with open(PROC_NET_ARP) as file:
+            return 'proc', file.read()
+    except OSError:
+        output = subprocess.run(["arp", "-an"], capture_output=True, text=True).stdout
+        return 'arp', output
+
+
+def split_chunks(text, kind, chunk_lines=DEFAULT_CHUNK_LINES):
+    """
+    Split a neighbour table into chunks of whole lines, each parseable on its own.
+
+    Yields:
+        str: Chunks in table order; with the "proc" format each one starts
+             with the header line its parser skips.
+    """
+    lines = iter(text.splitlines())
+    header = next(lines, "") + "\n" if kind == 'proc' else ""
+    while True:
+        chunk = list(islice(lines, chunk_lines))
+        if not chunk:
+            return
+        yield header + "\n".join(chunk)
+
+
+def add_vendors(records, index):
+    """
+    Set the "vendor" of the records from the OUI index, in one batch.
+    """
+    vendors = index.lookup_many([record['mac'] for record in records])
+    for record, vendor in zip(records, vendors):
+        record['vendor'] = vendor
+    return records
+
+
+def _init_worker(index_path):
+    global _worker_index
+    # The index is memory-mapped read-only: every worker maps the same page
+    # cache pages instead of receiving a copy of the vendor table
+    _worker_index = OuiIndex(index_path) if index_path else None
+
+
+def _parse_chunk(kind, chunk):
+    records = PARSERS[kind](chunk)
+    if _worker_index is not None:
+        add_vendors(records, _worker_index)
+    return records
+
+
+def parse_and_enrich(text, kind='proc', workers=None, vendors=True,
+                     chunk_lines=DEFAULT_CHUNK_LINES, index_path=DEFAULT_INDEX_PATH):
+    """
+    Parse a neighbour table and add the vendor of every entry, splitting
+    large tables in chunks handled by a pool of worker processes.
+
+    Args:
+        text (str): Neighbour table, as read by read_table_text.
+        kind (str): Format of the table, a key of PARSERS.
+        workers (int): Number of worker processes, the CPU count if None;
+                       1 parses in the calling process.
+        vendors (bool): Also look the vendors up in the OUI index.
+        chunk_lines (int): Lines parsed by a worker at once.
+        index_path (str): OUI index mapped by the workers.
+
+    Returns:
+        list: Records as returned by the parser, plus "vendor" if requested,
+              in table order.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or text.count("\n") < max(chunk_lines, MIN_PARALLEL_LINES):
+        records = PARSERS[kind](text)
+        return add_vendors(records, get_index()) if vendors else records
+
+    records = []
+    context = multiprocessing.get_context(POOL_CONTEXT)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(index_path if vendors else None,),
+                             mp_context=context) as executor:
+        # map() hands the results back in submission order
+        for chunk_records in executor.map(partial(_parse_chunk, kind),
+                                          split_chunks(text, kind, chunk_lines)):
+            records += chunk_records
+    return records
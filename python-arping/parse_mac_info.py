@@ -1,29 +1,58 @@
 import csv
 import os
 import json
+from oui_index import build_index
 
 
-def filter_csv_and_convert_to_dict():
-    # Get the directory path of the current script
-    script_directory = os.path.dirname(os.path.abspath(__file__))
+# IEEE registries and the number of hexadecimal digits of their assignments
+REGISTRY_PREFIX_DIGITS = {
+    "MA-L": 6,  # 24-bit OUI
+    "MA-M": 7,  # 28-bit
+    "MA-S": 9,  # 36-bit (OUI-36 / IAB)
+    "IAB": 9,
+}
+
+# IEEE CSV exports (oui.csv, mam.csv, oui36.csv) read when present
+REGISTRY_FILES = ("mac_24bit.csv", "mac_28bit.csv", "mac_36bit.csv")
+
 
-    # Construct the full path to the CSV file located in the same directory
-    # Replace 'your_file_name.csv' with the actual filename
-    file_path = os.path.join(script_directory, 'mac_24bit.csv')
+def filter_csv_and_convert_to_dict(file_names=REGISTRY_FILES):
+    """
+    Read the IEEE registry CSV exports and map every assignment to its vendor.
 
-    with open(file_path, 'r') as csvfile:
-        csvreader = csv.reader(csvfile)
-        result_dict = {}
+    Rows of the MA-L, MA-M and MA-S registries are kept with their full
+    assignment (6, 7 or 9 hexadecimal digits), so that the vendor lookup can
+    pick the longest matching prefix.
 
-        for row in csvreader:
-            try:
-                if len(row) == 4:
-                    _, mac, vendor, _ = row
+    Args:
+        file_names (tuple): CSV files, relative to this script, to read if present.
+
+    Returns:
+        dict: Vendor names keyed by hexadecimal assignment prefix.
+    """
+    # Get the directory path of the current script
+    script_directory = os.path.dirname(os.path.abspath(__file__))
+    result_dict = {}
 
-                    result_dict[mac] = vendor
-            except Exception as e:
-                print(e)
-                break
+    for file_name in file_names:
+        file_path = os.path.join(script_directory, file_name)
+        if not os.path.exists(file_path):
+            continue
+
+        with open(file_path, 'r') as csvfile:
+            for row in csv.reader(csvfile):
+                if len(row) != 4:
+                    continue
+                registry, mac, vendor, _ = row
+                mac = mac.strip().upper()
+                # Also skips the "Registry,Assignment,..." header row
+                if len(mac) != REGISTRY_PREFIX_DIGITS.get(registry.strip()):
+                    continue
+                try:
+                    int(mac, 16)
+                except ValueError:
+                    continue
+                result_dict[mac] = vendor
 
     return result_dict
 
@@ -39,10 +68,19 @@ def save_to_json(data, output_file="mac_24bit.json"):
         json.dump(data, jsonfile, indent=4)
 
 
+def save_to_index(data, output_file="mac_24bit.idx"):
+    # Get the directory path of the current script
+    script_directory = os.path.dirname(os.path.abspath(__file__))
+
+    # Build the memory-mappable binary index read by oui_index.OuiIndex
+    build_index(data, os.path.join(script_directory, output_file))
+
+
 if __name__ == "__main__":
     filtered_data = filter_csv_and_convert_to_dict()
 
     # Save the filtered data to a JSON file named 'output.json'
     save_to_json(filtered_data)
+    save_to_index(filtered_data)
 
-    print("Data saved to output.json.")
+    print("Data saved to mac_24bit.json and mac_24bit.idx.")
@@ -0,0 +1,295 @@
+import argparse
+import ctypes
+import select
+import socket
+import struct
+import threading
+import time
+
+from arp_sweep import mac_to_str, parse_arp
+from metrics import get_metrics
+from oui_index import get_index
+from output import DeviceWriter, add_format_argument, messages_to_stderr
+from registry import DeviceRegistry
+
+ETH_P_ALL = 0x0003
+SO_ATTACH_FILTER = 26
+
+# Classic BPF ancillary load of the packet type (see linux/filter.h)
+SKF_AD_PKTTYPE = 0xFFFFF000 + 4
+
+# DHCP (see RFC 2131 and RFC 2132)
+DHCP_SERVER_PORT = 67
+DHCP_CLIENT_PORT = 68
+DHCP_MAGIC_COOKIE = b"\x63\x82\x53\x63"
+DHCP_OPTION_HOSTNAME = 12
+DHCP_OPTION_MESSAGE_TYPE = 53
+DHCP_OPTION_END = 255
+DHCPREQUEST = 3
+DHCPACK = 5
+
+# Classic BPF program keeping "not outbound and (arp or (udp and (port 67 or
+# port 68)))" in the kernel, so the other frames are never copied to user
+# space. Each entry is (code, jump if true, jump if false, k), jumps being
+# relative to the next one. The frames sent by this host are dropped, or its
+# own sweeps would be learned as devices.
+ARP_DHCP_FILTER = [
+    (0x20, 0, 0, SKF_AD_PKTTYPE),                 # 0: ld #pkttype
+    (0x15, 15, 0, socket.PACKET_OUTGOING),        # 1: jeq outgoing -> drop
+    (0x28, 0, 0, 12),         # 2: ldh [12]                 ethertype
+    (0x15, 12, 0, 0x0806),    # 3: jeq ARP -> accept
+    (0x15, 0, 12, 0x0800),    # 4: jeq IPv4, else drop
+    (0x30, 0, 0, 23),         # 5: ldb [23]                 IP protocol
+    (0x15, 0, 10, 17),        # 6: jeq UDP, else drop
+    (0x28, 0, 0, 20),         # 7: ldh [20]                 fragment offset
+    (0x45, 8, 0, 0x1FFF),     # 8: jset -> drop the non-first fragments
+    (0xB1, 0, 0, 14),         # 9: ldxb 4 * ([14] & 0xf)    IP header length
+    (0x48, 0, 0, 14),         # 10: ldh [x + 14]            source port
+    (0x15, 4, 0, DHCP_SERVER_PORT),   # 11
+    (0x15, 3, 0, DHCP_CLIENT_PORT),   # 12
+    (0x48, 0, 0, 16),         # 13: ldh [x + 16]            destination port
+    (0x15, 1, 0, DHCP_SERVER_PORT),   # 14
+    (0x15, 0, 1, DHCP_CLIENT_PORT),   # 15: else drop
+    (0x06, 0, 0, 0x40000),    # 16: accept (up to 256KB)
+    (0x06, 0, 0, 0),          # 17: drop
+]
+
+
+def attach_filter(sock, program=ARP_DHCP_FILTER):
+    """
+    Attach a classic BPF program to a socket (SO_ATTACH_FILTER).
+
+    Args:
+        sock (socket): AF_PACKET socket.
+        program (list): (code, jt, jf, k) instructions.
+    """
+    instructions = b"".join(struct.pack('HBBI', *instruction) for instruction in program)
+    buffer = ctypes.create_string_buffer(instructions)
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    fprog = struct.pack('HL', len(program), ctypes.addressof(buffer))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def _dhcp_options(data):
+    """
+    Decode the options of a DHCP message into a {code: value} dictionary.
+    """
+    options = {}
+    offset = 0
+    while offset < len(data):
+        code = data[offset]
+        if code == DHCP_OPTION_END:
+            break
+        if code == 0:
+            # Padding
+            offset += 1
+            continue
+        if offset + 1 >= len(data):
+            break
+        length = data[offset + 1]
+        options[code] = data[offset + 2:offset + 2 + length]
+        offset += 2 + length
+    return options
+
+
+def parse_dhcp(frame):
+    """
+    Extract the client of a DHCP request or acknowledgement.
+
+    Args:
+        frame (bytes): Raw Ethernet frame.
+
+    Returns:
+        tuple: (message_type, client_mac, ip_address, hostname), ip_address
+               being None when the message carries no usable address and
+               hostname None when the client did not send one, or None if
+               the frame is not a DHCP message.
+
+    The address of a request is only the one a renewing client already
+    uses (ciaddr); the address it asks for is not granted until the ACK.
+    """
+    if len(frame) < 34 or frame[12:14] != b"\x08\x00" or frame[23] != socket.IPPROTO_UDP:
+        return None
+    udp = 14 + (frame[14] & 0x0F) * 4
+    bootp = udp + 8
+    if len(frame) < bootp + 240 or frame[bootp + 236:bootp + 240] != DHCP_MAGIC_COOKIE:
+        return None
+    ports = struct.unpack('!HH', frame[udp:udp + 4])
+    if DHCP_SERVER_PORT not in ports and DHCP_CLIENT_PORT not in ports:
+        return None
+
+    ciaddr, yiaddr = frame[bootp + 12:bootp + 16], frame[bootp + 16:bootp + 20]
+    client_mac = mac_to_str(frame[bootp + 28:bootp + 34])
+    options = _dhcp_options(frame[bootp + 240:])
+    message_type = options.get(DHCP_OPTION_MESSAGE_TYPE, b"\x00")[0]
+
+    address = None
+    if message_type == DHCPACK:
+        address = yiaddr if yiaddr != b"\x00" * 4 else ciaddr
+    elif message_type == DHCPREQUEST:
+        address = ciaddr
+    ip_address = None
+    if address and len(address) == 4 and address != b"\x00" * 4:
+        ip_address = socket.inet_ntoa(address)
+    hostname = options.get(DHCP_OPTION_HOSTNAME)
+    if hostname:
+        hostname = hostname.decode('utf-8', 'replace')
+    return message_type, client_mac, ip_address, hostname or None
+
+
+class PassiveListener:
+    """
+    Learn the devices of the local networks without sending anything, from
+    the ARP and DHCP traffic they produce.
+
+    Frames are filtered in the kernel by a BPF program, so only ARP and DHCP
+    reach Python whatever the load on the interface. Every sender becomes a
+    device record in a DeviceRegistry, with its vendor, and DHCP clients
+    also get the hostname they announce.
+    """
+
+    def __init__(self, interfaces=None, on_device=None):
+        """
+        Args:
+            interfaces (list): Interfaces to listen on, all of them if None.
+            on_device (callable): Called as on_device(device) when a device
+                                  is learned or one of its fields changes.
+        """
+        self.interfaces = interfaces
+        self.on_device = on_device
+        self.registry = DeviceRegistry()
+        self.stats = {'frames': 0, 'arp': 0, 'dhcp': 0}
+        self._hostnames = {}
+        self._sockets = []
+        self._stopping = threading.Event()
+        self._thread = None
+        for interface in interfaces or [None]:
+            sock = socket.socket(
+                socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+            attach_filter(sock)
+            if interface:
+                sock.bind((interface, ETH_P_ALL))
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            sock.setblocking(False)
+            # Drop what was queued before the filter was attached
+            try:
+                while sock.recv(65535):
+                    pass
+            except BlockingIOError:
+                pass
+            self._sockets.append(sock)
+
+    def close(self):
+        self.stop()
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _learn(self, ip_address, mac_address, hostname=None, source="arp"):
+        """
+        Merge one sighting into the registry and notify if anything changed.
+        """
+        hostname = hostname or self._hostnames.get(mac_address)
+        known = self.registry.get_by_ip(ip_address)
+        if (known and known['mac'] == mac_address
+                and (not hostname or known.get('hostname'))):
+            self.registry.upsert({'ip': ip_address, 'last_seen': time.time()})
+            return
+        device = {'ip': ip_address, 'mac': mac_address, 'source': source,
+                  'vendor': get_index().lookup(mac_address), 'last_seen': time.time()}
+        if hostname:
+            device['hostname'] = hostname
+        device = self.registry.upsert(device)
+        if self.on_device:
+            self.on_device(device)
+
+    def _handle(self, frame):
+        self.stats['frames'] += 1
+        parsed = parse_arp(frame)
+        if parsed:
+            self.stats['arp'] += 1
+            _, sender_ip, sender_mac, _ = parsed
+            # ARP probes (RFC 5227) are sent from 0.0.0.0
+            if sender_ip != b"\x00" * 4:
+                self._learn(socket.inet_ntoa(sender_ip), mac_to_str(sender_mac))
+            return
+        parsed = parse_dhcp(frame)
+        if parsed:
+            self.stats['dhcp'] += 1
+            _, client_mac, ip_address, hostname = parsed
+            if hostname:
+                # DISCOVER and REQUEST carry the name, the ACK the final address
+                self._hostnames[client_mac] = hostname
+            if ip_address:
+                self._learn(ip_address, client_mac, hostname, source="dhcp")
+
+    def listen(self, duration=None):
+        """
+        Process the frames until duration seconds elapsed or stop() is called.
+
+        Args:
+            duration (float): Seconds to listen, forever if None.
+
+        Returns:
+            DeviceRegistry: The devices learned so far.
+        """
+        deadline = None if duration is None else time.monotonic() + duration
+        stats_before = dict(self.stats)
+        while not self._stopping.is_set():
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+            if wait <= 0:
+                break
+            readable, _, _ = select.select(self._sockets, [], [], wait)
+            for sock in readable:
+                try:
+                    while True:
+                        self._handle(sock.recv(65535))
+                except BlockingIOError:
+                    pass
+        metrics = get_metrics()
+        for protocol in ('arp', 'dhcp'):
+            metrics.increment("passive_frames",
+                              self.stats[protocol] - stats_before[protocol],
+                              protocol=protocol)
+        return self.registry
+
+    def start(self):
+        """
+        Listen in a background thread until stop() is called.
+        """
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self.listen, name="passive-listener", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Learn the devices of the local networks from their ARP and "
+                    "DHCP traffic.")
+    parser.add_argument("-i", "--interface", action="append", dest="interfaces",
+                        help="interface to listen on, can be repeated (default: all)")
+    parser.add_argument("--duration", type=float,
+                        help="seconds to listen (default: until interrupted)")
+    add_format_argument(parser, default="text")
+    args = parser.parse_args()
+
+    with DeviceWriter(args.format) as writer, messages_to_stderr(args.format):
+        with PassiveListener(args.interfaces, on_device=writer.write) as listener:
+            try:
+                listener.listen(args.duration)
+            except KeyboardInterrupt:
+                pass
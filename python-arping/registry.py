@@ -0,0 +1,157 @@
+import threading
+from collections import deque
+from socket import AF_INET6, inet_aton, inet_pton
+
+
+def address_sort_key(ip_address):
+    """
+    Sort key ordering IPv4 addresses numerically, before the IPv6 ones, and
+    the link-local ones ("fe80::1%eth0") by address then by interface.
+    """
+    if ':' in ip_address:
+        address, _, scope = ip_address.partition('%')
+        return 1, inet_pton(AF_INET6, address), scope
+    return 0, inet_aton(ip_address), ""
+
+
+# Conflicts kept by a registry, the oldest ones being dropped first
+MAX_CONFLICTS = 1000
+
+
+class DeviceRegistry:
+    """
+    Devices found by one or more scans, indexed by IP and by MAC address.
+
+    Adding a device is a dictionary update whatever the number of devices
+    already known, so merging the results of many networks stays linear.
+    An IP address answering with a new MAC is recorded as a conflict, which
+    points at ARP spoofing, a duplicate address or a migrated VM.
+
+    The registry can be shared between threads: the devices and conflicts
+    it returns are copies taken under its lock.
+    """
+
+    def __init__(self, devices=(), max_conflicts=MAX_CONFLICTS):
+        """
+        Args:
+            devices (iterable): Devices to add right away.
+            max_conflicts (int): Number of most recent conflicts kept.
+        """
+        self._by_ip = {}
+        self._by_mac = {}
+        self.conflicts = deque(maxlen=max_conflicts)
+        self._lock = threading.Lock()
+        self.update(devices)
+
+    def upsert(self, device):
+        """
+        Add a device, or merge it into the one already known with the same IP.
+
+        The fields of the new dictionary win, except the empty ones. When the
+        MAC differs, the new MAC replaces the old one and the change is
+        appended to `conflicts` as {'ip', 'old_mac', 'new_mac'}.
+
+        Args:
+            device (dict): Dictionary with at least the "ip" key.
+
+        Returns:
+            dict: A copy of the stored device.
+        """
+        ip_address = device['ip']
+        mac_address = (device.get('mac') or "").lower()
+        with self._lock:
+            known = self._by_ip.get(ip_address)
+            if known is None:
+                known = self._by_ip[ip_address] = dict(device)
+            else:
+                known_mac = (known.get('mac') or "").lower()
+                if mac_address and known_mac and mac_address != known_mac:
+                    self.conflicts.append(
+                        {'ip': ip_address, 'old_mac': known_mac, 'new_mac': mac_address})
+                    self._forget_mac(known_mac, ip_address)
+                known.update((key, value) for key, value in device.items()
+                             if value or key not in known)
+            if mac_address:
+                self._by_mac.setdefault(mac_address, set()).add(ip_address)
+            return dict(known)
+
+    def update(self, devices):
+        """
+        Upsert every device of an iterable.
+        """
+        for device in devices:
+            self.upsert(device)
+
+    def prune(self, last_seen_before):
+        """
+        Remove the devices last seen before a time.
+
+        Args:
+            last_seen_before (float): Timestamp; the devices whose "last_seen"
+                                      is older are removed, the ones without
+                                      "last_seen" are kept.
+
+        Returns:
+            list: Copies of the removed devices.
+        """
+        removed = []
+        with self._lock:
+            for ip_address, known in list(self._by_ip.items()):
+                if known.get('last_seen', last_seen_before) >= last_seen_before:
+                    continue
+                del self._by_ip[ip_address]
+                mac_address = (known.get('mac') or "").lower()
+                if mac_address:
+                    self._forget_mac(mac_address, ip_address)
+                removed.append(dict(known))
+        return removed
+
+    def _forget_mac(self, mac_address, ip_address):
+        ips = self._by_mac.get(mac_address)
+        if ips:
+            ips.discard(ip_address)
+            if not ips:
+                del self._by_mac[mac_address]
+
+    def get_by_ip(self, ip_address):
+        """
+        Return the device using an IP address, or None.
+        """
+        with self._lock:
+            known = self._by_ip.get(ip_address)
+            return dict(known) if known is not None else None
+
+    def get_by_mac(self, mac_address):
+        """
+        Return the devices (one per IP address) using a MAC address.
+        """
+        with self._lock:
+            return [dict(self._by_ip[ip])
+                    for ip in self._by_mac.get(mac_address.lower(), ())]
+
+    def get_conflicts(self):
+        """
+        The most recent conflicts, oldest first.
+        """
+        with self._lock:
+            return [dict(conflict) for conflict in self.conflicts]
+
+    def __len__(self):
+        return len(self._by_ip)
+
+    def __contains__(self, ip_address):
+        return ip_address in self._by_ip
+
+    def __iter__(self):
+        return iter(self.devices())
+
+    def devices(self):
+        """
+        All the devices, sorted by IP address.
+
+        Returns:
+            list: Device dictionaries.
+        """
+        with self._lock:
+            return [dict(self._by_ip[ip])
+                    for ip in sorted(self._by_ip, key=address_sort_key)]
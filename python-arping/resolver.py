@@ -0,0 +1,221 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, wait
+from socket import gethostbyaddr
+
+from metrics import get_metrics
+
+_resolver = None
+
+
+class ReverseResolver:
+    """
+    Reverse DNS resolver with bounded concurrency, a per-query timeout and a
+    cache of both the names found (kept for their TTL) and the misses (kept
+    for negative_ttl), so repeated scans do not query the same PTRs again.
+
+    Without a server the system resolver (gethostbyaddr) is used from the
+    thread pool; with a server the PTR queries are sent to it directly.
+    """
+
+    def __init__(self, server=None, port=53, max_workers=32, timeout=1.0,
+                 ttl=300, negative_ttl=60):
+        """
+        Args:
+            server (str): DNS server to query, or None for the system resolver.
+            port (int): UDP port of the DNS server.
+            max_workers (int): Maximum number of concurrent queries.
+            timeout (float): Seconds allowed to each query.
+            ttl (int): Seconds a name is cached when the answer carries no TTL.
+            negative_ttl (int): Seconds a miss (no PTR, error, timeout) is cached.
+        """
+        self.server = server
+        self.port = port
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="reverse-dns")
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _query(self, ip_address):
+        """
+        Run one lookup and cache its outcome. Returns the hostname or "".
+        """
+        start = time.perf_counter()
+        hostname, ttl = "", self.negative_ttl
+        try:
+            if self.server:
+                # The PTR codec is only needed with an explicit server
+                from dns_ptr import lookup_ptr
+
+                # NXDOMAIN, an empty answer or no answer at all stay misses
+                answer = lookup_ptr(ip_address, self.server, self.port, self.timeout)
+                if answer and answer[0]:
+                    hostname, ttl = answer[0], answer[1] or self.ttl
+            else:
+                hostname, ttl = gethostbyaddr(ip_address)[0], self.ttl
+        except Exception:
+            # herror, OSError, an invalid address (ValueError) or anything
+            # unexpected: a miss, rather than an error raised in resolve_many
+            hostname, ttl = "", self.negative_ttl
+        finally:
+            # Always settle the query, so that no caller keeps its future
+            with self._lock:
+                self._cache[ip_address] = (hostname, time.monotonic() + ttl)
+                self._pending.pop(ip_address, None)
+
+        metrics = get_metrics()
+        metrics.observe("dns_query_seconds", time.perf_counter() - start)
+        metrics.increment("dns_queries", result="found" if hostname else "missing")
+        return hostname
+
+    def _cached(self, ip_address):
+        """
+        Return the cached hostname, or None if absent or expired. Caller holds the lock.
+        """
+        entry = self._cache.get(ip_address)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._cache[ip_address]
+            return None
+        return entry[0]
+
+    def _submit(self, ip_address):
+        """
+        Return the cached hostname or a future resolving it. Caller holds the lock.
+        """
+        hostname = self._cached(ip_address)
+        if hostname is not None:
+            self.hits += 1
+            get_metrics().increment("dns_cache_hits")
+            return hostname
+        self.misses += 1
+        get_metrics().increment("dns_cache_misses")
+        # Share the in-flight query between concurrent callers
+        future = self._pending.get(ip_address)
+        if future is None:
+            future = self._executor.submit(self._query, ip_address)
+            self._pending[ip_address] = future
+        return future
+
+    def submit(self, ip_address):
+        """
+        Start resolving an IP address without waiting for the answer.
+
+        Args:
+            ip_address (str): IP address of the device.
+
+        Returns:
+            Future: Completes with the hostname, or "" if none was found. It is
+                    shared with the other callers, so it must not be cancelled.
+        """
+        with self._lock:
+            result = self._submit(ip_address)
+        if isinstance(result, str):
+            future = Future()
+            future.set_result(result)
+            return future
+        return result
+
+    def resolve(self, ip_address):
+        """
+        Retrieve the hostname of an IP address.
+
+        Args:
+            ip_address (str): IP address of the device.
+
+        Returns:
+            str: Hostname, or "" if not found within the timeout.
+        """
+        with self._lock:
+            result = self._submit(ip_address)
+        if isinstance(result, str):
+            return result
+        try:
+            return result.result(timeout=self.timeout)
+        except TimeoutError:
+            # The query keeps running and caches its answer for the next scan
+            return ""
+
+    def resolve_many(self, ip_addresses):
+        """
+        Retrieve the hostnames of many IP addresses concurrently.
+
+        Waits at most `timeout` seconds per round of max_workers queries.
+
+        Args:
+            ip_addresses (iterable): IP addresses to resolve.
+
+        Returns:
+            dict: Hostnames ("" when not found in time) keyed by IP address.
+        """
+        hostnames = {}
+        futures = {}
+        with self._lock:
+            for ip_address in ip_addresses:
+                result = self._submit(ip_address)
+                if isinstance(result, str):
+                    hostnames[ip_address] = result
+                else:
+                    futures[ip_address] = result
+
+        if futures:
+            # Bounded by max_workers, so a batch waits for ceil(n / workers) rounds
+            rounds = -(-len(futures) // self.max_workers)
+            wait(futures.values(), timeout=self.timeout * rounds)
+        for ip_address, future in futures.items():
+            hostnames[ip_address] = future.result() if future.done() else ""
+        return hostnames
+
+
+def get_resolver():
+    """
+    Create the shared resolver on first use and return it.
+    """
+    global _resolver
+    if _resolver is None:
+        _resolver = ReverseResolver()
+    return _resolver
+
+
+def configure_resolver(server=None, port=53):
+    """
+    Replace the shared resolver by one querying a DNS server directly.
+
+    Args:
+        server (str): DNS server to query, or None for the system resolver.
+        port (int): UDP port of the DNS server.
+
+    Returns:
+        ReverseResolver: The new shared resolver.
+    """
+    global _resolver
+    if _resolver is not None:
+        _resolver.close()
+    _resolver = ReverseResolver(server=server, port=port)
+    return _resolver
+
+
+def add_dns_server_argument(parser):
+    """
+    Add the --dns-server option, for configure_resolver.
+    """
+    parser.add_argument("--dns-server", metavar="ADDRESS",
+                        help="DNS server to send the reverse lookups to "
+                             "(default: the system resolver)")
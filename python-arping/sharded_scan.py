@@ -0,0 +1,227 @@
+import multiprocessing
+import os
+import sys
+import time
+from bisect import bisect_left
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from ipaddress import IPv4Network
+from multiprocessing.util import Finalize
+
+from arp_sweep import (ArpSweeper, find_interface, get_learned_timeout, host_range,
+                       record_sweep)
+from metrics import get_metrics
+
+# Prefix length of the blocks a large network is split into
+DEFAULT_SHARD_PREFIX = 24
+
+# Sweepers reused by all the shards handled by a worker process
+_worker_sweepers = {}
+
+# Workers are started from a fresh server process rather than forked from
+# the caller, whose resolver, mDNS or HTTP threads may hold locks
+POOL_CONTEXT = "forkserver"
+
+# Default maximum number of worker processes
+MAX_WORKERS = 8
+
+
+def split_network(network, shard_prefix=DEFAULT_SHARD_PREFIX):
+    """
+    Split a network into blocks of a given prefix length.
+
+    Args:
+        network (IPv4Network): Network to split.
+        shard_prefix (int): Prefix length of the blocks.
+
+    Returns:
+        iterator: IPv4Network blocks, or the network itself if already small enough.
+    """
+    if network.prefixlen >= shard_prefix:
+        return iter([network])
+    return network.subnets(new_prefix=shard_prefix)
+
+
+def count_shards(network, shard_prefix=DEFAULT_SHARD_PREFIX):
+    """
+    Number of blocks split_network yields for a network.
+    """
+    return 2 ** max(0, shard_prefix - network.prefixlen)
+
+
+def count_workers(network, workers=None, shard_prefix=DEFAULT_SHARD_PREFIX):
+    """
+    Number of worker processes sharded_scan uses for a network: at most one
+    per CPU and one per shard, 1 meaning the network is swept unsharded.
+    """
+    shards = count_shards(network, shard_prefix)
+    return max(1, min(workers or MAX_WORKERS, os.cpu_count() or 1, shards))
+
+
+def estimate_scan_time(network, rate, retries=1, max_timeout=2.0, workers=None,
+                       shard_prefix=DEFAULT_SHARD_PREFIX):
+    """
+    Upper bound of the time needed to scan a network in sharded mode.
+
+    Every address is probed at most 1 + retries times at `rate` packets per
+    second in total, and each worker waits at most max_timeout for the
+    replies after each round of each of its shards.
+
+    Returns:
+        float: Estimated duration in seconds.
+    """
+    workers = count_workers(network, workers, shard_prefix)
+    shards = count_shards(network, shard_prefix) if workers > 1 else 1
+    probing = network.num_addresses * (1 + retries) / rate
+    waiting = -(-shards // workers) * (1 + retries) * max_timeout
+    return probing + waiting
+
+
+def _close_worker_sweepers():
+    for sweeper in _worker_sweepers.values():
+        sweeper.close()
+    _worker_sweepers.clear()
+
+
+def _init_worker():
+    # Worker processes exit without running atexit handlers, only the
+    # multiprocessing finalizers
+    Finalize(None, _close_worker_sweepers, exitpriority=10)
+
+
+def scan_shard(interface, shard, rate, retries, learned_timeout=None, skip=()):
+    """
+    Sweep one shard; runs inside a worker process.
+
+    Args:
+        learned_timeout (float): Reply timeout learned so far by the other
+                                 workers, used until this worker learns its own.
+        skip (tuple): Integer addresses of the shard not to probe.
+
+    Returns:
+        tuple: (shard, replies, learned_timeout, sweep_stats) with replies mapping
+               IPs to MAC addresses and sweep_stats the counters of the sweep.
+    """
+    # Recorded by the parent from sweep_stats, the worker's copy would be lost
+    get_metrics().enabled = False
+    key = (interface, rate, retries)
+    if key not in _worker_sweepers:
+        _worker_sweepers[key] = ArpSweeper(interface, rate=rate, retries=retries)
+    sweeper = _worker_sweepers[key]
+    if sweeper.learned_timeout is None:
+        sweeper.learned_timeout = learned_timeout
+    targets = host_range(IPv4Network(shard))
+    if skip:
+        skip = frozenset(skip)
+        targets = (ip for ip in targets if ip not in skip)
+    replies = sweeper.sweep(targets)
+    return shard, replies, sweeper.learned_timeout, sweeper.last_sweep
+
+
+def print_progress(done, total, found, elapsed):
+    """
+    Default progress reporter, rewriting a single line on stderr.
+    """
+    sys.stderr.write(f"\rScanned {done}/{total} shards, {found} devices found, "
+                     f"{elapsed:.1f}s elapsed")
+    if done == total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def _scan_unsharded(network, interface, rate, retries, progress, skip):
+    start = time.monotonic()
+    targets = host_range(network)
+    if skip:
+        skip = frozenset(skip)
+        targets = (ip for ip in targets if ip not in skip)
+    with ArpSweeper(interface, rate=rate, retries=retries) as sweeper:
+        replies = sweeper.sweep(targets)
+    record_sweep(interface, sweeper.last_sweep)
+    devices = [{'ip': ip, 'mac': mac} for ip, mac in replies.items()]
+    if progress:
+        progress(1, 1, len(devices), time.monotonic() - start)
+    return devices
+
+
+def sharded_scan(network, interface=None, rate=1000, workers=None, retries=1,
+                 shard_prefix=DEFAULT_SHARD_PREFIX, progress=print_progress, skip=()):
+    """
+    Scan a large network by splitting it into shards swept by worker processes.
+
+    The packet rate is shared between the workers, so the interface never
+    sees more than `rate` ARP requests per second whatever the worker count.
+    With a single CPU the network is swept in one go in the calling process:
+    the shards would only be scanned one after the other, each one waiting
+    for its own late replies.
+
+    Args:
+        network (str): Network to scan, e.g. "10.0.0.0/16".
+        interface (str): Interface to scan on, detected from the network if None.
+        rate (int): Maximum number of ARP requests per second on the interface.
+        workers (int): Number of worker processes, at most the CPU count;
+                       defaults to the CPU count (max MAX_WORKERS).
+        retries (int): Number of retransmissions to the silent hosts of a shard.
+        shard_prefix (int): Prefix length of the shards.
+        progress (callable): Called as progress(done, total, found, elapsed)
+                             after each shard, None to disable.
+        skip (iterable): Integer addresses not to probe, e.g. the ones seen recently.
+
+    Returns:
+        list: List of dictionaries containing the IP and MAC addresses of
+              devices that respond.
+    """
+    network = IPv4Network(network, strict=False)
+    if interface is None:
+        interface = find_interface(str(network.network_address))
+        if interface is None:
+            raise ValueError(f"No local interface found for {network}")
+
+    workers = count_workers(network, workers, shard_prefix)
+    if workers == 1:
+        return _scan_unsharded(network, interface, rate, retries, progress, skip)
+
+    shards = split_network(network, shard_prefix)
+    total = count_shards(network, shard_prefix)
+    worker_rate = max(1, rate // workers)
+    learned_timeout = get_learned_timeout(interface)
+    # Sorted once, so each shard gets its own slice without scanning the whole set
+    skip = sorted(skip)
+
+    devices = []
+    done = 0
+    start = time.monotonic()
+    context = multiprocessing.get_context(POOL_CONTEXT)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             mp_context=context) as executor:
+        pending = set()
+
+        def submit_next():
+            # One shard in flight per worker, so that each new shard benefits
+            # from the timeout learned by the previous ones
+            shard = next(shards, None)
+            if shard is not None:
+                first = int(shard.network_address)
+                shard_skip = tuple(skip[bisect_left(skip, first):
+                                        bisect_left(skip, first + shard.num_addresses)])
+                pending.add(executor.submit(
+                    scan_shard, interface, str(shard), worker_rate, retries,
+                    learned_timeout, shard_skip))
+
+        for _ in range(workers):
+            submit_next()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pending.discard(future)
+                _, replies, shard_timeout, sweep_stats = future.result()
+                if shard_timeout is not None:
+                    learned_timeout = shard_timeout
+                record_sweep(interface, sweep_stats)
+                devices += [{'ip': ip, 'mac': mac} for ip, mac in replies.items()]
+                done += 1
+                if progress:
+                    progress(done, total, len(devices), time.monotonic() - start)
+                submit_next()
+
+    return devices
+
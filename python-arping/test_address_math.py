@@ -0,0 +1,94 @@
+from address_math import (IPV6_BITS, AddressRanges, NetworkSet, address_to_int,
+                          int_to_address, interface_network, mask_length, merge_ranges,
+                          network_bounds, prefix_to_mask, subnet_mask_to_mask_length)
+
+
+def network(first, prefix_length):
+    """
+    (first, last) integer range of an IPv4 network.
+    """
+    return network_bounds(address_to_int(first)[0], prefix_length)
+
+
+def test_conversions():
+    assert address_to_int("172.16.24.32") == (0xAC101820, 32)
+    assert address_to_int("fe80::1") == ((0xFE80 << 112) | 1, IPV6_BITS)
+    assert int_to_address(0xAC101820) == "172.16.24.32"
+    assert int_to_address((0xFE80 << 112) | 1, IPV6_BITS) == "fe80::1"
+    for invalid in ("172.16.24", "256.0.0.1", "fe80::1::2", ""):
+        try:
+            address_to_int(invalid)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{invalid!r} was accepted")
+
+
+def test_masks():
+    assert prefix_to_mask(0) == 0
+    assert prefix_to_mask(25) == 0xFFFFFF80
+    assert prefix_to_mask(32) == 0xFFFFFFFF
+    assert prefix_to_mask(64, IPV6_BITS) == ((1 << 64) - 1) << 64
+    for prefix_length in range(33):
+        assert mask_length(prefix_to_mask(prefix_length)) == prefix_length
+    # Non-contiguous: only the leading ones count
+    assert mask_length(0xFFFF00FF) == 16
+    assert subnet_mask_to_mask_length("255.255.255.128") == 25
+    assert subnet_mask_to_mask_length("ffff:ffff:ffff:ffff::") == 64
+
+
+def test_bounds():
+    assert network("172.16.24.32", 25) == (0xAC101800, 0xAC10187F)
+    assert network("172.16.24.200", 25) == (0xAC101880, 0xAC1018FF)
+    assert network("10.0.0.1", 32) == (0x0A000001, 0x0A000001)
+    assert network("10.0.0.1", 0) == (0, 0xFFFFFFFF)
+    assert interface_network("192.168.1.10", "255.255.255.0") == (
+        0xC0A80100, 0xC0A801FF, 24)
+    first, last, prefix_length = interface_network("fd77::1", "ffff:ffff:ffff:ffff::")
+    assert (first, last - first, prefix_length) == (0xFD77 << 112, (1 << 64) - 1, 64)
+
+
+def test_merge_ranges():
+    assert merge_ranges([]) == []
+    assert merge_ranges([(10, 20), (1, 5), (6, 8), (15, 30), (40, 50)]) == [
+        (1, 8), (10, 30), (40, 50)]
+    assert merge_ranges([(1, 10), (2, 3)]) == [(1, 10)]
+
+
+def test_address_ranges():
+    ranges = AddressRanges([(10, 20), (30, 40)])
+    assert list(ranges) == [(10, 20), (30, 40)]
+    assert ranges.covers(12, 18) and not ranges.covers(15, 35)
+    assert ranges.overlaps(15, 35) and not ranges.overlaps(21, 29)
+    # Adjacent to both ranges: the three are joined
+    ranges.add(21, 29)
+    assert list(ranges) == [(10, 40)]
+    ranges.add(0, 100)
+    assert list(ranges) == [(0, 100)]
+
+
+def test_network_set():
+    lower, upper = network("10.0.0.0", 25), network("10.0.0.128", 25)
+    networks = NetworkSet([lower, upper])
+    # The two halves of a /24 do not cover it
+    assert len(networks) == 2
+    assert not networks.covers(*network("10.0.0.0", 24))
+    assert networks.covers(*network("10.0.0.64", 26))
+
+    # A network containing the stored ones replaces them
+    networks.add(*network("10.0.0.0", 16))
+    assert list(networks) == [network("10.0.0.0", 16)]
+    networks.add(*network("10.0.5.0", 24))
+    assert list(networks) == [network("10.0.0.0", 16)]
+    networks.add(*network("10.1.0.0", 16))
+    assert len(networks) == 2
+
+
+if __name__ == "__main__":
+    test_conversions()
+    test_masks()
+    test_bounds()
+    test_merge_ranges()
+    test_address_ranges()
+    test_network_set()
+    print("Address math: all checks passed")
@@ -0,0 +1,83 @@
+import socket
+import struct
+import threading
+
+from dns_ptr import (CLASS_IN, FLAG_RECURSION_DESIRED, TYPE_PTR, _read_name,
+                     build_ptr_query, lookup_ptr, parse_ptr_response)
+
+
+def encode_name(name):
+    return b"".join(bytes([len(label)]) + label.encode()
+                    for label in name.split('.')) + b"\x00"
+
+
+def make_response(query, hostname=None, ttl=120, rcode=0, query_id=None):
+    """
+    Answer a query built by build_ptr_query, the answer name being a
+    compression pointer to the question.
+    """
+    response_id = struct.unpack('!H', query[:2])[0] if query_id is None else query_id
+    answers = 0
+    answer = b""
+    if hostname:
+        rdata = encode_name(hostname)
+        answer = b"\xc0\x0c" + struct.pack('!HHIH', TYPE_PTR, CLASS_IN, ttl, len(rdata))
+        answer += rdata
+        answers = 1
+    header = struct.pack('!HHHHHH', response_id, 0x8180 | rcode, 1, answers, 0, 0)
+    return header + query[12:] + answer
+
+
+def test_build_ptr_query():
+    query = build_ptr_query("10.0.0.2", query_id=0x1234)
+    assert struct.unpack('!HHHHHH', query[:12]) == (
+        0x1234, FLAG_RECURSION_DESIRED, 1, 0, 0, 0)
+    name, offset = _read_name(query, 12)
+    assert name == "2.0.0.10.in-addr.arpa"
+    assert struct.unpack('!HH', query[offset:]) == (TYPE_PTR, CLASS_IN)
+
+    name, _ = _read_name(build_ptr_query("2001:db8::1"), 12)
+    assert name == "1.0.0.0." + "0." * 20 + "8.b.d.0.1.0.0.2.ip6.arpa"
+
+
+def test_parse_ptr_response():
+    query = build_ptr_query("10.0.0.2", query_id=7)
+    assert parse_ptr_response(make_response(query, "box.lan"), 7) == ("box.lan", 120, 0)
+    assert parse_ptr_response(make_response(query, "box.lan")) == ("box.lan", 120, 0)
+    # NXDOMAIN
+    assert parse_ptr_response(make_response(query, rcode=3), 7) == (None, 0, 3)
+    # Another query's response, the query itself, and malformed packets
+    assert parse_ptr_response(make_response(query, "box.lan", query_id=8), 7) is None
+    assert parse_ptr_response(query, 7) is None
+    assert parse_ptr_response(make_response(query, "box.lan")[:-5], 7) is None
+    assert parse_ptr_response(b"\x00\x07", 7) is None
+    # A compression pointer to itself
+    looping = struct.pack('!HHHHHH', 7, 0x8180, 1, 0, 0, 0) + b"\xc0\x0c"
+    assert parse_ptr_response(looping, 7) is None
+
+
+def test_lookup_ptr():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+
+    def answer():
+        query, address = server.recvfrom(512)
+        server.sendto(make_response(query, "box.lan", ttl=30), address)
+
+    thread = threading.Thread(target=answer)
+    thread.start()
+    try:
+        assert lookup_ptr("10.0.0.2", "127.0.0.1", port) == ("box.lan", 30, 0)
+        thread.join()
+        # Nobody answers
+        assert lookup_ptr("10.0.0.2", "127.0.0.1", port, timeout=0.2) is None
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    test_build_ptr_query()
+    test_parse_ptr_response()
+    test_lookup_ptr()
+    print("DNS PTR codec: all checks passed")
@@ -0,0 +1,69 @@
+import os
+import socket
+import tempfile
+
+from neighbours import normalize_mac, parse_arp_output, parse_proc_arp, read_proc_arp
+
+PROC_ARP = """\
+IP address       HW type     Flags       HW address            Mask     Device
+10.77.0.2        0x1         0x2         e2:a3:49:cf:18:28     *        vh0
+10.77.0.3        0x1         0x0         00:00:00:00:00:00     *        vh0
+10.78.0.1        0x1         0x6         ce:42:e7:fe:71:f4     *        vh1
+truncated line
+"""
+
+# BSD / macOS `arp -a`
+ARP_OUTPUT = """\
+? (172.16.24.1) at fc:ec:da:7b:3b:57 on en0 ifscope [ethernet]
+? (172.16.24.22) at 4:92:26:b7:b2:77 on en0 ifscope [ethernet]
+? (172.16.24.66) at (incomplete) on en0 ifscope [ethernet]
+? (172.16.24.83) at F4:D4:88:92:4A:13 on en0 ifscope permanent [ethernet]
+mdns.mcast.net (224.0.0.251) at 1:0:5e:0:0:fb on en0 ifscope permanent [ethernet]
+"""
+
+
+def test_normalize_mac():
+    assert normalize_mac("4:92:26:b7:b2:77") == "04:92:26:b7:b2:77"
+    assert normalize_mac("04-92-26-B7-B2-77") == "04:92:26:b7:b2:77"
+
+
+def test_parse_proc_arp():
+    records = parse_proc_arp(PROC_ARP)
+    assert [(record['ip'], record['mac'], record['interface'], record['state'])
+            for record in records] == [
+        ("10.77.0.2", "e2:a3:49:cf:18:28", "vh0", "REACHABLE"),
+        ("10.77.0.3", None, "vh0", "INCOMPLETE"),
+        ("10.78.0.1", "ce:42:e7:fe:71:f4", "vh1", "PERMANENT"),
+    ]
+    assert all(record['family'] == socket.AF_INET for record in records)
+    assert parse_proc_arp(PROC_ARP.splitlines()[0]) == []
+
+
+def test_read_proc_arp():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "arp")
+        with open(path, "w") as file:
+            file.write(PROC_ARP)
+        assert read_proc_arp(path) == parse_proc_arp(PROC_ARP)
+
+
+def test_parse_arp_output():
+    records = parse_arp_output(ARP_OUTPUT)
+    assert [(record['ip'], record['mac'], record['state'], record['hostname'])
+            for record in records] == [
+        ("172.16.24.1", "fc:ec:da:7b:3b:57", "REACHABLE", ""),
+        ("172.16.24.22", "04:92:26:b7:b2:77", "REACHABLE", ""),
+        ("172.16.24.66", None, "INCOMPLETE", ""),
+        ("172.16.24.83", "f4:d4:88:92:4a:13", "PERMANENT", ""),
+        ("224.0.0.251", "01:00:5e:00:00:fb", "PERMANENT", "mdns.mcast.net"),
+    ]
+    assert all(record['interface'] == "en0" for record in records)
+    assert parse_arp_output("") == []
+
+
+if __name__ == "__main__":
+    test_normalize_mac()
+    test_parse_proc_arp()
+    test_read_proc_arp()
+    test_parse_arp_output()
+    print("Neighbour table parsers: all checks passed")
@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+from oui_index import OuiIndex, build_index, mac_to_int
+
+# MA-L, MA-M and MA-S assignments nested in the same IEEE block
+MAPPING = {
+    "286FB9": "Nokia",
+    "70B3D5": "IEEE Registration Authority",
+    "70B3D5F": "MA-M vendor",
+    "70B3D5F12": "MA-S vendor",
+}
+
+CASES = [
+    ("28:6f:b9:12:34:56", "Nokia"),
+    ("28-6F-B9-12-34-56", "Nokia"),
+    ("286fb9123456", "Nokia"),
+    ("70:b3:d5:f1:23:45", "MA-S vendor"),
+    ("70:b3:d5:f3:00:00", "MA-M vendor"),
+    ("70:b3:d5:00:00:00", "IEEE Registration Authority"),
+    ("4:92:26:b7:b2:77", None),
+    ("00:00:00:00:00:00", None),
+    ("not a mac", None),
+    ("", None),
+    (None, None),
+]
+
+
+def build_test_index(directory):
+    path = os.path.join(directory, "test.idx")
+    build_index(MAPPING, path)
+    return OuiIndex(path)
+
+
+def test_mac_to_int():
+    assert mac_to_int("00:11:22:33:44:55") == 0x001122334455
+    assert mac_to_int("4:92:26:b7:b2:77") == 0x049226B7B277
+    assert mac_to_int("00-11-22-33-44-55") == 0x001122334455
+    assert mac_to_int("001122334455") == 0x001122334455
+    assert mac_to_int("00:11:22:33:44:100") is None
+    assert mac_to_int("zz:11:22:33:44:55") is None
+
+
+def test_lookup():
+    with tempfile.TemporaryDirectory() as directory:
+        index = build_test_index(directory)
+        try:
+            assert len(index) == len(MAPPING)
+            # Twice, the second lookup of an OUI being served from its cache
+            for _ in range(2):
+                for mac_address, vendor in CASES:
+                    assert index.lookup(mac_address) == vendor, mac_address
+        finally:
+            index.close()
+
+
+def test_lookup_many():
+    with tempfile.TemporaryDirectory() as directory:
+        index = build_test_index(directory)
+        try:
+            mac_addresses = [mac_address for mac_address, _ in CASES]
+            assert index.lookup_many(mac_addresses) == [vendor for _, vendor in CASES]
+            assert index.lookup_many([]) == []
+        finally:
+            index.close()
+
+
+if __name__ == "__main__":
+    test_mac_to_int()
+    test_lookup()
+    test_lookup_many()
+    print("OUI index: all checks passed")
@@ -0,0 +1,151 @@
+import socket
+import struct
+
+from passive import (ARP_DHCP_FILTER, DHCP_CLIENT_PORT, DHCP_MAGIC_COOKIE,
+                     DHCP_OPTION_END, DHCP_OPTION_HOSTNAME, DHCP_OPTION_MESSAGE_TYPE,
+                     DHCP_SERVER_PORT, DHCPACK, DHCPREQUEST, SKF_AD_PKTTYPE,
+                     attach_filter, parse_dhcp)
+
+CLIENT_MAC = bytes.fromhex("aabbcc000001")
+CLIENT_IP = socket.inet_aton("10.0.0.42")
+SERVER_IP = socket.inet_aton("10.0.0.1")
+ZERO_IP = b"\x00" * 4
+
+# DHCP requested IP address option (RFC 2132)
+DHCP_OPTION_REQUESTED_IP = 50
+
+
+def run_filter(program, frame, pkttype=socket.PACKET_HOST):
+    """
+    Run a classic BPF program on a frame, as the kernel does for the
+    instructions ARP_DHCP_FILTER uses, and return the bytes it keeps.
+    """
+    a = x = 0
+    pc = 0
+    try:
+        while True:
+            code, jump_true, jump_false, k = program[pc]
+            pc += 1
+            if code == 0x20 and k == SKF_AD_PKTTYPE:
+                a = pkttype
+            elif code == 0x20:
+                a = struct.unpack_from('!I', frame, k)[0]
+            elif code == 0x28:
+                a = struct.unpack_from('!H', frame, k)[0]
+            elif code == 0x30:
+                a = frame[k]
+            elif code == 0x48:
+                a = struct.unpack_from('!H', frame, x + k)[0]
+            elif code == 0xB1:
+                x = 4 * (frame[k] & 0x0F)
+            elif code == 0x15:
+                pc += jump_true if a == k else jump_false
+            elif code == 0x45:
+                pc += jump_true if a & k else jump_false
+            elif code == 0x06:
+                return k
+            else:
+                raise ValueError(f"Unsupported BPF instruction {code:#x}")
+    except (IndexError, struct.error):
+        # The kernel drops the frames a load reads past the end of
+        return 0
+
+
+def ethernet(ethertype, payload):
+    return b"\xff" * 6 + CLIENT_MAC + struct.pack('!H', ethertype) + payload
+
+
+def arp_frame(opcode=1):
+    return ethernet(0x0806, struct.pack('!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, opcode,
+                                        CLIENT_MAC, CLIENT_IP, b"\x00" * 6, SERVER_IP))
+
+
+def udp_frame(source_port, destination_port, payload, protocol=17, fragment=0,
+              ip_options=b""):
+    header_length = 5 + len(ip_options) // 4
+    udp = struct.pack('!HHHH', source_port, destination_port, 8 + len(payload), 0)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x40 | header_length, 0,
+                     4 * header_length + len(udp) + len(payload), 0, fragment, 64,
+                     protocol, 0, CLIENT_IP, SERVER_IP) + ip_options
+    return ethernet(0x0800, ip + udp + payload)
+
+
+def dhcp_message(message_type, ciaddr=ZERO_IP, yiaddr=ZERO_IP, options=()):
+    bootp = struct.pack('!BBBBIHH4s4s4s4s16s64s128s',
+                        2 if message_type == DHCPACK else 1, 1, 6, 0, 0x1234, 0, 0,
+                        ciaddr, yiaddr, ZERO_IP, ZERO_IP, CLIENT_MAC, b"", b"")
+    encoded = bytes([DHCP_OPTION_MESSAGE_TYPE, 1, message_type])
+    for code, value in options:
+        encoded += bytes([code, len(value)]) + value
+    return bootp + DHCP_MAGIC_COOKIE + encoded + bytes([DHCP_OPTION_END])
+
+
+def dhcp_frame(message_type, **kwargs):
+    ports = ((DHCP_SERVER_PORT, DHCP_CLIENT_PORT) if message_type == DHCPACK
+             else (DHCP_CLIENT_PORT, DHCP_SERVER_PORT))
+    return udp_frame(*ports, dhcp_message(message_type, **kwargs))
+
+
+def test_filter():
+    kept = [
+        arp_frame(1),
+        arp_frame(2),
+        dhcp_frame(DHCPREQUEST),
+        dhcp_frame(DHCPACK, yiaddr=CLIENT_IP),
+        udp_frame(DHCP_CLIENT_PORT, DHCP_SERVER_PORT, dhcp_message(DHCPREQUEST),
+                  ip_options=b"\x01" * 4),
+    ]
+    dropped = [
+        udp_frame(40000, 53, b"\x00" * 32),
+        udp_frame(DHCP_CLIENT_PORT, DHCP_SERVER_PORT, b"\x00" * 32, protocol=6),
+        # A non-first fragment: its "ports" are payload bytes
+        udp_frame(DHCP_CLIENT_PORT, DHCP_SERVER_PORT, b"\x00" * 32, fragment=0x0010),
+        ethernet(0x86DD, b"\x00" * 60),
+        ethernet(0x0800, b"\x45"),
+    ]
+    for frame in kept:
+        assert run_filter(ARP_DHCP_FILTER, frame) > 0, frame
+        # What this host sends, its own sweeps included, is never learned
+        assert run_filter(ARP_DHCP_FILTER, frame, socket.PACKET_OUTGOING) == 0
+    for frame in dropped:
+        assert run_filter(ARP_DHCP_FILTER, frame) == 0, frame
+
+
+def test_filter_jumps():
+    # Every jump lands inside the program, as the kernel checker requires
+    for position, (code, jump_true, jump_false, _) in enumerate(ARP_DHCP_FILTER):
+        if code != 0x06:
+            assert position + 1 + max(jump_true, jump_false) < len(ARP_DHCP_FILTER)
+    assert ARP_DHCP_FILTER[-1] == (0x06, 0, 0, 0)
+
+
+def test_attach_filter():
+    # Checked by the kernel; a datagram socket needs no privileges
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        attach_filter(sock)
+
+
+def test_parse_dhcp():
+    hostname = (DHCP_OPTION_HOSTNAME, b"box")
+    # A selecting client only asks for an address, granted by the ACK
+    assert parse_dhcp(dhcp_frame(
+        DHCPREQUEST, options=[(DHCP_OPTION_REQUESTED_IP, CLIENT_IP), hostname])) == (
+        DHCPREQUEST, "aa:bb:cc:00:00:01", None, "box")
+    # A renewing client already uses its address
+    assert parse_dhcp(dhcp_frame(DHCPREQUEST, ciaddr=CLIENT_IP)) == (
+        DHCPREQUEST, "aa:bb:cc:00:00:01", "10.0.0.42", None)
+    assert parse_dhcp(dhcp_frame(DHCPACK, yiaddr=CLIENT_IP)) == (
+        DHCPACK, "aa:bb:cc:00:00:01", "10.0.0.42", None)
+
+    assert parse_dhcp(arp_frame()) is None
+    assert parse_dhcp(udp_frame(40000, 53, b"\x00" * 300)) is None
+    frame = dhcp_frame(DHCPACK, yiaddr=CLIENT_IP)
+    assert parse_dhcp(frame[:100]) is None
+
+
+if __name__ == "__main__":
+    test_filter()
+    test_filter_jumps()
+    test_attach_filter()
+    test_parse_dhcp()
+    print("Passive listener: all checks passed")
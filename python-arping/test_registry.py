@@ -0,0 +1,72 @@
+from registry import DeviceRegistry, address_sort_key
+
+MAC_A = "aa:bb:cc:00:00:01"
+MAC_B = "aa:bb:cc:00:00:02"
+
+
+def test_merge():
+    registry = DeviceRegistry([{'ip': "10.0.0.2", 'mac': MAC_A, 'hostname': "box"}])
+    # Empty fields do not erase the known ones, the others are updated
+    stored = registry.upsert({'ip': "10.0.0.2", 'mac': MAC_A.upper(), 'hostname': "",
+                              'vendor': "Acme"})
+    assert stored['hostname'] == "box" and stored['vendor'] == "Acme"
+    assert len(registry) == 1 and "10.0.0.2" in registry
+    assert registry.get_conflicts() == []
+
+    # The returned devices are copies
+    stored['hostname'] = "changed"
+    assert registry.get_by_ip("10.0.0.2")['hostname'] == "box"
+    assert registry.get_by_ip("10.0.0.3") is None
+
+
+def test_conflicts():
+    registry = DeviceRegistry([{'ip': "10.0.0.2", 'mac': MAC_A}])
+    registry.upsert({'ip': "10.0.0.2", 'mac': MAC_B})
+    assert registry.get_conflicts() == [
+        {'ip': "10.0.0.2", 'old_mac': MAC_A, 'new_mac': MAC_B}]
+    assert registry.get_by_ip("10.0.0.2")['mac'] == MAC_B
+    assert registry.get_by_mac(MAC_A) == []
+    devices = registry.get_by_mac(MAC_B.upper())
+    assert [device['ip'] for device in devices] == ["10.0.0.2"]
+
+    # Only the most recent conflicts are kept
+    registry = DeviceRegistry(max_conflicts=2)
+    for number in range(4):
+        registry.upsert({'ip': "10.0.0.2", 'mac': f"aa:bb:cc:00:00:0{number}"})
+    assert [conflict['new_mac'] for conflict in registry.get_conflicts()] == [
+        "aa:bb:cc:00:00:02", "aa:bb:cc:00:00:03"]
+
+
+def test_link_local_scopes():
+    # The same link-local address on two links is two devices, not a conflict
+    registry = DeviceRegistry([{'ip': "fe80::1%eth1", 'mac': MAC_B},
+                               {'ip': "fe80::1%eth0", 'mac': MAC_A}])
+    assert len(registry) == 2 and registry.get_conflicts() == []
+    assert [device['ip'] for device in registry.devices()] == [
+        "fe80::1%eth0", "fe80::1%eth1"]
+
+
+def test_prune():
+    registry = DeviceRegistry([{'ip': "10.0.0.1", 'mac': MAC_A, 'last_seen': 100},
+                               {'ip': "10.0.0.2", 'mac': MAC_A, 'last_seen': 200},
+                               {'ip': "10.0.0.3", 'mac': MAC_B}])
+    removed = registry.prune(150)
+    assert [device['ip'] for device in removed] == ["10.0.0.1"]
+    assert [device['ip'] for device in registry.devices()] == ["10.0.0.2", "10.0.0.3"]
+    assert [device['ip'] for device in registry.get_by_mac(MAC_A)] == ["10.0.0.2"]
+
+
+def test_sort_order():
+    addresses = ["fd77::1", "10.0.0.10", "fe80::1%eth0", "10.0.0.9", "192.0.2.1",
+                 "2001:db8::1"]
+    assert sorted(addresses, key=address_sort_key) == [
+        "10.0.0.9", "10.0.0.10", "192.0.2.1", "2001:db8::1", "fd77::1", "fe80::1%eth0"]
+
+
+if __name__ == "__main__":
+    test_merge()
+    test_conflicts()
+    test_link_local_scopes()
+    test_prune()
+    test_sort_order()
+    print("Device registry: all checks passed")